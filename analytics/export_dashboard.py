@@ -0,0 +1,117 @@
+"""
+Export the dashboard's KPI/RCA query results as typed Parquet artifacts.
+
+Replaces the hand-run sqlcmd dumps (headerless text with "rows affected" / "Changed database
+context" lines mixed in). Every query in backends.SCRIPT_QUERIES runs on its own thread with
+its own connection, so the export takes as long as the slowest query, not the sum of all of them.
+Each result is written as <out>/<name>.parquet (headered, typed, dictionary-encoded strings).
+manifest.json records the row counts, column types and query timings. The dashboard picks the
+Parquet files over older CSV dumps of the same name.
+
+  python analytics/export_dashboard.py
+  FMA_BACKEND=duckdb python analytics/export_dashboard.py --out outputs
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime as dt
+import decimal
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src import backends  # noqa: E402
+from src.storage import write_table  # noqa: E402
+
+OUT_DIR = "outputs"
+MANIFEST = "manifest.json"
+
+
+def typed(df: pd.DataFrame) -> pd.DataFrame:
+    """DB-API object columns to native dtypes: DECIMAL -> float64, DATE -> datetime64."""
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        sample = df[col].dropna()
+        if sample.empty:
+            continue
+        first = sample.iloc[0]
+        if isinstance(first, decimal.Decimal):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+        elif isinstance(first, (dt.date, dt.datetime)):
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def export_one(name: str, out_dir: str, backend: str = None):
+    """Run one named query on a fresh connection and write <out_dir>/<name>.parquet."""
+    t0 = time.perf_counter()
+    conn = backends.connect(backend)
+    try:
+        df = typed(backends.fetch_df(conn, backends.script_query(name)))
+    finally:
+        conn.close()
+    seconds = time.perf_counter() - t0
+
+    path = os.path.join(out_dir, name + ".parquet")
+    tmp_path = path + ".tmp"
+    write_table(df, tmp_path)
+    os.replace(tmp_path, path)  # the dashboard never reads a half-written file
+    script, index = backends.SCRIPT_QUERIES[name]
+    return name, {
+        "file": os.path.basename(path),
+        "query": f"{script}#{index + 1}",
+        "rows": len(df),
+        "columns": {col: str(dtype) for col, dtype in df.dtypes.items()},
+        "query_seconds": round(seconds, 3),
+    }
+
+
+def export_all(out_dir: str = OUT_DIR, names=None, workers: int = None, backend: str = None):
+    names = list(names or backends.SCRIPT_QUERIES)
+    backend = backend or backends.BACKEND
+    os.makedirs(out_dir, exist_ok=True)
+    if backend == "duckdb":
+        backends.connect_duckdb().close()  # (re)build once up front, not from every worker
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or len(names)) as pool:
+        artifacts = dict(pool.map(lambda n: export_one(n, out_dir, backend), names))
+
+    # a partial export (--only, or the pipeline re-running changed queries) keeps the other entries
+    path = os.path.join(out_dir, MANIFEST)
+    previous = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            previous = json.load(f).get("artifacts", {})
+    manifest = {
+        "generated_at": dt.datetime.now().isoformat(timespec="seconds"),
+        "backend": backend,
+        "wall_seconds": round(time.perf_counter() - t0, 3),
+        "artifacts": {**previous, **artifacts},
+    }
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return manifest
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export the dashboard KPI/RCA queries as Parquet artifacts.")
+    ap.add_argument("--out", default=OUT_DIR)
+    ap.add_argument("--only", nargs="+", choices=sorted(backends.SCRIPT_QUERIES), help="export just these")
+    ap.add_argument("--workers", type=int, default=None, help="concurrent queries (default: one per query)")
+    args = ap.parse_args()
+
+    manifest = export_all(args.out, args.only, args.workers)
+    exported = [manifest["artifacts"][name] for name in (args.only or backends.SCRIPT_QUERIES)]
+    slowest = max(a["query_seconds"] for a in exported)
+    print(f"✅ Exported {len(exported)} artifacts to {os.path.abspath(args.out)} "
+          f"in {manifest['wall_seconds']:.2f}s (slowest query {slowest:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
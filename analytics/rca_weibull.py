@@ -1,15 +1,42 @@
 import os
+import sys
 import math
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
 from scipy.stats import weibull_min
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import roc_auc_score, classification_report
+from sklearn.preprocessing import StandardScaler
 
-import pymssql  # pure-python friendly in Docker
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src import backends  # noqa: E402
+from src.bootstrap import N_REPLICATES, lift_intervals, weibull_intervals  # noqa: E402
+from src.features import NUMERIC, FeaturePipeline, fail_target  # noqa: E402
+from src.instrument import Run, stage  # noqa: E402
+from src.models import LinearModel, save_model  # noqa: E402
+from src.rca_ranker import DriverLiftCounter  # noqa: E402
+from src.storage import write_table  # noqa: E402
+from src.unit_dict import UnitDictionary  # noqa: E402
+from src.weibull import reliability_table, unit_survival  # noqa: E402
+
+# Tabular outputs: "csv" (default) or "parquet" (typed, dictionary-encoded; the dashboard reads either)
+OUTPUT_FORMAT = os.getenv("FMA_OUTPUT_FORMAT", "csv")
+
+# Streaming driver model (--stream): rows fetched per chunk, every Nth row held out for AUC
+STREAM_CHUNK_ROWS = 500_000
+HOLDOUT_EVERY = 4
+STREAM_EPOCHS = 1
+
+# Registry name of the fitted driver model (src/models.py; versions are appended per run)
+MODEL_NAME = "driver_fail"
+
+# Bootstrap replicates behind the lift / Weibull confidence intervals (--bootstrap 0 skips them)
+BOOTSTRAP_REPLICATES = N_REPLICATES
 
 
 SQL = {
@@ -27,6 +54,24 @@ SQL = {
           ON fr.unit_serial = u.unit_serial
         WHERE fr.repair_action <> 'NFF';
     """,
+    # every unit, with its confirmed (non-NFF) returns if any: survivors are right-censored
+    "unit_survival": """
+        USE NokiaFMA;
+
+        SELECT
+            u.unit_serial,
+            u.build_date,
+            lc.fw_version,
+            sl.optic_vendor,
+            sl.lot_code,
+            fr.return_date,
+            fr.confirmed_failure_mode
+        FROM dbo.Dim_Unit u
+        JOIN dbo.Dim_LineCard lc ON lc.linecard_id = u.linecard_id
+        JOIN dbo.Dim_SupplierLot sl ON sl.supplier_lot_id = u.supplier_lot_id
+        LEFT JOIN dbo.Fact_FieldReturn fr
+          ON fr.unit_serial = u.unit_serial AND fr.repair_action <> 'NFF';
+    """,
     "model_base": """
         USE NokiaFMA;
 
@@ -40,98 +85,66 @@ SQL = {
             tr.rx_power_dbm,
             s.calibration_date,
             sl.optic_vendor,
+            lc.fw_version,
             tr.test_type
         FROM dbo.Fact_TestRun tr
         JOIN dbo.Dim_Unit u ON u.unit_serial = tr.unit_serial
         JOIN dbo.Dim_Station s ON s.station_id = tr.station_id
         JOIN dbo.Dim_SupplierLot sl ON sl.supplier_lot_id = u.supplier_lot_id
+        JOIN dbo.Dim_LineCard lc ON lc.linecard_id = u.linecard_id
         WHERE tr.temp_c IS NOT NULL AND tr.ripple_mv IS NOT NULL
           AND tr.ber IS NOT NULL AND tr.q_factor IS NOT NULL
           AND tr.eye_height_mv IS NOT NULL AND tr.rx_power_dbm IS NOT NULL;
     """,
-    "rca_scorecard": """
+    # joined base for src/rca_ranker.py, which derives the driver flags and counts lift in one pass
+    "rca_base": """
         USE NokiaFMA;
 
-        WITH base AS (
-          SELECT
-            tr.pass_fail,
-            CASE WHEN tr.temp_c >= 75 THEN 1 ELSE 0 END AS high_temp,
-            CASE WHEN tr.ripple_mv >= 35 THEN 1 ELSE 0 END AS high_ripple,
-            CASE WHEN sl.optic_vendor = 'OptiCore' THEN 1 ELSE 0 END AS opti_vendor,
-            CASE WHEN s.calibration_date < '2024-02-01' THEN 1 ELSE 0 END AS drift_station
-          FROM dbo.Fact_TestRun tr
-          JOIN dbo.Dim_Unit u ON u.unit_serial = tr.unit_serial
-          JOIN dbo.Dim_SupplierLot sl ON sl.supplier_lot_id = u.supplier_lot_id
-          JOIN dbo.Dim_Station s ON s.station_id = tr.station_id
-        ),
-        agg AS (
-          SELECT
-            SUM(CASE WHEN high_temp=1 THEN 1 ELSE 0 END) AS n_high_temp,
-            SUM(CASE WHEN high_temp=1 AND pass_fail=0 THEN 1 ELSE 0 END) AS f_high_temp,
-            SUM(CASE WHEN high_temp=0 THEN 1 ELSE 0 END) AS n_low_temp,
-            SUM(CASE WHEN high_temp=0 AND pass_fail=0 THEN 1 ELSE 0 END) AS f_low_temp,
-
-            SUM(CASE WHEN high_ripple=1 THEN 1 ELSE 0 END) AS n_high_ripple,
-            SUM(CASE WHEN high_ripple=1 AND pass_fail=0 THEN 1 ELSE 0 END) AS f_high_ripple,
-            SUM(CASE WHEN high_ripple=0 THEN 1 ELSE 0 END) AS n_low_ripple,
-            SUM(CASE WHEN high_ripple=0 AND pass_fail=0 THEN 1 ELSE 0 END) AS f_low_ripple,
-
-            SUM(CASE WHEN opti_vendor=1 THEN 1 ELSE 0 END) AS n_opti,
-            SUM(CASE WHEN opti_vendor=1 AND pass_fail=0 THEN 1 ELSE 0 END) AS f_opti,
-            SUM(CASE WHEN opti_vendor=0 THEN 1 ELSE 0 END) AS n_nonopti,
-            SUM(CASE WHEN opti_vendor=0 AND pass_fail=0 THEN 1 ELSE 0 END) AS f_nonopti,
-
-            SUM(CASE WHEN drift_station=1 THEN 1 ELSE 0 END) AS n_drift,
-            SUM(CASE WHEN drift_station=1 AND pass_fail=0 THEN 1 ELSE 0 END) AS f_drift,
-            SUM(CASE WHEN drift_station=0 THEN 1 ELSE 0 END) AS n_nondrift,
-            SUM(CASE WHEN drift_station=0 AND pass_fail=0 THEN 1 ELSE 0 END) AS f_nondrift
-          FROM base
-        )
         SELECT
-          driver,
-          fail_present,
-          fail_absent,
-          (fail_present / NULLIF(fail_absent,0)) AS lift_ratio
-        FROM (
-          SELECT 'HIGH_TEMP' AS driver,
-                 (1.0 * f_high_temp / NULLIF(n_high_temp,0)) AS fail_present,
-                 (1.0 * f_low_temp  / NULLIF(n_low_temp,0))  AS fail_absent
-          FROM agg
-          UNION ALL
-          SELECT 'HIGH_RIPPLE',
-                 (1.0 * f_high_ripple / NULLIF(n_high_ripple,0)),
-                 (1.0 * f_low_ripple  / NULLIF(n_low_ripple,0))
-          FROM agg
-          UNION ALL
-          SELECT 'DRIFT_STATION',
-                 (1.0 * f_drift / NULLIF(n_drift,0)),
-                 (1.0 * f_nondrift / NULLIF(n_nondrift,0))
-          FROM agg
-          UNION ALL
-          SELECT 'OPTIC_VENDOR_OPTICORE',
-                 (1.0 * f_opti / NULLIF(n_opti,0)),
-                 (1.0 * f_nonopti / NULLIF(n_nonopti,0))
-          FROM agg
-        ) x
-        ORDER BY lift_ratio DESC;
+            tr.pass_fail,
+            tr.failure_code,
+            tr.temp_c,
+            tr.ripple_mv,
+            s.calibration_date,
+            sl.optic_vendor
+        FROM dbo.Fact_TestRun tr
+        JOIN dbo.Dim_Unit u ON u.unit_serial = tr.unit_serial
+        JOIN dbo.Dim_SupplierLot sl ON sl.supplier_lot_id = u.supplier_lot_id
+        JOIN dbo.Dim_Station s ON s.station_id = tr.station_id;
     """
 }
+# same rows without the TOP cap, for the streaming trainer (never materialized as one frame), plus the
+# row key its train / holdout split is made on: row order is not stable between passes over the query
+SQL["model_base_full"] = SQL["model_base"].replace("SELECT TOP (200000)", "SELECT\n            tr.test_run_id,", 1)
 
 
 def connect():
-    # From a Docker container on Mac, connect to host-mapped port 1433:
-    host = os.getenv("SQL_HOST", "host.docker.internal")
-    user = os.getenv("SQL_USER", "sa")
-    pwd  = os.getenv("SQL_PASSWORD", "Str0ng!Passw0rd123")
-    port = int(os.getenv("SQL_PORT", "1433"))
-    return pymssql.connect(server=host, user=user, password=pwd, port=port, database="master")
+    # FMA_BACKEND=mssql (default, SQL Server via SQL_HOST/SQL_PORT/...) or duckdb (embedded, FMA_DATA_DIR)
+    return backends.connect()
 
 
 def fetch_df(conn, query: str) -> pd.DataFrame:
-    return pd.read_sql(query, conn)
+    return backends.fetch_df(conn, query)
+
 
+def fetch_chunks(conn, query: str, chunk_rows: int = STREAM_CHUNK_ROWS):
+    return backends.fetch_chunks(conn, query, chunk_rows)
 
-def weibull_time_to_failure(df_returns: pd.DataFrame, out_dir: str):
+
+def save_output(df: pd.DataFrame, out_dir: str, name: str):
+    if OUTPUT_FORMAT == "parquet":
+        write_table(df, os.path.join(out_dir, name + ".parquet"))
+    else:
+        df.to_csv(os.path.join(out_dir, name + ".csv"), index=False)
+
+
+def with_unit_id(df: pd.DataFrame, units: UnitDictionary) -> pd.DataFrame:
+    """Swap the unit_serial key for its int32 unit_id (decode it again only for display/exports)."""
+    df.insert(0, "unit_id", units.encode(df.pop("unit_serial")))
+    return df
+
+
+def weibull_time_to_failure(df_returns: pd.DataFrame, out_dir: str, units: UnitDictionary):
     df = df_returns.copy()
     df["build_date"] = pd.to_datetime(df["build_date"])
     df["return_date"] = pd.to_datetime(df["return_date"])
@@ -140,25 +153,27 @@ def weibull_time_to_failure(df_returns: pd.DataFrame, out_dir: str):
 
     # Fit Weibull (2-parameter, location fixed at 0)
     data = df["ttf_days"].values.astype(float)
-    c, loc, scale = weibull_min.fit(data, floc=0)
-
-    # Plot empirical CDF vs fitted CDF
-    xs = np.linspace(data.min(), data.max(), 200)
-    fitted_cdf = weibull_min.cdf(xs, c, loc=0, scale=scale)
-
-    # empirical CDF
-    sorted_data = np.sort(data)
-    ecdf = np.arange(1, len(sorted_data) + 1) / len(sorted_data)
-
-    plt.figure()
-    plt.plot(sorted_data, ecdf, marker=".", linestyle="none", alpha=0.6)
-    plt.plot(xs, fitted_cdf)
-    plt.xlabel("Time-to-Failure (days)")
-    plt.ylabel("CDF")
-    plt.title(f"Weibull Fit (shape={c:.2f}, scale={scale:.1f})")
-    plt.tight_layout()
-    plt.savefig(os.path.join(out_dir, "weibull_cdf.png"), dpi=160)
-    plt.close()
+    with stage("fit", rows=len(data)):
+        c, loc, scale = weibull_min.fit(data, floc=0)
+
+    with stage("plot"):
+        # Plot empirical CDF vs fitted CDF
+        xs = np.linspace(data.min(), data.max(), 200)
+        fitted_cdf = weibull_min.cdf(xs, c, loc=0, scale=scale)
+
+        # empirical CDF
+        sorted_data = np.sort(data)
+        ecdf = np.arange(1, len(sorted_data) + 1) / len(sorted_data)
+
+        plt.figure()
+        plt.plot(sorted_data, ecdf, marker=".", linestyle="none", alpha=0.6)
+        plt.plot(xs, fitted_cdf)
+        plt.xlabel("Time-to-Failure (days)")
+        plt.ylabel("CDF")
+        plt.title(f"Weibull Fit (shape={c:.2f}, scale={scale:.1f})")
+        plt.tight_layout()
+        plt.savefig(os.path.join(out_dir, "weibull_cdf.png"), dpi=160)
+        plt.close()
 
     summary = pd.DataFrame([{
         "n_returns_used": int(len(df)),
@@ -168,67 +183,62 @@ def weibull_time_to_failure(df_returns: pd.DataFrame, out_dir: str):
         "p10_ttf_days": float(weibull_min.ppf(0.10, c, loc=0, scale=scale)),
         "p90_ttf_days": float(weibull_min.ppf(0.90, c, loc=0, scale=scale)),
     }])
-    summary.to_csv(os.path.join(out_dir, "weibull_summary.csv"), index=False)
-    df[["unit_serial", "ttf_days", "confirmed_failure_mode"]].to_csv(
-        os.path.join(out_dir, "returns_ttf.csv"), index=False
-    )
+    save_output(summary, out_dir, "weibull_summary")
+    ttf = df[["unit_id", "ttf_days", "confirmed_failure_mode"]].reset_index(drop=True)
+    ttf.insert(1, "unit_serial", units.decode(ttf["unit_id"]))
+    save_output(ttf, out_dir, "returns_ttf")
     return summary
 
 
 def driver_model(df_base: pd.DataFrame, out_dir: str):
-    df = df_base.copy()
-
-    # target: fail=1
-    df["y_fail"] = (df["pass_fail"] == 0).astype(int)
+    with stage("features", rows=len(df_base)):
+        pipeline = FeaturePipeline().fit(df_base)
+        X = pipeline.transform(df_base)
+        y = fail_target(df_base)
 
-    # engineer features
-    df["high_temp"] = (df["temp_c"] >= 75).astype(int)
-    df["high_ripple"] = (df["ripple_mv"] >= 35).astype(int)
-    df["drift_station"] = (pd.to_datetime(df["calibration_date"]) < pd.Timestamp("2024-02-01")).astype(int)
-    df["opti_vendor"] = (df["optic_vendor"] == "OptiCore").astype(int)
-
-    # basic numeric features (log BER helps)
-    df["log10_ber"] = np.log10(df["ber"].clip(lower=1e-12))
-
-    # one-hot for test_type
-    test_dummies = pd.get_dummies(df["test_type"], prefix="test")
-    X = pd.concat([
-        df[["temp_c","ripple_mv","q_factor","eye_height_mv","rx_power_dbm","log10_ber",
-            "high_temp","high_ripple","drift_station","opti_vendor"]],
-        test_dummies
-    ], axis=1)
-
-    y = df["y_fail"].values
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42, stratify=y)
+    # split by index and train with zero weight on the test rows: same fit as on the train subset,
+    # without copying the design matrix into train/test halves
+    train_idx, test_idx = train_test_split(np.arange(len(y)), test_size=0.25, random_state=42, stratify=y)
+    train_weight = np.zeros(len(y))
+    train_weight[train_idx] = 1.0
 
     # Logistic regression (interpretable, Nokia-friendly)
     model = LogisticRegression(max_iter=2000, n_jobs=1)
-    model.fit(X_train, y_train)
+    with stage("fit", rows=len(train_idx)):
+        model.fit(X, y, sample_weight=train_weight)
 
-    proba = model.predict_proba(X_test)[:, 1]
-    auc = roc_auc_score(y_test, proba)
+    with stage("evaluate", rows=len(test_idx)):
+        proba = model.predict_proba(X[test_idx])[:, 1]
+        auc = roc_auc_score(y[test_idx], proba)
 
     # Coefficients -> importance
     coefs = pd.DataFrame({
-        "feature": X.columns,
+        "feature": pipeline.columns,
         "coef": model.coef_[0]
     }).sort_values("coef", ascending=False)
 
-    coefs.to_csv(os.path.join(out_dir, "logreg_feature_coeffs.csv"), index=False)
+    write_driver_report(coefs, auc, out_dir, classification_report(y[test_idx], (proba >= 0.5).astype(int)))
+    fitted = LinearModel.from_pipeline(pipeline, model.coef_[0], model.intercept_[0], metadata={
+        "trainer": "LogisticRegression", "query": "model_base", "n_rows": len(y), "auc": auc})
+    return auc, coefs, fitted
+
+
+def write_driver_report(coefs: pd.DataFrame, auc: float, out_dir: str, classification: str):
+    save_output(coefs, out_dir, "logreg_feature_coeffs")
 
     # Simple bar plot (top +/- features)
     top_pos = coefs.head(10)
     top_neg = coefs.tail(10)
 
     plot_df = pd.concat([top_pos, top_neg], axis=0)
-    plt.figure(figsize=(10, 6))
-    plt.barh(plot_df["feature"], plot_df["coef"])
-    plt.xlabel("Logistic Regression Coefficient")
-    plt.title(f"Failure Driver Model (AUC={auc:.3f})")
-    plt.tight_layout()
-    plt.savefig(os.path.join(out_dir, "logreg_feature_coeffs.png"), dpi=160)
-    plt.close()
+    with stage("plot"):
+        plt.figure(figsize=(10, 6))
+        plt.barh(plot_df["feature"], plot_df["coef"])
+        plt.xlabel("Logistic Regression Coefficient")
+        plt.title(f"Failure Driver Model (AUC={auc:.3f})")
+        plt.tight_layout()
+        plt.savefig(os.path.join(out_dir, "logreg_feature_coeffs.png"), dpi=160)
+        plt.close()
 
     # Save a short text report
     with open(os.path.join(out_dir, "model_report.txt"), "w") as f:
@@ -238,35 +248,259 @@ def driver_model(df_base: pd.DataFrame, out_dir: str):
         f.write("\n\nTop negative drivers:\n")
         f.write(top_neg.to_string(index=False))
         f.write("\n\nClassification report (threshold=0.5):\n")
-        f.write(classification_report(y_test, (proba >= 0.5).astype(int)))
+        f.write(classification)
 
-    return auc, coefs
 
+# ---- streaming driver model (full table, bounded memory) ----
+class ScoreHistogram:
+    """
+    Held-out decision scores binned by class, so AUC over hundreds of millions of rows needs
+    O(bins) memory. Exact up to ties within a bin (counted as half, like tied scores).
+    """
+
+    def __init__(self, bins: int = 8192, lo: float = -20.0, hi: float = 20.0):
+        self.edges = np.linspace(lo, hi, bins + 1)
+        self.pos = np.zeros(bins + 2, dtype=np.int64)
+        self.neg = np.zeros(bins + 2, dtype=np.int64)
+        self.confusion = np.zeros((2, 2), dtype=np.int64)  # [y_true, y_pred] at threshold 0.5
+
+    def update(self, y: np.ndarray, scores: np.ndarray):
+        idx = np.searchsorted(self.edges, scores, side="right")
+        self.pos += np.bincount(idx[y == 1], minlength=self.pos.size)
+        self.neg += np.bincount(idx[y == 0], minlength=self.neg.size)
+        self.confusion += np.bincount(2 * y + (scores >= 0), minlength=4).reshape(2, 2)
+
+    def auc(self) -> float:
+        n_pos, n_neg = self.pos.sum(), self.neg.sum()
+        if n_pos == 0 or n_neg == 0:
+            return float("nan")
+        neg_below = np.cumsum(self.neg) - self.neg
+        return float((self.pos * (neg_below + 0.5 * self.neg)).sum() / (n_pos * n_neg))
+
+    def report(self) -> str:
+        lines = [f"{'':>8}{'precision':>11}{'recall':>9}{'support':>11}"]
+        for label in (0, 1):
+            tp = self.confusion[label, label]
+            predicted = self.confusion[:, label].sum()
+            support = self.confusion[label].sum()
+            precision = tp / predicted if predicted else 0.0
+            recall = tp / support if support else 0.0
+            lines.append(f"{label:>8}{precision:>11.2f}{recall:>9.2f}{support:>11}")
+        return "\n".join(lines) + "\n"
+
+
+def _holdout_mask(chunk: pd.DataFrame, every: int) -> np.ndarray:
+    # keyed on the row, not its position in the stream: the scaler pass, every epoch and the evaluate
+    # pass see the rows in whatever order the database returns them, and must agree on the split
+    return (chunk["test_run_id"].to_numpy(dtype=np.int64) % every) == 0
+
+
+def driver_model_streaming(conn, out_dir: str, chunk_rows: int = STREAM_CHUNK_ROWS,
+                           holdout_every: int = HOLDOUT_EVERY, epochs: int = STREAM_EPOCHS):
+    """
+    driver_model() over the full model_base query, streamed in chunks of chunk_rows.
 
-def main():
+    Pass 1 collects feature means/variances and the test types, then each epoch runs
+    SGD logistic regression (partial_fit) on standardized features, and a last pass scores the
+    held-out rows (test_run_id divisible by holdout_every) into a ScoreHistogram. Coefficients are mapped
+    back to raw feature units so they read like the in-memory LogisticRegression ones.
+    """
+    query = SQL["model_base_full"]
+    n_cont = len(NUMERIC)
+
+    scaler = StandardScaler()
+    pipeline = FeaturePipeline()
+    n_rows = 0
+    with stage("features") as s:
+        for chunk in fetch_chunks(conn, query, chunk_rows):
+            scaler.partial_fit(pipeline.transform(chunk, numeric_only=True))
+            pipeline.partial_fit(chunk)
+            n_rows += len(chunk)
+        s.rows = n_rows
+    columns = pipeline.columns
+    print(f"Streaming driver model over {n_rows:,} rows ({len(columns) - n_cont} one-hot columns)")
+    mean, scale = scaler.mean_.astype(np.float32), scaler.scale_.astype(np.float32)
+
+    def design(chunk):
+        Xs = pipeline.transform(chunk)
+        Xs[:, :n_cont] -= mean
+        Xs[:, :n_cont] /= scale
+        return Xs, fail_target(chunk)
+
+    # slowly decaying step size: stable under partial_fit on DB-ordered (unshuffled) chunks
+    model = SGDClassifier(loss="log_loss", alpha=1e-6, learning_rate="invscaling", eta0=0.05, power_t=0.25,
+                          random_state=42)
+    for _ in range(epochs):
+        with stage("fit", rows=n_rows):
+            for chunk in fetch_chunks(conn, query, chunk_rows):
+                Xs, y = design(chunk)
+                train = ~_holdout_mask(chunk, holdout_every)
+                if train.any():
+                    model.partial_fit(Xs[train], y[train], classes=np.array([0, 1]))
+
+    hist = ScoreHistogram()
+    with stage("evaluate", rows=n_rows):
+        for chunk in fetch_chunks(conn, query, chunk_rows):
+            Xs, y = design(chunk)
+            test = _holdout_mask(chunk, holdout_every)
+            hist.update(y[test], model.decision_function(Xs[test]))
+    auc = hist.auc()
+
+    # standardized -> raw units: w_raw = w / scale, intercept absorbs the centering
+    coef = model.coef_[0].copy()
+    coef[:n_cont] /= scaler.scale_
+    intercept = model.intercept_[0] - float((coef[:n_cont] * scaler.mean_).sum())
+    coefs = pd.DataFrame({"feature": columns, "coef": coef}).sort_values("coef", ascending=False)
+
+    report = hist.report() + f"\nRows: {n_rows:,} (holdout every {holdout_every}), intercept: {intercept:.4f}\n"
+    write_driver_report(coefs, auc, out_dir, report)
+    fitted = LinearModel.from_pipeline(pipeline, coef, intercept, metadata={
+        "trainer": "SGDClassifier (streamed)", "query": "model_base_full", "n_rows": n_rows, "auc": auc})
+    return auc, coefs, fitted
+
+
+# ---- the three analyses (independent of each other; src/pipeline.py runs them in parallel) ----
+def weibull_analysis(conn, units: UnitDictionary, out_dir: str, n_boot: int = BOOTSTRAP_REPLICATES):
+    """Uncensored TTF fit + censored per-group reliability table; returns the TTF summary."""
+    with stage("weibull_ttf"):
+        df_returns = with_unit_id(fetch_df(conn, SQL["returns_ttf"]), units)
+    with stage("weibull_reliability") as s:
+        surv = unit_survival(with_unit_id(fetch_df(conn, SQL["unit_survival"]), units))
+        s.rows = len(surv)
+    return weibull_fits(df_returns, surv, units, out_dir, n_boot)
+
+
+def weibull_fits(df_returns: pd.DataFrame, surv: pd.DataFrame, units: UnitDictionary, out_dir: str,
+                 n_boot: int = BOOTSTRAP_REPLICATES):
+    with stage("weibull_ttf"):
+        weibull_summary = weibull_time_to_failure(df_returns, out_dir, units)
+
+    # Censored Weibull per vendor / lot / FW version x failure mode (all groups in one solve)
+    with stage("weibull_reliability"):
+        reliability = reliability_table(surv)
+        if n_boot:
+            with stage("bootstrap"):
+                reliability = weibull_intervals(surv, reliability, n_replicates=n_boot)
+        save_output(reliability, out_dir, "weibull_reliability")
+    return weibull_summary
+
+
+def driver_analysis(conn, out_dir: str, stream: bool = False, chunk_rows: int = STREAM_CHUNK_ROWS):
+    """Fit, report and register the driver model; returns (AUC, registry version)."""
+    with stage("driver_model"):
+        if stream:
+            auc, coefs, model = driver_model_streaming(conn, out_dir, chunk_rows=chunk_rows)
+        else:
+            df_base = fetch_df(conn, SQL["model_base"])
+            auc, coefs, model = driver_model(df_base, out_dir)
+        with stage("save_model"):
+            model_version = save_model(model, MODEL_NAME)
+    return auc, model_version
+
+
+def rca_analysis(conn, out_dir: str, chunk_rows: int = STREAM_CHUNK_ROWS, n_boot: int = BOOTSTRAP_REPLICATES):
+    """RCA scorecard + per-failure-mode lift (one streamed pass over the joined base)."""
+    with stage("rca") as s:
+        lift = DriverLiftCounter()
+        for chunk in fetch_chunks(conn, SQL["rca_base"], chunk_rows):
+            with stage("count", rows=len(chunk)):
+                lift.update(chunk)
+            s.add_rows(len(chunk))
+        if n_boot:
+            with stage("bootstrap"):
+                rca, rca_mode = lift_intervals(lift, n_replicates=n_boot)
+        else:
+            rca, rca_mode = lift.scorecard(), lift.by_failure_mode()
+        save_output(rca, out_dir, "rca_scorecard")
+        save_output(rca_mode, out_dir, "rca_by_failure_mode")
+    return rca
+
+
+# ---- concurrent mode (--concurrent) ----
+def _weibull_branch(conns, procs, out_dir: str, n_boot: int):
+    with conns.connection() as conn:
+        units = UnitDictionary.from_db(conn)
+        df_returns = with_unit_id(fetch_df(conn, SQL["returns_ttf"]), units)
+        surv = unit_survival(with_unit_id(fetch_df(conn, SQL["unit_survival"]), units))
+    return procs.submit(weibull_fits, df_returns, surv, units, out_dir, n_boot).result()
+
+
+def _driver_branch(conns, procs, out_dir: str, stream: bool, chunk_rows: int):
+    with conns.connection() as conn:
+        if stream:  # fetch and SGD interleave chunk by chunk: the whole branch stays on its thread
+            auc, coefs, model = driver_model_streaming(conn, out_dir, chunk_rows=chunk_rows)
+        else:
+            df_base = fetch_df(conn, SQL["model_base"])
+    if not stream:
+        auc, coefs, model = procs.submit(driver_model, df_base, out_dir).result()
+    return auc, save_model(model, MODEL_NAME)
+
+
+def _rca_branch(conns, out_dir: str, chunk_rows: int, n_boot: int):
+    with conns.connection() as conn:
+        return rca_analysis(conn, out_dir, chunk_rows, n_boot)
+
+
+def concurrent_analyses(out_dir: str, stream: bool = False, chunk_rows: int = STREAM_CHUNK_ROWS,
+                        n_boot: int = BOOTSTRAP_REPLICATES):
+    """
+    The three analyses at once; wall time approaches the slowest branch instead of the sum.
+    Each branch queries on its own connection from a thread, so the database I/O overlaps. The
+    Weibull and driver-model fits and plots then go to a process pool: they hold the GIL, and
+    pyplot is not thread-safe. The RCA branch counts its streamed chunks on its thread, and its
+    bootstrap uses src/bootstrap.py's own pool. Stages inside the branches are not recorded
+    (src/instrument.py times the owner thread only).
+    Returns (weibull summary, (AUC, model version), RCA scorecard).
+    """
+    if backends.BACKEND == "duckdb":
+        backends.connect_duckdb().close()  # (re)build once here, not from each pooled connection
+    conns = backends.ConnectionPool(connect, size=3)
+    try:
+        with ProcessPoolExecutor(max_workers=2) as procs, ThreadPoolExecutor(max_workers=3) as threads:
+            weibull = threads.submit(_weibull_branch, conns, procs, out_dir, n_boot)
+            driver = threads.submit(_driver_branch, conns, procs, out_dir, stream, chunk_rows)
+            rca = threads.submit(_rca_branch, conns, out_dir, chunk_rows, n_boot)
+            return weibull.result(), driver.result(), rca.result()
+    finally:
+        conns.close()
+
+
+def main(stream: bool = False, chunk_rows: int = STREAM_CHUNK_ROWS, n_boot: int = BOOTSTRAP_REPLICATES,
+         profile=(), concurrent: bool = False):
     out_dir = os.path.join(os.path.dirname(__file__), "..", "outputs")
     os.makedirs(out_dir, exist_ok=True)
 
-    conn = connect()
-
-    # Weibull
-    df_returns = fetch_df(conn, SQL["returns_ttf"])
-    weibull_summary = weibull_time_to_failure(df_returns, out_dir)
-
-    # Driver model
-    df_base = fetch_df(conn, SQL["model_base"])
-    auc, coefs = driver_model(df_base, out_dir)
-
-    # RCA scorecard
-    rca = fetch_df(conn, SQL["rca_scorecard"])
-    rca.to_csv(os.path.join(out_dir, "rca_scorecard.csv"), index=False)
+    with Run("rca_weibull", out_dir, profile=profile) as run:
+        if concurrent:
+            with stage("concurrent"):
+                weibull_summary, (auc, model_version), rca = concurrent_analyses(out_dir, stream, chunk_rows, n_boot)
+        else:
+            with stage("connect"):
+                conn = connect()
+                units = UnitDictionary.from_db(conn)
+            weibull_summary = weibull_analysis(conn, units, out_dir, n_boot)
+            auc, model_version = driver_analysis(conn, out_dir, stream, chunk_rows)
+            rca = rca_analysis(conn, out_dir, chunk_rows, n_boot)
+    run.write()
 
     print("✅ Outputs written to /outputs")
     print("Weibull summary:\n", weibull_summary.to_string(index=False))
-    print(f"Driver model AUC: {auc:.3f}")
+    print(f"Driver model AUC: {auc:.3f} (saved as {MODEL_NAME} v{model_version})")
     print("\nRCA scorecard:\n", rca.to_string(index=False))
+    print("\nStages (outputs/metrics/rca_weibull.json):\n" + run.table())
 
 
 if __name__ == "__main__":
-    main()
-
+    ap = argparse.ArgumentParser(description="Weibull time-to-failure, driver model and RCA scorecard.")
+    ap.add_argument("--stream", action="store_true",
+                    help="train the driver model on the full model_base result in chunks (SGD, bounded memory)")
+    ap.add_argument("--chunk-rows", type=int, default=STREAM_CHUNK_ROWS)
+    ap.add_argument("--bootstrap", type=int, default=BOOTSTRAP_REPLICATES,
+                    help="bootstrap replicates for lift / Weibull confidence intervals (0 = point estimates only)")
+    ap.add_argument("--concurrent", action="store_true",
+                    help="run the Weibull, driver model and RCA branches at once (own connections, process pool)")
+    ap.add_argument("--profile", nargs="+", default=[], metavar="STAGE",
+                    help="cProfile these stages (e.g. driver_model rca); dumps go to outputs/metrics/*.prof")
+    args = ap.parse_args()
+    main(stream=args.stream, chunk_rows=args.chunk_rows, n_boot=args.bootstrap, profile=args.profile,
+         concurrent=args.concurrent)
@@ -0,0 +1,282 @@
+"""
+Scale-parameterized benchmarks for the whole FMA pipeline.
+
+For each scale (Fact_TestRun rows), the generator writes a fresh dataset and every stage runs in
+its own process against it, so each stage's peak RSS is its own:
+
+  generate        data_gen/generate_data.py (numpy engine)         rows = test runs + telemetry
+  load            embedded DuckDB build (src/backends.py)          rows = rows loaded
+  lift            RCA scorecard + per-mode lift, streamed          rows = joined test runs
+  weibull         uncensored + censored per-group Weibull fits     rows = units
+  driver_model    feature matrix + logistic fit on model_base      rows = training rows
+  export          dashboard Parquet artifacts (export_dashboard)   rows = test runs scanned
+  dashboard_load  cold DashboardData read of every artifact        rows = artifact rows
+
+Each stage appends one JSON line (wall time, rows/s, peak RSS, git revision, scale) to the
+results file. The run is then compared with the previous run of the same scale, and stages more
+than REGRESSION_PCT slower are flagged (--strict exits 1 on them, for CI).
+
+  python benchmarks/run_benchmarks.py                          # 200k
+  python benchmarks/run_benchmarks.py --scales 200k 10M 100M --shards 8
+  python benchmarks/run_benchmarks.py --stages lift weibull --keep --work-dir /tmp/fma-bench
+"""
+import argparse
+import datetime as dt
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl")
+STAGES = ["generate", "load", "lift", "weibull", "driver_model", "export", "dashboard_load"]
+DEFAULT_SCALES = ["200k"]
+TELEMETRY_RATIO = 0.25  # telemetry rows per test run (the default 50k / 200k)
+REGRESSION_PCT = 15.0
+
+
+def parse_scale(text: str) -> int:
+    """'200k' / '10M' / '1.5B' / '250000' -> rows."""
+    text = text.strip().lower().replace("_", "")
+    for suffix, mult in (("k", 10**3), ("m", 10**6), ("b", 10**9)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * mult)
+    return int(text)
+
+
+def peak_rss_mb():
+    """Peak RSS (MB) of this process and its finished children (the generator subprocess)."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# -----------------------------
+# Stages (each runs in a fresh process: `--stage NAME`)
+# -----------------------------
+def stage_generate(args):
+    cmd = [sys.executable, os.path.join(REPO_DIR, "data_gen", "generate_data.py"), "--engine", "numpy",
+           "--format", args.format, "--testruns", str(args.testruns), "--telemetry", str(args.telemetry),
+           "--shards", str(args.shards), "--out-dir", args.data_dir]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    return args.testruns + args.telemetry
+
+
+def stage_load(args):
+    from src import backends
+
+    conn = backends.connect_duckdb(data_dir=args.data_dir)  # stale (no file yet): builds it
+    try:
+        return sum(conn.execute(f"SELECT COUNT(*) FROM dbo.{t}").fetchone()[0] for t in backends.TABLES)
+    finally:
+        conn.close()
+
+
+def stage_lift(args):
+    import rca_weibull
+    from src.rca_ranker import DriverLiftCounter
+
+    lift = DriverLiftCounter()
+    conn = rca_weibull.connect()
+    for chunk in rca_weibull.fetch_chunks(conn, rca_weibull.SQL["rca_base"]):
+        lift.update(chunk)
+    rca_weibull.save_output(lift.scorecard(), args.out_dir, "rca_scorecard")
+    rca_weibull.save_output(lift.by_failure_mode(), args.out_dir, "rca_by_failure_mode")
+    return int(lift.hist.sum())
+
+
+def stage_weibull(args):
+    import rca_weibull
+    from src.unit_dict import UnitDictionary
+    from src.weibull import reliability_table, unit_survival
+
+    conn = rca_weibull.connect()
+    units = UnitDictionary.from_db(conn)
+    returns = rca_weibull.with_unit_id(rca_weibull.fetch_df(conn, rca_weibull.SQL["returns_ttf"]), units)
+    rca_weibull.weibull_time_to_failure(returns, args.out_dir, units)
+    units_df = rca_weibull.with_unit_id(rca_weibull.fetch_df(conn, rca_weibull.SQL["unit_survival"]), units)
+    surv = unit_survival(units_df)
+    rca_weibull.save_output(reliability_table(surv), args.out_dir, "weibull_reliability")
+    return len(surv)
+
+
+def stage_driver_model(args):
+    import rca_weibull
+
+    df = rca_weibull.fetch_df(rca_weibull.connect(), rca_weibull.SQL["model_base"])
+    rca_weibull.driver_model(df, args.out_dir)
+    return len(df)
+
+
+def stage_export(args):
+    import export_dashboard
+
+    export_dashboard.export_all(args.out_dir, backend="duckdb")
+    return args.testruns
+
+
+def stage_dashboard_load(args):
+    from data_layer import ArtifactCache, DashboardData
+
+    data = DashboardData(ArtifactCache(), args.out_dir)
+    frames = [data.exec_overview(), data.pareto(), data.weekly_trend(), data.vendor_lot_returns(),
+              data.rca_scorecard(), data.rca_by_failure_mode()]
+    return sum(len(f) for f in frames)
+
+
+# imported before the clock starts, so stage times exclude sklearn/matplotlib start-up
+STAGE_IMPORTS = {
+    "load": ["src.backends"],
+    "lift": ["rca_weibull"],
+    "weibull": ["rca_weibull"],
+    "driver_model": ["rca_weibull"],
+    "export": ["export_dashboard"],
+    "dashboard_load": ["data_layer"],
+}
+
+
+def run_stage(args):
+    sys.path[:0] = [REPO_DIR, os.path.join(REPO_DIR, "analytics"), os.path.join(REPO_DIR, "dashboards")]
+    os.makedirs(args.out_dir, exist_ok=True)
+    for module in STAGE_IMPORTS.get(args.stage, []):
+        importlib.import_module(module)
+    t0 = time.perf_counter()
+    rows = globals()["stage_" + args.stage](args)
+    seconds = time.perf_counter() - t0
+    print(json.dumps({"rows": rows, "wall_seconds": seconds, "peak_rss_mb": peak_rss_mb()}))
+
+
+# -----------------------------
+# Driver
+# -----------------------------
+def stage_process(stage, testruns, telemetry, data_dir, out_dir, args):
+    """Run one stage in a fresh interpreter; returns its measurement dict."""
+    env = dict(os.environ, FMA_BACKEND="duckdb", FMA_DATA_DIR=data_dir, FMA_OUTPUT_FORMAT="parquet",
+               FMA_MODELS_DIR=os.path.join(out_dir, "models"))
+    env.pop("FMA_DUCKDB_PATH", None)
+    cmd = [sys.executable, os.path.abspath(__file__), "--stage", stage, "--testruns", str(testruns),
+           "--telemetry", str(telemetry), "--data-dir", data_dir, "--out-dir", out_dir,
+           "--format", args.format, "--shards", str(args.shards)]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"stage {stage} failed:\n{proc.stderr[-4000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def previous_results(path, scale, fmt, run_id):
+    """{stage: record} of the latest earlier run at this scale/format."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records = [r for r in records if r["scale"] == scale and r["format"] == fmt and r["run_id"] != run_id]
+    if not records:
+        return {}
+    last = records[-1]["run_id"]
+    return {r["stage"]: r for r in records if r["run_id"] == last}
+
+
+def run_scale(testruns, args, run_id, git_rev, host):
+    telemetry = int(testruns * args.telemetry_ratio)
+    work = args.work_dir or tempfile.mkdtemp(prefix="fma-bench-")
+    data_dir, out_dir = os.path.join(work, f"data-{testruns}"), os.path.join(work, f"outputs-{testruns}")
+    baseline = previous_results(args.results, testruns, args.format, run_id)
+    regressions = []
+    print(f"\n== {testruns:,} test runs / {telemetry:,} telemetry rows ({args.format}) ==")
+    print(f"   {'stage':<15}{'wall s':>10}{'rows/s':>14}{'peak MB':>10}   vs previous")
+    try:
+        for stage in args.stages:
+            m = stage_process(stage, testruns, telemetry, data_dir, out_dir, args)
+            record = {
+                "run_id": run_id, "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+                "git_rev": git_rev, "host": host, "scale": testruns, "telemetry_rows": telemetry,
+                "format": args.format, "shards": args.shards, "stage": stage,
+                "wall_seconds": round(m["wall_seconds"], 4), "rows": m["rows"],
+                "rows_per_sec": round(m["rows"] / m["wall_seconds"], 1) if m["wall_seconds"] > 0 else None,
+                "peak_rss_mb": round(m["peak_rss_mb"], 1) if m["peak_rss_mb"] is not None else None,
+            }
+            with open(args.results, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+            delta = ""
+            prev = baseline.get(stage)
+            if prev:
+                pct = 100.0 * (record["wall_seconds"] / prev["wall_seconds"] - 1.0)
+                flag = pct > args.regression_pct
+                delta = f"{pct:+.1f}% ({prev['git_rev'] or prev['run_id']})" + ("  ⚠️ regression" if flag else "")
+                if flag:
+                    regressions.append((testruns, stage, pct))
+            rss = f"{record['peak_rss_mb']:,.0f}" if record["peak_rss_mb"] is not None else "-"
+            rate = record["rows_per_sec"] or 0
+            print(f"   {stage:<15}{record['wall_seconds']:>10.2f}{rate:>14,.0f}{rss:>10}   {delta}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(data_dir, ignore_errors=True)
+            shutil.rmtree(out_dir, ignore_errors=True)
+            if not args.work_dir:
+                shutil.rmtree(work, ignore_errors=True)
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark every FMA pipeline stage at several data scales.")
+    ap.add_argument("--scales", nargs="+", default=DEFAULT_SCALES, help="Fact_TestRun rows, e.g. 200k 10M 100M")
+    ap.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    ap.add_argument("--format", choices=["csv", "parquet"], default="parquet", help="generated fact format")
+    ap.add_argument("--shards", type=int, default=1, help="generator worker processes")
+    ap.add_argument("--telemetry-ratio", type=float, default=TELEMETRY_RATIO)
+    ap.add_argument("--results", default=RESULTS, help="JSON-lines results file (appended)")
+    ap.add_argument("--work-dir", default=None, help="where datasets are generated (default: a temp dir)")
+    ap.add_argument("--keep", action="store_true", help="keep the generated data and outputs")
+    ap.add_argument("--regression-pct", type=float, default=REGRESSION_PCT)
+    ap.add_argument("--strict", action="store_true", help="exit 1 if any stage regressed")
+    # internal: run a single stage in this process
+    ap.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    ap.add_argument("--testruns", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--telemetry", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--data-dir", help=argparse.SUPPRESS)
+    ap.add_argument("--out-dir", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.stage:
+        run_stage(args)
+        return
+
+    if "generate" not in args.stages and not args.work_dir:
+        ap.error("skipping 'generate' needs --work-dir with data from a previous --keep run")
+    run_id = uuid.uuid4().hex[:12]
+    git_rev = git_revision()
+    host = {"python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count()}
+    regressions = []
+    for scale in args.scales:
+        regressions += run_scale(parse_scale(scale), args, run_id, git_rev, host)
+    print(f"\n✅ Results appended to {os.path.abspath(args.results)} (run {run_id})")
+    if regressions and args.strict:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""
+Dashboard data layer: parse each artifact once, hand back typed frames.
+
+Streamlit re-runs app.py top to bottom on every widget interaction. The loaders here do all
+parsing and type cleanup; an ArtifactCache (one per server process, via st.cache_resource) keeps
+the result keyed by path and file signature (mtime + size), so a re-run is a dict lookup and a
+re-export is picked up on the next interaction.
+
+Live mode skips the exports: LiveData runs the sql/ queries themselves through a ConnectionPool
+(src/backends.py, so an embedded DuckDB file can stand in for SQL Server) and keeps the results
+in a TTLCache shared by all sessions.
+
+When outputs/ also holds the test-run cube (src/cube.py), the pass rate, Pareto and weekly trend
+can be recomputed for any slice of products, lots and stations straight from its cells.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.backends import ConnectionPool, script_query  # noqa: E402
+from src.cube import CUBE_FILE, TestRunCube  # noqa: E402
+from src.storage import find_table, read_table  # noqa: E402
+
+OUTPUTS_DIR = "outputs"
+MAX_ENTRIES = 32
+LIVE_TTL_SECONDS = float(os.getenv("FMA_LIVE_TTL", "300"))
+
+# sqlcmd chatter that ends up in the text dumps (blank lines are skipped by the CSV parser itself)
+_NOISE_MARKERS = ("Changed database context", "rows affected)", "Msg ")
+
+
+# -----------------------------
+# Cache
+# -----------------------------
+class TTLCache:
+    """
+    LRU of computed values that expire `ttl` seconds after they were computed. Misses are
+    single-flight: while one thread computes a key, other threads asking for it wait for that
+    result instead of starting their own query. Failures are not cached.
+    """
+
+    def __init__(self, ttl: float = LIVE_TTL_SECONDS, max_entries: int = MAX_ENTRIES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._pending = {}  # key -> Future of the computation in flight
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and hit[0] > self.clock():
+                self._entries.move_to_end(key)
+                return hit[1]
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = Future()
+        if not owner:
+            return pending.result()
+
+        try:
+            value = compute()
+        except BaseException as exc:
+            with self._lock:
+                del self._pending[key]
+            pending.set_exception(exc)
+            raise
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            del self._pending[key]
+        pending.set_result(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def file_signature(path: str):
+    """(mtime_ns, size) of a file, or of the newest file / total size of a dataset directory."""
+    if os.path.isdir(path):
+        stats = [e.stat() for e in os.scandir(path) if e.is_file()]
+        return (max((s.st_mtime_ns for s in stats), default=0), sum(s.st_size for s in stats))
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ArtifactCache:
+    """
+    LRU of parsed artifacts keyed by (path, loader). An entry is served while the file signature
+    is unchanged; a changed file is re-parsed and replaces its stale entry. Thread-safe, since
+    Streamlit runs each session's script on its own thread.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (path, loader name) -> (signature, value)
+        self._lock = threading.Lock()
+
+    def get(self, path: str, loader):
+        key = (os.path.abspath(path), loader.__name__)
+        sig = file_signature(path)
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and hit[0] == sig:
+                self._entries.move_to_end(key)
+                return hit[1]
+        value = loader(path)  # parse outside the lock; a concurrent duplicate parse is harmless
+        with self._lock:
+            self._entries[key] = (sig, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# -----------------------------
+# Parsing
+# -----------------------------
+def noise_lines(text: str):
+    """0-based line numbers of sqlcmd noise lines, found by substring search (no per-line loop)."""
+    starts = set()
+    for marker in _NOISE_MARKERS:
+        pos = text.find(marker)
+        while pos != -1:
+            start = text.rfind("\n", 0, pos) + 1
+            end = text.find("\n", pos)
+            end = len(text) if end == -1 else end
+            if marker != "Msg " or text[start:end].lstrip().startswith("Msg "):
+                starts.add(start)
+            pos = text.find(marker, end)
+    lines, line, last = [], 0, 0
+    for start in sorted(starts):
+        line += text.count("\n", last, start)
+        lines.append(line)
+        last = start
+    return lines
+
+
+def read_clean_csv(path: str, header="infer", names=None, **kwargs) -> pd.DataFrame:
+    """
+    Read a CSV, skipping sqlcmd noise lines if they sneak in. The parser reads the file directly;
+    noise is located with substring search and passed as skiprows, so nothing is re-joined.
+    """
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        skip = noise_lines(f.read())
+    return pd.read_csv(path, header=header, names=names, skiprows=skip or None, **kwargs)
+
+
+def csv_has_header(path: str, first_column: str) -> bool:
+    """True when the first data line is a header row (CSV written by the analytics, not sqlcmd)."""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            if line.strip() and "Changed database context" not in line:
+                return line.split(",")[0].strip() == first_column
+    return False
+
+
+def read_artifact(path: str, names=None, **csv_kwargs) -> pd.DataFrame:
+    """Parquet artifact as is; CSV by its header, or by `names` for headerless sqlcmd dumps."""
+    if not path.endswith(".csv"):
+        return read_table(path)
+    if names is None or csv_has_header(path, names[0]):
+        return read_clean_csv(path, **csv_kwargs)
+    return read_clean_csv(path, header=None, names=names, **csv_kwargs)
+
+
+def _numeric(df: pd.DataFrame, columns) -> pd.DataFrame:
+    for col in columns:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+# -----------------------------
+# Typed frames (the same cleanup for exported files and live query results)
+# -----------------------------
+def tidy_exec_overview(df: pd.DataFrame):
+    return float(df.iloc[0, 0]), int(df.iloc[0, 1])
+
+
+def tidy_pareto(df: pd.DataFrame) -> pd.DataFrame:
+    df = _numeric(df, ["fail_count"]).dropna(subset=["failure_code", "fail_count"])
+    return df.sort_values("fail_count", ascending=False).set_index("failure_code")
+
+
+def tidy_weekly_trend(df: pd.DataFrame) -> pd.DataFrame:
+    week = df["build_week_start"]
+    if not pd.api.types.is_datetime64_any_dtype(week):
+        # sqlcmd prints e.g. 2024-12-30 00:00:00.000; DB-API drivers hand back datetime objects
+        fmt = "%Y-%m-%d %H:%M:%S.%f" if pd.api.types.is_string_dtype(week) else None
+        df["build_week_start"] = pd.to_datetime(week, format=fmt, errors="coerce")
+    df = _numeric(df, ["test_runs", "fails", "fail_rate_pct"])
+    return df.dropna(subset=["build_week_start", "fail_rate_pct"]).sort_values("build_week_start")
+
+
+def tidy_vendor_lot_returns(df: pd.DataFrame) -> pd.DataFrame:
+    df = _numeric(df, ["units_built", "units_returned", "field_return_rate_pct", "nff_count"])
+    df = df.dropna(subset=["optic_vendor", "lot_code", "field_return_rate_pct"])
+    return df.sort_values("field_return_rate_pct", ascending=False, ignore_index=True)
+
+
+def tidy_rca_scorecard(df: pd.DataFrame) -> pd.DataFrame:
+    if "lift_ratio" in df.columns:
+        df = _numeric(df, ["lift_ratio"]).dropna(subset=["driver", "lift_ratio"])
+        df = df.sort_values("lift_ratio", ascending=False, ignore_index=True)
+    return df
+
+
+def tidy_rca_by_failure_mode(df: pd.DataFrame) -> pd.DataFrame:
+    """Sorted by (failure_code, lift desc) with a categorical failure_code, so mode_rows() can slice."""
+    df = _numeric(df, ["n_present", "fail_rate_present", "n_absent", "fail_rate_absent", "lift_ratio"])
+    df = df.dropna(subset=["failure_code", "driver", "lift_ratio"])
+    if not isinstance(df["failure_code"].dtype, pd.CategoricalDtype):
+        df["failure_code"] = df["failure_code"].astype("category")
+    # header rows / unused dictionary entries must not show up as selectable modes
+    df["failure_code"] = df["failure_code"].cat.remove_unused_categories()
+    return df.sort_values(["failure_code", "lift_ratio"], ascending=[True, False], ignore_index=True)
+
+
+def kpi_counts(vendor_lot_returns: pd.DataFrame):
+    """(field returns, units built) summed over the supplier-lot table."""
+    return int(vendor_lot_returns["units_returned"].sum()), int(vendor_lot_returns["units_built"].sum())
+
+
+def mode_rows(rca_mode: pd.DataFrame, mode: str) -> pd.DataFrame:
+    """Rows of one failure mode: a binary-search slice of the sorted frame instead of a full scan."""
+    codes = rca_mode["failure_code"].cat.codes.to_numpy()
+    code = rca_mode["failure_code"].cat.categories.get_loc(mode)
+    lo, hi = np.searchsorted(codes, [code, code + 1])
+    return rca_mode.iloc[lo:hi]
+
+
+# -----------------------------
+# Exported artifacts (one loader per file; cached by path)
+# -----------------------------
+def parse_exec_overview(path: str):
+    """(pass_rate_pct, total_runs) from the first `number,number` line or the Parquet row."""
+    if not path.endswith(".csv"):
+        return tidy_exec_overview(read_table(path))
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            line = line.strip()
+            if re.match(r"^[0-9.]+,[0-9]+$", line):
+                a, b = line.split(",")
+                return float(a), int(b)
+    raise ValueError(f"No valid 'number,number' line found in {path}")
+
+
+def parse_pareto(path: str) -> pd.DataFrame:
+    return tidy_pareto(read_artifact(path, ["failure_code", "fail_count"]))
+
+
+def parse_weekly_trend(path: str) -> pd.DataFrame:
+    return tidy_weekly_trend(read_artifact(path, ["build_week_start", "test_runs", "fails", "fail_rate_pct"]))
+
+
+def parse_vendor_lot_returns(path: str) -> pd.DataFrame:
+    return tidy_vendor_lot_returns(read_artifact(path, ["optic_vendor", "lot_code", "units_built", "units_returned",
+                                                        "field_return_rate_pct", "nff_count"]))
+
+
+def parse_rca_scorecard(path: str) -> pd.DataFrame:
+    return tidy_rca_scorecard(read_artifact(path))
+
+
+def parse_cube(path: str) -> TestRunCube:
+    return TestRunCube.load(path)
+
+
+def parse_rca_by_failure_mode(path: str) -> pd.DataFrame:
+    return tidy_rca_by_failure_mode(read_artifact(
+        path, ["failure_code", "driver", "n_present", "fail_rate_present", "n_absent", "fail_rate_absent",
+               "lift_ratio"], dtype={"failure_code": "category"}))
+
+
+class DashboardData:
+    """Typed dashboard inputs, read through an ArtifactCache from base_dir."""
+
+    def __init__(self, cache: ArtifactCache, base_dir: str = OUTPUTS_DIR):
+        self.cache = cache
+        self.base_dir = base_dir
+
+    def _get(self, name: str, loader):
+        return self.cache.get(find_table(self.base_dir, name), loader)
+
+    def exec_overview(self):
+        return self._get("pbi_exec_overview", parse_exec_overview)
+
+    def pareto(self):
+        return self._get("pbi_failure_pareto", parse_pareto)
+
+    def weekly_trend(self):
+        return self._get("pbi_weekly_trend", parse_weekly_trend)
+
+    def vendor_lot_returns(self):
+        return self._get("pbi_vendor_lot_returns", parse_vendor_lot_returns)
+
+    def rca_scorecard(self):
+        return self._get("rca_scorecard", parse_rca_scorecard)
+
+    def rca_by_failure_mode(self):
+        return self._get("rca_by_failure_mode", parse_rca_by_failure_mode)
+
+    def cube(self):
+        """The test-run cube, or None when it has not been built (python -m src.cube)."""
+        path = os.path.join(self.base_dir, CUBE_FILE)
+        return self.cache.get(path, parse_cube) if os.path.exists(path) else None
+
+
+# -----------------------------
+# Live queries
+# -----------------------------
+# dashboard frame -> (backends.SCRIPT_QUERIES name, tidy function)
+LIVE_QUERIES = {
+    "exec_overview": ("pbi_exec_overview", tidy_exec_overview),
+    "pareto": ("pbi_failure_pareto", tidy_pareto),
+    "weekly_trend": ("pbi_weekly_trend", tidy_weekly_trend),
+    "vendor_lot_returns": ("pbi_vendor_lot_returns", tidy_vendor_lot_returns),
+    "rca_scorecard": ("pbi_driver_strength", tidy_rca_scorecard),
+    "rca_by_failure_mode": ("pbi_rca_by_failure_mode", tidy_rca_by_failure_mode),
+}
+
+
+class LiveData:
+    """
+    The DashboardData frames, queried from the database. Results are shared through a TTLCache,
+    so however many sessions are open, each query runs at most once per TTL window; the misses
+    take turns on a small ConnectionPool.
+    """
+
+    def __init__(self, pool: ConnectionPool, cache: TTLCache):
+        self.pool = pool
+        self.cache = cache
+
+    def _get(self, name: str):
+        query, tidy = LIVE_QUERIES[name]
+        return self.cache.get(name, lambda: tidy(self.pool.fetch_df(script_query(query))))
+
+    def exec_overview(self):
+        return self._get("exec_overview")
+
+    def pareto(self):
+        return self._get("pareto")
+
+    def weekly_trend(self):
+        return self._get("weekly_trend")
+
+    def vendor_lot_returns(self):
+        return self._get("vendor_lot_returns")
+
+    def rca_scorecard(self):
+        return self._get("rca_scorecard")
+
+    def rca_by_failure_mode(self):
+        return self._get("rca_by_failure_mode")
+
+
+# -----------------------------
+# Cube slices
+# -----------------------------
+# dashboard frames a cube slice can stand in for (computed from its cells, tidied like the exports)
+CUBE_FRAMES = ["exec_overview", "pareto", "weekly_trend"]
+
+
+def cube_frame(cube: TestRunCube, name: str):
+    query, tidy = LIVE_QUERIES[name]
+    return tidy(cube.kpi(query))
@@ -1,8 +1,34 @@
+import argparse
+import bisect
 import csv
+import glob
+import itertools
 import os
 import random
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, date
 
+import numpy as np
+import pandas as pd
+
+try:  # optional: multi-threaded CSV writer (~10x faster than DataFrame.to_csv) and the Parquet output format
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.instrument import Run, stage  # noqa: E402
+
 OUT_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
 
 # ------------ Config (tweak these) ------------
@@ -27,8 +53,51 @@ STATION_DRIFT_FRACTION = 0.15  # stations with overdue calibration => more NFF
 FW_REGRESSION = "2.1.0"
 FW_REGRESSION_FAIL_BOOST = 0.010
 
+# Generation engine: "python" = reference row-by-row loop (stdlib random),
+# "numpy" = vectorized batch engine (same knobs, statistically equivalent output)
+ENGINE = "python"
+# Fact tables are generated and flushed CHUNK_ROWS at a time, so peak memory does not grow with
+# N_TESTRUNS / N_TELEMETRY_POINTS (numpy output is reproducible for a given SEED + CHUNK_ROWS)
+CHUNK_ROWS = 1_000_000
+# Sharded generation (numpy engine): each of N_SHARDS worker processes owns a contiguous slice of units
+# and its share of the fact rows, seeded from SeedSequence(SEED).spawn(); dimensions and the
+# hot/ripple/fw unit sets are built once in the parent, so output is reproducible for SEED + N_SHARDS
+N_SHARDS = 1
+MERGE_SHARDS = True  # concatenate the per-shard part files into the single CSV the loaders expect
+# Fact table format: "csv" (what sql/load_v3_data.sql BULK INSERTs) or "parquet" (typed + columnar:
+# dictionary-encoded strings, float32 metrics, time-sorted row groups with min/max stats; needs pyarrow).
+# Dimensions are always written as CSV (a few KB, and the SQL loaders need them).
+OUTPUT_FORMAT = "csv"
+PARQUET_ROW_GROUP_ROWS = 128 * 1024
+
 # ---------------------------------------------
 
+TEST_TYPES = ["ICT","FUNCTIONAL","BURNIN","OPTICAL"]
+FAILURE_CODES = ["THERMAL_DRIFT","VOLTAGE_RIPPLE","OPTICS_DEGRADATION","STATION_FALSE_FAIL","FW_REGRESSION","UNKNOWN"]
+
+SYMPTOM_MAP = {
+    "THERMAL_DRIFT": "INTERMITTENT_LINK_DROP",
+    "VOLTAGE_RIPPLE": "BOOT_FAILURE",
+    "OPTICS_DEGRADATION": "HIGH_BER_ALARM",
+    "FW_REGRESSION": "CRC_ERRORS",
+    "STATION_FALSE_FAIL": "NO_SYMPTOM_REPRO",
+    "UNKNOWN": "UNSTABLE_THROUGHPUT"
+}
+
+TESTRUN_HEADER = ["unit_serial","station_id","test_type","start_ts","end_ts","pass_fail","failure_code",
+                  "ber","q_factor","eye_height_mv","eye_width_ps","rx_power_dbm","tx_power_dbm",
+                  "vcore_v","vaux_v","iin_a","ripple_mv","temp_c","humidity_pct"]
+FIELDRETURN_HEADER = ["unit_serial","return_date","symptom_code","confirmed_failure_mode","repair_action","notes"]
+TELEMETRY_HEADER = ["unit_serial","ts","temp_c","vcore_v","ripple_mv","ber_snapshot"]
+
+FACT_HEADERS = {
+    "fact_testrun": TESTRUN_HEADER,
+    "fact_fieldreturn": FIELDRETURN_HEADER,
+    "fact_burnin_telemetry": TELEMETRY_HEADER,
+}
+
+EPOCH = date(1970, 1, 1)
+
 def rand_date(d0: date, d1: date) -> date:
     delta = (d1 - d0).days
     return d0 + timedelta(days=random.randint(0, delta))
@@ -41,17 +110,57 @@ def rand_ts_around(d: date) -> datetime:
 def clamp(x, lo, hi):
     return max(lo, min(hi, x))
 
+class WeightedSampler:
+    """
+    Weighted sampling over a fixed population: cumulative sums are built once (O(n)), each draw is a
+    binary search (O(log n)). choice() picks the same item as a linear running-sum scan for the same
+    random.random() value, so seeded python-engine output is unchanged; sample() draws a batch of
+    indexes from a numpy Generator.
+    """
+
+    def __init__(self, items, weights):
+        self.items = items
+        self.cum = list(itertools.accumulate(weights))
+        self.total = self.cum[-1] if self.cum else 0.0
+        self._cum_arr = np.asarray(self.cum, dtype=np.float64)
+
+    def choice(self, rnd=random):
+        r = rnd.random() * self.total
+        # first item whose running sum >= r
+        i = bisect.bisect_left(self.cum, r)
+        return self.items[min(i, len(self.items) - 1)]
+
+    def sample(self, rng, n):
+        idx = np.searchsorted(self._cum_arr, rng.random(n) * self.total, side="left")
+        return np.minimum(idx, len(self._cum_arr) - 1)
+
 def write_csv(path, header, rows):
+    # rows may be a generator: it is consumed (and flushed) as it goes
     os.makedirs(os.path.dirname(path), exist_ok=True)
+    n = 0
     with open(path, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(header)
-        w.writerows(rows)
-
-def main():
-    random.seed(SEED)
-    os.makedirs(OUT_DIR, exist_ok=True)
-
+        for n, row in enumerate(rows, 1):
+            w.writerow(row)
+    return n
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (MB), or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def report(fn, rows, seconds, rss=None):
+    rate = rows / seconds if seconds > 0 else float("inf")
+    rss = rss if rss is not None else peak_rss_mb()
+    rss_txt = f", peak RSS {rss:,.0f} MB" if rss is not None else ""
+    print(f"   {fn}: {rows:,} rows in {seconds:.2f}s ({rate:,.0f} rows/s{rss_txt})")
+
+def build_dimensions():
+    """Write the dimension CSVs and return the unit/station attributes that drive the fact patterns."""
     # ---- Dim_LineCard ----
     product_families = ["PHOTON-X", "AURORA", "NOVA"]
     hw_revs = ["A0", "A1", "B0"]
@@ -137,23 +246,42 @@ def main():
               ["unit_serial","linecard_id","supplier_lot_id","manufacturing_site","operator_id","build_date"],
               units)
 
-    # ---- Fact_TestRun ----
-    test_types = ["ICT","FUNCTIONAL","BURNIN","OPTICAL"]
-    failure_codes = ["THERMAL_DRIFT","VOLTAGE_RIPPLE","OPTICS_DEGRADATION","STATION_FALSE_FAIL","FW_REGRESSION","UNKNOWN"]
-
-    testruns = []
     # pick a subset of units that tend to run hot/ripple to create real patterns
-    hot_units = set(random.sample(list(unit_meta.keys()), k=int(N_UNITS*0.10)))
+    hot_sample = random.sample(list(unit_meta.keys()), k=int(N_UNITS*0.10))
+    hot_units = set(hot_sample)
     ripple_units = set(random.sample(list(unit_meta.keys()), k=int(N_UNITS*0.08)))
     fw_units = set(random.sample(list(unit_meta.keys()), k=int(N_UNITS*0.12)))  # impacted by FW regression
 
+    all_serials = list(unit_meta.keys())
+    # focus telemetry on hot + bad_lot units
+    # (sample order + sort instead of set iteration order, so the pick is reproducible across processes)
+    focus_units = sorted(set(hot_sample[:int(N_UNITS*0.05)]) | set([s for s in all_serials if unit_meta[s]["bad_lot"]][:int(N_UNITS*0.03)]))
+
+    return {
+        "unit_meta": unit_meta,
+        "all_serials": all_serials,
+        "drift_station_ids": drift_station_ids,
+        "hot_units": hot_units,
+        "ripple_units": ripple_units,
+        "fw_units": fw_units,
+        "focus_units": focus_units,
+    }
+
+
+# ------------ Python engine (reference row loop) ------------
+
+def python_testruns(dims):
+    unit_meta = dims["unit_meta"]
+    drift_station_ids = dims["drift_station_ids"]
+    hot_units, ripple_units, fw_units = dims["hot_units"], dims["ripple_units"], dims["fw_units"]
+
     for _ in range(N_TESTRUNS):
         serial = f"LC-{random.randint(1, N_UNITS):06d}"
         m = unit_meta[serial]
         build = m["build_date"]
 
         station_id = random.randint(1, N_STATIONS)
-        test_type = random.choice(test_types)
+        test_type = random.choice(TEST_TYPES)
         start = rand_ts_around(build + timedelta(days=random.randint(0, 10)))
         end = start + timedelta(minutes=random.randint(2, 25))
 
@@ -219,27 +347,25 @@ def main():
             if m["bad_lot"]: candidates.append("OPTICS_DEGRADATION")
             if station_id in drift_station_ids: candidates.append("STATION_FALSE_FAIL")
             if serial in fw_units: candidates.append("FW_REGRESSION")
-            failure_code = random.choice(candidates if candidates else failure_codes)
+            failure_code = random.choice(candidates if candidates else FAILURE_CODES)
 
-        testruns.append([
+        yield [
             serial, station_id, test_type,
             start.isoformat(sep=" "), end.isoformat(sep=" "),
             pass_fail, failure_code if failure_code else None,
             ber, q, eye_h, eye_w, rxp, txp,
             vcore, vaux, iin, ripple,
             temp, hum
-        ])
+        ]
 
-    write_csv(os.path.join(OUT_DIR, "fact_testrun.csv"),
-              ["unit_serial","station_id","test_type","start_ts","end_ts","pass_fail","failure_code",
-               "ber","q_factor","eye_height_mv","eye_width_ps","rx_power_dbm","tx_power_dbm",
-               "vcore_v","vaux_v","iin_a","ripple_mv","temp_c","humidity_pct"],
-              testruns)
 
-    # ---- Fact_FieldReturn ----
+def field_returns(dims):
     # Sample returns more likely from bad_lot/hot/ripple units; add NFF due to drift stations.
+    unit_meta = dims["unit_meta"]
+    hot_units, ripple_units, fw_units = dims["hot_units"], dims["ripple_units"], dims["fw_units"]
+
     returns = []
-    all_serials = list(unit_meta.keys())
+    all_serials = dims["all_serials"]
     # weight sampling
     weights = []
     for s in all_serials:
@@ -248,27 +374,10 @@ def main():
         if s in hot_units: w += 1.4
         if s in ripple_units: w += 1.2
         weights.append(w)
-
-    def weighted_choice():
-        r = random.random() * sum(weights)
-        acc = 0.0
-        for s, w in zip(all_serials, weights):
-            acc += w
-            if acc >= r:
-                return s
-        return all_serials[-1]
-
-    symptom_map = {
-        "THERMAL_DRIFT": "INTERMITTENT_LINK_DROP",
-        "VOLTAGE_RIPPLE": "BOOT_FAILURE",
-        "OPTICS_DEGRADATION": "HIGH_BER_ALARM",
-        "FW_REGRESSION": "CRC_ERRORS",
-        "STATION_FALSE_FAIL": "NO_SYMPTOM_REPRO",
-        "UNKNOWN": "UNSTABLE_THROUGHPUT"
-    }
+    sampler = WeightedSampler(all_serials, weights)
 
     for _ in range(N_FIELD_RETURNS):
-        serial = weighted_choice()
+        serial = sampler.choice()
         build = unit_meta[serial]["build_date"]
         ret_date = build + timedelta(days=random.randint(10, 120))
 
@@ -289,20 +398,19 @@ def main():
         else:
             repair = random.choice(["REWORK","REPLACE"])
             confirmed_out = confirmed
-            symptom = symptom_map.get(confirmed, "UNSTABLE_THROUGHPUT")
+            symptom = SYMPTOM_MAP.get(confirmed, "UNSTABLE_THROUGHPUT")
 
         returns.append([serial, ret_date.isoformat(), symptom, confirmed_out, repair, None])
+    return returns
 
-    write_csv(os.path.join(OUT_DIR, "fact_fieldreturn.csv"),
-              ["unit_serial","return_date","symptom_code","confirmed_failure_mode","repair_action","notes"],
-              returns)
 
-    # ---- Fact_BurnInTelemetry (optional, but great for interviews) ----
-    telemetry = []
-    # focus telemetry on hot + bad_lot units
-    focus_units = list(set(list(hot_units)[:int(N_UNITS*0.05)]) | set([s for s in all_serials if unit_meta[s]["bad_lot"]][:int(N_UNITS*0.03)]))
+def python_telemetry(dims):
+    unit_meta = dims["unit_meta"]
+    hot_units, ripple_units = dims["hot_units"], dims["ripple_units"]
+
+    focus_units = dims["focus_units"]
     if not focus_units:
-        focus_units = random.sample(all_serials, k=max(50, int(N_UNITS*0.02)))
+        focus_units = random.sample(dims["all_serials"], k=max(50, int(N_UNITS*0.02)))
 
     for _ in range(N_TELEMETRY_POINTS):
         serial = random.choice(focus_units)
@@ -322,20 +430,554 @@ def main():
         if serial in ripple_units:
             ripple = random.gauss(RIPPLE_MV, 5.0)
 
-        telemetry.append([serial, ts.isoformat(sep=" "), temp, vcore, ripple, ber])
+        yield [serial, ts.isoformat(sep=" "), temp, vcore, ripple, ber]
+
+
+# ------------ NumPy engine (vectorized batches) ------------
+
+def unit_ids(serials):
+    """
+    unit_id per serial (int32): 1 + rank in sorted serial order, the same id src/unit_dict.py and
+    the DuckDB build assign, so Parquet facts can be joined on it without the serial strings.
+    """
+    ids = np.empty(len(serials), dtype=np.int32)
+    ids[np.argsort(np.array(serials, dtype=object), kind="stable")] = np.arange(1, len(serials) + 1)
+    return ids
+
+
+def unit_arrays(dims):
+    """Per-unit / per-station attributes as dense arrays (unit index = serial number - 1)."""
+    unit_meta = dims["unit_meta"]
+    serials = dims["all_serials"]
+    drift = np.zeros(N_STATIONS + 1, dtype=bool)
+    drift[list(dims["drift_station_ids"])] = True
+    focus = dims["focus_units"]
+    bad_lot = np.array([unit_meta[s]["bad_lot"] for s in serials], dtype=bool)
+    hot = np.array([s in dims["hot_units"] for s in serials], dtype=bool)
+    ripple = np.array([s in dims["ripple_units"] for s in serials], dtype=bool)
+    # field-return propensity, same weights as field_returns()
+    return_w = 1.0 + 2.2 * bad_lot
+    return_w += 1.4 * hot
+    return_w += 1.2 * ripple
+    return {
+        # unit index == category code, so fact frames carry unit_serial as a Categorical without building strings
+        "serial": pd.Index(serials, dtype=object),
+        "unit_id": unit_ids(serials),
+        "build_day": np.array([(unit_meta[s]["build_date"] - EPOCH).days for s in serials], dtype=np.int64),
+        "bad_lot": bad_lot,
+        "hot": hot,
+        "ripple": ripple,
+        "fw": np.array([s in dims["fw_units"] for s in serials], dtype=bool),
+        "return_sampler": WeightedSampler(np.arange(len(serials)), return_w),
+        "drift_station": drift,
+        "focus_idx": np.array([int(s[3:]) - 1 for s in focus], dtype=np.int64),
+    }
 
-    write_csv(os.path.join(OUT_DIR, "fact_burnin_telemetry.csv"),
-              ["unit_serial","ts","temp_c","vcore_v","ripple_mv","ber_snapshot"],
-              telemetry)
 
-    print(f"✅ Wrote CSVs to: {os.path.abspath(OUT_DIR)}")
+def _ts_around(rng, day, n, max_extra_minutes=0):
+    # same shape as rand_ts_around(): 08:00 + up to 10h on that day (+ optional extra minutes)
+    minutes = rng.integers(0, 10*60 + 1, n)
+    if max_extra_minutes:
+        minutes += rng.integers(0, max_extra_minutes + 1, n)
+    return day * 86400 + 8 * 3600 + minutes * 60
+
+
+def _bump(rng, x, mask, lo, hi, scale=None):
+    """In-place x[mask] += U(lo, hi) (or *= 10**U(lo, hi) when scale='log')."""
+    k = int(mask.sum())
+    if not k:
+        return
+    u = rng.uniform(lo, hi, k)
+    if scale == "log":
+        x[mask] *= 10 ** u
+    else:
+        x[mask] += u
+
+
+def _categorical(codes, categories):
+    """String column as a Categorical over `categories` (code -1 == NULL): no per-row str objects to build."""
+    return pd.Categorical.from_codes(codes, categories=pd.Index(categories, dtype=object))
+
+
+def _pick_candidate(rng, cand, n_fallback):
+    """
+    Per row, pick one True column of `cand` uniformly at random (rows with no candidate pick uniformly
+    from n_fallback options instead). Returns (index, has_candidate).
+    """
+    k = cand.sum(axis=1)
+    pick = (rng.random(len(cand)) * np.where(k > 0, k, n_fallback)).astype(np.int64)
+    col = np.argmax(np.cumsum(cand, axis=1) > pick[:, None], axis=1)
+    return np.where(k > 0, col, pick), k > 0
+
+
+def numpy_testruns(arrs, rng, n, units=None):
+    # units: optional subset of unit indexes to draw from (a shard's slice)
+    u = rng.integers(0, N_UNITS, n) if units is None else units[rng.integers(0, len(units), n)]
+    station_id = rng.integers(1, N_STATIONS + 1, n)
+    tt = rng.integers(0, len(TEST_TYPES), n)
+    day = arrs["build_day"][u] + rng.integers(0, 11, n)
+    start = _ts_around(rng, day, n)
+    end = start + rng.integers(2, 26, n) * 60
+
+    # baseline metrics
+    temp = rng.normal(55, 8, n)
+    ripple = np.abs(rng.normal(18, 7, n))
+    vcore = rng.normal(0.92, 0.02, n)
+    vaux = rng.normal(1.80, 0.04, n)
+    iin = np.abs(rng.normal(2.2, 0.7, n))
+
+    # optical metrics
+    ber = np.maximum(1e-12, 10 ** rng.uniform(-12, -8, n))
+    q = rng.normal(9.5, 1.0, n)
+    eye_h = rng.normal(320, 50, n)
+    eye_w = rng.normal(80, 12, n)
+    rxp = rng.normal(-6.5, 1.8, n)
+    txp = rng.normal(-2.0, 1.0, n)
+    hum = np.clip(rng.normal(35, 12, n), 5, 85)
+
+    is_ict, is_func, is_burnin, is_optical = (tt == i for i in range(len(TEST_TYPES)))
+    hot = arrs["hot"][u]
+    rip = arrs["ripple"][u]
+    bad_lot = arrs["bad_lot"][u]
+    drift = arrs["drift_station"][station_id]
+    fw = arrs["fw"][u]
+
+    # inject patterns (same knobs as the python engine, applied as masks)
+    p_fail = np.full(n, 0.012)
+
+    m = hot & (is_burnin | is_optical)  # thermal drift
+    temp[m] = rng.normal(THERMAL_TEMP_C, 3.5, int(m.sum()))
+    _bump(rng, ber, m, 1.0, 2.2, scale="log")
+    _bump(rng, q, m, -2.0, -1.0)
+    _bump(rng, eye_h, m, -120, -60)
+    p_fail[m] += 0.030
+
+    m = rip & (is_func | is_optical)  # voltage ripple
+    ripple[m] = rng.normal(RIPPLE_MV, 6.0, int(m.sum()))
+    _bump(rng, eye_h, m, -90, -40)
+    _bump(rng, ber, m, 0.7, 1.8, scale="log")
+    p_fail[m] += 0.022
+
+    m = bad_lot & (is_optical | is_burnin)  # optics vendor lot issue
+    _bump(rng, q, m, -1.6, -0.8)
+    _bump(rng, rxp, m, -1.5, -0.5)
+    p_fail[m] += 0.020
+
+    m = drift & (is_ict | is_func)  # station drift false fails
+    p_fail[m] += 0.020
+
+    m = fw & (is_optical | is_func)  # firmware regression
+    _bump(rng, ber, m, 0.5, 1.3, scale="log")
+    p_fail[m] += FW_REGRESSION_FAIL_BOOST
+
+    pass_fail = (rng.random(n) > p_fail).astype(np.int8)
+
+    # choose a plausible failure code for the failed rows, uniformly among matching candidates
+    # (candidate columns are in FAILURE_CODES order; no candidate => any of FAILURE_CODES)
+    failure_code = np.full(n, -1, dtype=np.int8)  # Categorical code; -1 == NULL
+    f = np.flatnonzero(pass_fail == 0)
+    if len(f):
+        cand = np.column_stack([temp[f] >= 75, ripple[f] >= 35, bad_lot[f], drift[f], fw[f]])
+        failure_code[f], _ = _pick_candidate(rng, cand, len(FAILURE_CODES))
+
+    return pd.DataFrame({
+        "unit_serial": _categorical(u, arrs["serial"]),
+        "unit_id": arrs["unit_id"][u],
+        "station_id": station_id,
+        "test_type": _categorical(tt, TEST_TYPES),
+        "start_ts": start.astype("datetime64[s]"),
+        "end_ts": end.astype("datetime64[s]"),
+        "pass_fail": pass_fail,
+        "failure_code": _categorical(failure_code, FAILURE_CODES),
+        "ber": ber, "q_factor": q, "eye_height_mv": eye_h, "eye_width_ps": eye_w,
+        "rx_power_dbm": rxp, "tx_power_dbm": txp,
+        "vcore_v": vcore, "vaux_v": vaux, "iin_a": iin, "ripple_mv": ripple,
+        "temp_c": temp, "humidity_pct": hum,
+    })
+
+
+def numpy_field_returns(arrs, rng, n):
+    # batch version of field_returns(): weighted unit draws via the shared sampler
+    u = arrs["return_sampler"].sample(rng, n)
+    ret_day = arrs["build_day"][u] + rng.integers(10, 121, n)
+
+    modes = np.array(["THERMAL_DRIFT", "VOLTAGE_RIPPLE", "OPTICS_DEGRADATION", "FW_REGRESSION"], dtype=object)
+    cand = np.column_stack([arrs["hot"][u], arrs["ripple"][u], arrs["bad_lot"][u], arrs["fw"][u]])
+    idx, has = _pick_candidate(rng, cand, 1)
+    confirmed = np.where(has, modes[np.minimum(idx, len(modes) - 1)], "UNKNOWN").astype(object)
+
+    # some NFF returns (especially to reflect station false fail / repro issue)
+    nff = rng.random(n) < 0.18
+    repair = np.where(rng.random(n) < 0.5, "REWORK", "REPLACE").astype(object)
+    repair[nff] = "NFF"
+    symptom = np.array([SYMPTOM_MAP.get(c, "UNSTABLE_THROUGHPUT") for c in modes] + ["UNSTABLE_THROUGHPUT"],
+                       dtype=object)[np.where(has, idx, len(modes))]
+    symptom[nff] = "NO_SYMPTOM_REPRO"
+    confirmed[nff] = None
+
+    return pd.DataFrame({
+        "unit_serial": _categorical(u, arrs["serial"]),
+        "unit_id": arrs["unit_id"][u],
+        "return_date": np.datetime_as_string(ret_day.astype("datetime64[D]")).astype(object),
+        "symptom_code": symptom,
+        "confirmed_failure_mode": confirmed,
+        "repair_action": repair,
+        "notes": np.full(n, None, dtype=object),
+    })
+
+
+def numpy_telemetry(arrs, rng, n, units=None):
+    focus = arrs["focus_idx"] if units is None else units
+    if not len(focus):
+        focus = rng.choice(N_UNITS, size=min(N_UNITS, max(50, int(N_UNITS*0.02))), replace=False)
+    u = focus[rng.integers(0, len(focus), n)]
+    day = arrs["build_day"][u] + rng.integers(0, 8, n)
+    ts = _ts_around(rng, day, n, max_extra_minutes=12*60)
+
+    temp = rng.normal(62, 7, n)
+    ripple = np.abs(rng.normal(20, 8, n))
+    vcore = rng.normal(0.92, 0.02, n)
+    ber = np.maximum(1e-12, 10 ** rng.uniform(-12, -9, n))
+
+    m = arrs["hot"][u]
+    temp[m] = rng.normal(THERMAL_TEMP_C, 3.0, int(m.sum()))
+    _bump(rng, ber, m, 0.8, 1.8, scale="log")
+    _bump(rng, ber, arrs["bad_lot"][u], 0.3, 1.1, scale="log")
+    m = arrs["ripple"][u]
+    ripple[m] = rng.normal(RIPPLE_MV, 5.0, int(m.sum()))
+
+    return pd.DataFrame({
+        "unit_serial": _categorical(u, arrs["serial"]),
+        "unit_id": arrs["unit_id"][u],
+        "ts": ts.astype("datetime64[s]"),
+        "temp_c": temp, "vcore_v": vcore, "ripple_mv": ripple, "ber_snapshot": ber,
+    })
+
+
+def chunk_sizes(total, chunk_rows=None):
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    for start in range(0, total, chunk_rows):
+        yield min(chunk_rows, total - start)
+
+
+class FrameCsvWriter:
+    """Append DataFrame chunks to a single CSV (header written once, each chunk flushed as it arrives)."""
+
+    def __init__(self, path, header=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.rows = 0
+        self._f = open(path, "wb")
+        self._header = False
+        self.columns = list(header) if header else None
+        if header:  # write it up front so a zero-row file still has one
+            self._f.write((",".join(header) + "\n").encode("utf-8"))
+            self._header = True
+
+    def write(self, df):
+        if not self._header:
+            self._f.write((",".join(df.columns) + "\n").encode("utf-8"))
+            self._header = True
+        if self.columns is not None:
+            # the BULK INSERT layout: frames may carry extra columns (unit_id) that only Parquet keeps
+            df = df[self.columns]
+        if pa is None:
+            df.to_csv(self._f, index=False, header=False, date_format="%Y-%m-%d %H:%M:%S")
+        else:
+            # unquoted output so BULK INSERT (FIELDTERMINATOR = ',') reads it like the csv.writer files
+            pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), self._f,
+                            pacsv.WriteOptions(include_header=False, quoting_style="none"))
+        self._f.flush()
+        self.rows += len(df)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parquet_schema(table):
+    dict_str = pa.dictionary(pa.int32(), pa.string())
+    f32 = pa.float32()
+    if table == "fact_testrun":
+        return pa.schema([
+            ("unit_serial", dict_str), ("unit_id", pa.int32()),
+            ("station_id", pa.int16()), ("test_type", dict_str),
+            ("start_ts", pa.timestamp("s")), ("end_ts", pa.timestamp("s")),
+            ("pass_fail", pa.int8()), ("failure_code", dict_str),
+            ("ber", pa.float64()),  # spans 1e-12..1e-6 and is analyzed as log10: keep double
+            ("q_factor", f32), ("eye_height_mv", f32), ("eye_width_ps", f32),
+            ("rx_power_dbm", f32), ("tx_power_dbm", f32),
+            ("vcore_v", f32), ("vaux_v", f32), ("iin_a", f32), ("ripple_mv", f32),
+            ("temp_c", f32), ("humidity_pct", f32),
+        ])
+    if table == "fact_fieldreturn":
+        return pa.schema([
+            ("unit_serial", dict_str), ("unit_id", pa.int32()),
+            ("return_date", pa.date32()), ("symptom_code", dict_str),
+            ("confirmed_failure_mode", dict_str), ("repair_action", dict_str), ("notes", pa.string()),
+        ])
+    if table == "fact_burnin_telemetry":
+        return pa.schema([
+            ("unit_serial", dict_str), ("unit_id", pa.int32()), ("ts", pa.timestamp("s")),
+            ("temp_c", f32), ("vcore_v", f32), ("ripple_mv", f32), ("ber_snapshot", pa.float64()),
+        ])
+    raise ValueError(f"No Parquet schema for {table!r}")
+
+
+# time column each chunk is sorted on before writing, so row-group min/max statistics prune range scans
+PARQUET_SORT_KEYS = {"fact_testrun": "start_ts", "fact_fieldreturn": "return_date", "fact_burnin_telemetry": "ts"}
+
+
+class FrameParquetWriter:
+    """Append DataFrame chunks to a Parquet file with the table's typed schema (same interface as FrameCsvWriter)."""
+
+    def __init__(self, path, table):
+        if pa is None:
+            raise ImportError("OUTPUT_FORMAT='parquet' needs pyarrow: pip install pyarrow")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.rows = 0
+        self.schema = parquet_schema(table)
+        self.sort_key = PARQUET_SORT_KEYS.get(table)
+        self._w = pq.ParquetWriter(path, self.schema, compression="zstd", write_statistics=True)
+
+    def write(self, df):
+        # Categorical columns convert straight to dictionary arrays (no per-row strings materialized)
+        cols = [pa.array(df[f.name], from_pandas=True).cast(f.type) for f in self.schema]
+        tbl = pa.Table.from_arrays(cols, schema=self.schema)
+        if self.sort_key:
+            tbl = tbl.sort_by(self.sort_key)
+        self._w.write_table(tbl, row_group_size=PARQUET_ROW_GROUP_ROWS)
+        self.rows += len(df)
+
+    def close(self):
+        self._w.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def fact_path(table, shard=None):
+    ext = ".parquet" if OUTPUT_FORMAT == "parquet" else ".csv"
+    if shard is None:
+        return os.path.join(OUT_DIR, table + ext)
+    if OUTPUT_FORMAT == "parquet":
+        # shard parts form a dataset directory that pyarrow/DuckDB read as one table
+        return os.path.join(OUT_DIR, table, f"part-{shard:03d}.parquet")
+    return os.path.join(OUT_DIR, f"{table}.part-{shard:03d}.csv")
+
+
+def clear_fact(table):
+    """Remove every previous output of a fact table (either format, merged or sharded) so readers never mix them."""
+    for path in [os.path.join(OUT_DIR, table + ext) for ext in (".csv", ".parquet")] + \
+            glob.glob(os.path.join(OUT_DIR, f"{table}.part-*.csv")):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(os.path.join(OUT_DIR, table), ignore_errors=True)
+
+
+def write_frames(table, path, frames):
+    if OUTPUT_FORMAT == "parquet":
+        writer = FrameParquetWriter(path, table)
+    else:
+        writer = FrameCsvWriter(path, FACT_HEADERS[table])
+    with writer as w:
+        for df in frames:
+            w.write(df)
+    return w.rows
+
+
+def row_frames(rows, header, serials=None):
+    """Group python-engine rows into CHUNK_ROWS DataFrames (for the Parquet writer), adding unit_id."""
+    ids = dict(zip(serials, unit_ids(serials))) if serials else None
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK_ROWS))
+        if not chunk:
+            return
+        df = pd.DataFrame(chunk, columns=header)
+        if ids is not None:
+            df.insert(1, "unit_id", df["unit_serial"].map(ids).astype(np.int32))
+        yield df
+
+
+# ------------ Sharded generation (process pool) ------------
+
+def config_knobs():
+    """The upper-case module config as a dict (shipped to worker processes, which may be spawned)."""
+    return {k: v for k, v in globals().items() if k.isupper() and isinstance(v, (int, float, str, date))}
+
+
+def split_rows(total, weights):
+    """Split `total` rows proportionally to `weights` (exact integer sizes that sum to total)."""
+    cum = np.concatenate([[0], np.cumsum(weights)])
+    bounds = cum * total // max(int(cum[-1]), 1)
+    return np.diff(bounds).astype(np.int64)
+
+
+def shard_plan(arrs, n_shards):
+    """Per-shard (units, n_testruns, telemetry_units, n_telemetry, testrun_seed, telemetry_seed)."""
+    unit_parts = np.array_split(np.arange(N_UNITS), n_shards)
+    focus = arrs["focus_idx"] if len(arrs["focus_idx"]) else np.arange(N_UNITS)
+    focus_parts = [focus[np.isin(focus, part)] for part in unit_parts]
+    n_runs = split_rows(N_TESTRUNS, [len(p) for p in unit_parts])
+    n_tel = split_rows(N_TELEMETRY_POINTS, [len(p) for p in focus_parts])
+    seeds = np.random.SeedSequence(SEED).spawn(2 * n_shards)
+    return [
+        (unit_parts[i], int(n_runs[i]), focus_parts[i], int(n_tel[i]), seeds[2*i], seeds[2*i + 1])
+        for i in range(n_shards)
+    ]
+
+
+_WORKER_ARRS = None
+
+
+def _init_shard_worker(knobs, arrs):
+    global _WORKER_ARRS
+    globals().update(knobs)
+    _WORKER_ARRS = arrs
+
+
+def _shard_worker(task):
+    table, path, units, n_rows, seed = task
+    rng = np.random.default_rng(seed)
+    gen = numpy_testruns if table == "fact_testrun" else numpy_telemetry
+    rows = write_frames(table, path, (gen(_WORKER_ARRS, rng, n, units=units) for n in chunk_sizes(n_rows)))
+    return rows, peak_rss_mb()
+
+
+def merge_parts(path, parts):
+    with open(path, "wb") as out:
+        for i, part in enumerate(parts):
+            with open(part, "rb") as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                shutil.copyfileobj(f, out, 16 << 20)
+            os.remove(part)
+
+
+def write_sharded(arrs, n_shards):
+    plan = shard_plan(arrs, n_shards)
+    jobs = [
+        ("fact_testrun", [("fact_testrun", fact_path("fact_testrun", i), p[0], p[1], p[4])
+                          for i, p in enumerate(plan)]),
+        ("fact_burnin_telemetry", [("fact_burnin_telemetry", fact_path("fact_burnin_telemetry", i), p[2], p[3], p[5])
+                                   for i, p in enumerate(plan)]),
+    ]
+    # Parquet parts already read as one dataset directory; CSV parts are concatenated for BULK INSERT
+    merge = MERGE_SHARDS and OUTPUT_FORMAT == "csv"
+    with ProcessPoolExecutor(max_workers=n_shards, initializer=_init_shard_worker,
+                             initargs=(config_knobs(), arrs)) as pool:
+        for table, tasks in jobs:
+            clear_fact(table)
+            t = time.perf_counter()
+            with stage(table) as s:  # workers' own peaks are in the report line, not the stage record
+                results = list(pool.map(_shard_worker, tasks))
+                parts = [task[1] for task in tasks]
+                if merge:
+                    with stage("merge"):
+                        merge_parts(fact_path(table), parts)
+                s.rows = sum(r[0] for r in results)
+            rss = max((r[1] for r in results if r[1] is not None), default=None)
+            report(f"{table} ({n_shards} shards{', merged' if merge else ''})",
+                   sum(r[0] for r in results), time.perf_counter() - t, rss)
+
+
+def main(engine=None, shards=None, profile=()):
+    engine = engine or ENGINE
+    shards = shards or N_SHARDS
+    if engine not in ("python", "numpy"):
+        raise ValueError(f"Unknown engine {engine!r} (expected 'python' or 'numpy')")
+    if shards > 1 and engine != "numpy":
+        raise ValueError("Sharded generation requires the numpy engine")
+
+    random.seed(SEED)
+    os.makedirs(OUT_DIR, exist_ok=True)
+    t0 = time.perf_counter()
+
+    with Run("generate_data", OUT_DIR, profile=profile) as run:
+        with stage("dimensions"):
+            dims = build_dimensions()
+
+        if shards > 1:
+            print(f"Generating facts (numpy engine, {shards} shards, {OUTPUT_FORMAT}, chunks of {CHUNK_ROWS:,} rows):")
+            t = time.perf_counter()
+            arrs = unit_arrays(dims)
+            rng = np.random.default_rng(SEED)
+            clear_fact("fact_fieldreturn")
+            with stage("fact_fieldreturn") as s:
+                rows = s.rows = write_frames("fact_fieldreturn", fact_path("fact_fieldreturn"),
+                                             (numpy_field_returns(arrs, rng, n) for n in chunk_sizes(N_FIELD_RETURNS)))
+            report("fact_fieldreturn", rows, time.perf_counter() - t)
+            write_sharded(arrs, shards)
+            tables = []
+        elif engine == "numpy":
+            rng = np.random.default_rng(SEED)
+            arrs = unit_arrays(dims)
+            tables = [
+                ("fact_testrun", lambda: (numpy_testruns(arrs, rng, n) for n in chunk_sizes(N_TESTRUNS))),
+                ("fact_fieldreturn",
+                 lambda: (numpy_field_returns(arrs, rng, n) for n in chunk_sizes(N_FIELD_RETURNS))),
+                ("fact_burnin_telemetry",
+                 lambda: (numpy_telemetry(arrs, rng, n) for n in chunk_sizes(N_TELEMETRY_POINTS))),
+            ]
+        else:
+            tables = [
+                ("fact_testrun", lambda: python_testruns(dims)),
+                ("fact_fieldreturn", lambda: field_returns(dims)),
+                # ---- Fact_BurnInTelemetry (optional, but great for interviews) ----
+                ("fact_burnin_telemetry", lambda: python_telemetry(dims)),
+            ]
+
+        if tables:
+            print(f"Generating facts ({engine} engine, {OUTPUT_FORMAT}, chunks of {CHUNK_ROWS:,} rows):")
+        for table, produce in tables:
+            t = time.perf_counter()
+            clear_fact(table)
+            path = fact_path(table)
+            with stage(table) as s:
+                if engine == "numpy":
+                    rows = write_frames(table, path, produce())
+                elif OUTPUT_FORMAT == "parquet":
+                    rows = write_frames(table, path, row_frames(produce(), FACT_HEADERS[table], dims["all_serials"]))
+                else:
+                    rows = write_csv(path, FACT_HEADERS[table], produce())
+                s.rows = rows
+            report(os.path.basename(path), rows, time.perf_counter() - t)
+    run.write()
+
+    print(f"✅ Wrote data to: {os.path.abspath(OUT_DIR)} ({engine} engine, {time.perf_counter() - t0:.1f}s)")
     print("Files:")
-    for fn in [
-        "dim_linecard.csv","dim_supplier_lot.csv","dim_station.csv","dim_unit.csv",
-        "fact_testrun.csv","fact_fieldreturn.csv","fact_burnin_telemetry.csv"
-    ]:
+    for fn in ["dim_linecard.csv","dim_supplier_lot.csv","dim_station.csv","dim_unit.csv"] + sorted(
+        fn for fn in os.listdir(OUT_DIR) if fn.split(".")[0] in FACT_HEADERS
+    ):
         print(" -", fn)
+    print("Stages (metrics/generate_data.json):\n" + run.table())
 
 if __name__ == "__main__":
-    main()
-
+    ap = argparse.ArgumentParser(description="Generate synthetic FMA line card data (CSV or Parquet).")
+    ap.add_argument("--engine", choices=["python", "numpy"], default=ENGINE)
+    ap.add_argument("--format", choices=["csv", "parquet"], default=OUTPUT_FORMAT, help="fact table format")
+    ap.add_argument("--testruns", type=int, default=N_TESTRUNS, help="Fact_TestRun rows")
+    ap.add_argument("--telemetry", type=int, default=N_TELEMETRY_POINTS, help="Fact_BurnInTelemetry rows")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows generated/flushed per chunk")
+    ap.add_argument("--shards", type=int, default=N_SHARDS, help="worker processes for the numpy engine")
+    ap.add_argument("--no-merge", action="store_true", help="keep per-shard part files instead of one CSV")
+    ap.add_argument("--out-dir", default=OUT_DIR)
+    ap.add_argument("--profile", nargs="+", default=[], metavar="STAGE",
+                    help="cProfile these stages (e.g. dimensions fact_testrun); dumps go to <out-dir>/metrics/*.prof")
+    args = ap.parse_args()
+    N_TESTRUNS, N_TELEMETRY_POINTS, OUT_DIR = args.testruns, args.telemetry, args.out_dir
+    CHUNK_ROWS = args.chunk_rows
+    MERGE_SHARDS = not args.no_merge
+    OUTPUT_FORMAT = args.format
+    main(args.engine, args.shards, profile=args.profile)
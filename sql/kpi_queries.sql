@@ -131,9 +131,9 @@ WITH unit_returns AS (
 SELECT
     sl.optic_vendor,
     sl.lot_code,
-    COUNT(*) AS units_built,
+    COUNT(DISTINCT u.unit_serial) AS units_built,
     SUM(CASE WHEN ur.unit_serial IS NOT NULL AND ur.repair_action IS NOT NULL THEN 1 ELSE 0 END) AS units_returned,
-    CAST(100.0 * SUM(CASE WHEN ur.repair_action IS NOT NULL THEN 1 ELSE 0 END) / NULLIF(COUNT(*),0) AS DECIMAL(5,2)) AS field_return_rate_pct,
+    CAST(100.0 * SUM(CASE WHEN ur.repair_action IS NOT NULL THEN 1 ELSE 0 END) / NULLIF(COUNT(DISTINCT u.unit_serial),0) AS DECIMAL(5,2)) AS field_return_rate_pct,
     SUM(CASE WHEN ur.repair_action = 'NFF' THEN 1 ELSE 0 END) AS nff_count,
     CAST(100.0 * SUM(CASE WHEN ur.repair_action = 'NFF' THEN 1 ELSE 0 END) / NULLIF(SUM(CASE WHEN ur.repair_action IS NOT NULL THEN 1 ELSE 0 END),0) AS DECIMAL(5,2)) AS nff_pct_of_returns
 FROM dbo.Dim_SupplierLot sl
@@ -0,0 +1,310 @@
+"""
+Online drift detection on burn-in telemetry (Fact_BurnInTelemetry), one unit at a time.
+
+Each unit carries O(1) state per signal (temp_c, ripple_mv, log10 BER): an EWMA of the reading
+and an upper CUSUM of its z-score against the in-control REFERENCE. A unit alerts once per
+failure mode, at the first reading where:
+  THERMAL_DRIFT       temp CUSUM crosses CUSUM_H
+  VOLTAGE_RIPPLE      ripple CUSUM crosses CUSUM_H
+  OPTICS_DEGRADATION  log-BER CUSUM crosses CUSUM_H while the temp EWMA is below the high-temp
+                      threshold (a BER rise that heat does not explain)
+
+The recursions are sequential per unit but independent across units. A batch is therefore
+processed in rounds: round p advances every unit that has a p-th reading in the batch, as one
+vectorized step over those units. There are as many rounds as the busiest unit has readings in
+the batch. State lives in dense arrays indexed by a slot per active unit. Units idle for
+IDLE_EVICT are dropped and their slots reused, so memory follows the number of units currently
+in burn-in.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.rca_ranker import TEMP_HIGH_C
+from src.storage import find_table, read_table
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # CSV replay still works
+    pa = None
+    pq = None
+
+SIGNALS = ["temp_c", "ripple_mv", "log10_ber"]
+# in-control (mean, sd) of a healthy unit in burn-in; z-scores are taken against these
+REFERENCE = {"temp_c": (62.0, 7.0), "ripple_mv": (20.0, 8.0), "log10_ber": (-10.5, 0.9)}
+EWMA_ALPHA = 0.1
+CUSUM_K = 0.5  # allowance per reading, in reference sds
+CUSUM_H = 10.0  # decision interval
+BER_FLOOR = 1e-12
+IDLE_EVICT = np.timedelta64(3, "D")
+BATCH_ROWS = 1_000_000
+
+ALERT_MODES = ["THERMAL_DRIFT", "VOLTAGE_RIPPLE", "OPTICS_DEGRADATION"]
+ALERT_COLUMNS = ["unit_serial", "ts", "failure_mode", "signal", "ewma", "cusum"]
+_TEMP, _RIPPLE, _BER = range(3)
+
+
+class DriftDetector:
+    """
+    Feed telemetry batches (columns unit_serial, ts, temp_c, ripple_mv, ber_snapshot) in
+    timestamp order with update(); each call returns the alerts raised by that batch.
+    """
+
+    def __init__(self, reference=REFERENCE, alpha: float = EWMA_ALPHA, k: float = CUSUM_K, h: float = CUSUM_H,
+                 idle_evict=IDLE_EVICT, capacity: int = 1024):
+        self.mu = np.array([reference[s][0] for s in SIGNALS])
+        self.sd = np.array([reference[s][1] for s in SIGNALS])
+        self.alpha, self.k, self.h = alpha, k, h
+        self.idle_evict = np.timedelta64(idle_evict).astype("timedelta64[s]").astype(np.int64)
+
+        self.slots = {}  # unit_serial -> slot
+        self._free = []  # slots of evicted units, reused before new ones
+        self._top = 0  # slots handed out so far
+        self.serial = np.empty(capacity, dtype=object)
+        self.ewma = np.zeros((capacity, len(SIGNALS)))  # raw units
+        self.cusum = np.zeros((capacity, len(SIGNALS)))  # z units
+        self.n = np.zeros(capacity, dtype=np.int64)
+        self.last_ts = np.zeros(capacity, dtype=np.int64)  # epoch seconds
+        self.alerted = np.zeros((capacity, len(ALERT_MODES)), dtype=bool)
+
+    @property
+    def n_active(self) -> int:
+        return len(self.slots)
+
+    def _grow(self, need: int):
+        cap = len(self.n)
+        if need <= cap:
+            return
+        new = max(need, 2 * cap)
+        for name in ("serial", "ewma", "cusum", "n", "last_ts", "alerted"):
+            old = getattr(self, name)
+            arr = np.zeros((new,) + old.shape[1:], dtype=old.dtype) if old.dtype != object else np.empty(new, object)
+            arr[:cap] = old
+            setattr(self, name, arr)
+
+    def _slot_codes(self, unit_serial: pd.Series) -> np.ndarray:
+        """
+        Per-row slot, assigning slots to units seen for the first time. Only categories with rows
+        in the batch get one: a Parquet dictionary also lists units that only occur in other rows.
+        """
+        units = unit_serial if isinstance(unit_serial.dtype, pd.CategoricalDtype) else unit_serial.astype("category")
+        codes = units.cat.codes.to_numpy()
+        categories = units.cat.categories
+        lut = np.empty(len(categories), dtype=np.intp)
+        present = np.bincount(codes[codes >= 0], minlength=len(categories)) > 0
+        for i in np.flatnonzero(present):
+            u = categories[i]
+            slot = self.slots.get(u)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    slot = self._top
+                    self._top += 1
+                    self._grow(self._top)
+                self.slots[u] = slot
+                self.serial[slot] = u
+            lut[i] = slot
+        return lut[codes]
+
+    def _evict(self, now: int):
+        """Free the slots of units idle for idle_evict, and of any unit that never got a reading."""
+        used = np.not_equal(self.serial, None)
+        idle = np.nonzero(used & ((self.n == 0) | (self.last_ts < now - self.idle_evict)))[0]
+        for slot in idle:
+            del self.slots[self.serial[slot]]
+            self._free.append(int(slot))
+        self.serial[idle] = None
+        self.ewma[idle] = 0
+        self.cusum[idle] = 0
+        self.n[idle] = 0
+        self.last_ts[idle] = 0
+        self.alerted[idle] = False
+
+    def update(self, df: pd.DataFrame) -> pd.DataFrame:
+        ts = df["ts"].to_numpy().astype("datetime64[s]").astype(np.int64)
+        if len(ts) and np.any(ts[1:] < ts[:-1]):
+            order = np.argsort(ts, kind="stable")
+            df, ts = df.iloc[order], ts[order]
+        if not len(ts):
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+        slot = self._slot_codes(df["unit_serial"])
+
+        # units of this batch ranked by reading count (desc): round p then covers exactly ranks
+        # 0..k_p-1, so every step works on a contiguous prefix of the state, without gathers
+        counts = np.bincount(slot, minlength=len(self.n))
+        units = np.nonzero(counts)[0]
+        units = units[np.argsort(-counts[units], kind="stable")]
+        rank = np.empty(len(self.n), dtype=np.intp)
+        rank[units] = np.arange(len(units))
+        rk = rank[slot]
+        # stable, so time order is kept within a unit (16-bit keys take numpy's radix sort)
+        by_unit = np.argsort(rk.astype(np.int16) if len(units) < 2**15 else rk, kind="stable")
+        start = np.r_[0, np.cumsum(counts[units])[:-1]]
+        rk_sorted = rk[by_unit]
+        pos = np.arange(len(ts)) - start[rk_sorted]  # reading number within the unit
+        bounds = np.r_[0, np.cumsum(np.bincount(pos))]
+        # round-major order: reading p of rank r sits at bounds[p] + r
+        rows = np.empty(len(ts), dtype=np.intp)
+        rows[bounds[pos] + rk_sorted] = by_unit
+
+        x = np.empty((len(rows), len(SIGNALS)))
+        x[:, _TEMP] = df["temp_c"].to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+        x[:, _RIPPLE] = df["ripple_mv"].to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+        ber = df["ber_snapshot"].to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+        x[:, _BER] = np.log10(np.maximum(ber, BER_FLOOR))
+        # CUSUM increments; a missing reading leaves the sum unchanged
+        inc = np.nan_to_num((x - self.mu) / self.sd - self.k, nan=0.0)
+
+        e = self.ewma[units]
+        c = self.cusum[units]
+        new = self.n[units] == 0
+        e[new] = x[:len(units)][new]  # a unit's first reading seeds its EWMA (round 0 is rank order)
+        has_nan = bool(np.isnan(x).any() or np.isnan(e).any())
+
+        ewma_rows = np.empty_like(x)
+        cusum_rows = np.empty_like(x)
+        a = self.alpha
+        for p in range(len(bounds) - 1):
+            lo, hi = bounds[p], bounds[p + 1]
+            k = hi - lo
+            ek, ck, xp = e[:k], c[:k], x[lo:hi]
+            if has_nan:
+                upd = ek + a * (xp - ek)
+                ek[:] = np.where(np.isnan(xp), ek, np.where(np.isnan(ek), xp, upd))
+            else:
+                ek += a * (xp - ek)
+            ck += inc[lo:hi]
+            np.maximum(ck, 0.0, out=ck)
+            ewma_rows[lo:hi] = ek
+            cusum_rows[lo:hi] = ck
+
+        self.ewma[units] = e
+        self.cusum[units] = c
+        self.n[units] += counts[units]
+        self.last_ts[units] = ts[by_unit[start + counts[units] - 1]]
+
+        alerts = self._alerts(slot[rows], rows, ewma_rows, cusum_rows, ts)
+        self._evict(int(ts[-1]))
+        return alerts
+
+    def _alerts(self, slot, rows, ewma_rows, cusum_rows, ts) -> pd.DataFrame:
+        """First firing reading per (unit, mode); slot/ewma_rows/cusum_rows are in round order."""
+        over = cusum_rows > self.h
+        fired = np.stack([
+            over[:, _TEMP],
+            over[:, _RIPPLE],
+            over[:, _BER] & (ewma_rows[:, _TEMP] < TEMP_HIGH_C),
+        ], axis=1)
+        fired &= ~self.alerted[slot]
+        i, mode = np.nonzero(fired)
+        if not len(i):
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+        # round order is time order within a unit, so the first index per key is the first firing
+        _, first = np.unique(slot[i] * len(ALERT_MODES) + mode, return_index=True)
+        i, mode = i[first], mode[first]
+        self.alerted[slot[i], mode] = True
+        signal = np.array([_TEMP, _RIPPLE, _BER])[mode]
+        out = pd.DataFrame({
+            "unit_serial": self.serial[slot[i]],
+            "ts": ts[rows[i]].astype("datetime64[s]"),
+            "failure_mode": np.array(ALERT_MODES)[mode],
+            "signal": np.array(SIGNALS)[signal],
+            "ewma": ewma_rows[i, signal],
+            "cusum": cusum_rows[i, signal],
+        })
+        return out.sort_values("ts", kind="stable", ignore_index=True)
+
+
+# -----------------------------
+# Replay from the generated files
+# -----------------------------
+TELEMETRY_COLUMNS = ["unit_serial", "ts", "temp_c", "ripple_mv", "ber_snapshot"]
+
+
+def _row_groups(path: str):
+    """(ParquetFile, row group index, ts min) for every row group of a file or dataset dir, by ts min."""
+    files = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".parquet")) \
+        if os.path.isdir(path) else [path]
+    out = []
+    for f in files:
+        pf = pq.ParquetFile(f)
+        col = pf.schema_arrow.get_field_index("ts")
+        for g in range(pf.metadata.num_row_groups):
+            stats = pf.metadata.row_group(g).column(col).statistics
+            if stats is None or not stats.has_min_max:
+                return None
+            out.append((pf, g, pd.Timestamp(stats.min)))
+    return sorted(out, key=lambda r: r[2])
+
+
+def replay(data_dir: str, batch_rows: int = BATCH_ROWS):
+    """
+    Fact_BurnInTelemetry in timestamp order, about batch_rows at a time.
+
+    The generator sorts each written chunk (and each shard) by ts, so a Parquet file is a set of
+    sorted runs. Row groups are read in order of their min ts, and rows are released once they are
+    older than the next unread row group's min: a streaming merge that holds about one row group
+    per run. A CSV (or Parquet without statistics) is loaded whole and sorted.
+    """
+    path = find_table(data_dir, "fact_burnin_telemetry")
+    groups = None if path.endswith(".csv") else _row_groups(path)
+    if groups is None:
+        df = read_table(path, columns=TELEMETRY_COLUMNS)
+        df["ts"] = pd.to_datetime(df["ts"])
+        df = df.sort_values("ts", kind="stable", ignore_index=True)
+        for start in range(0, len(df), batch_rows):
+            yield df.iloc[start:start + batch_rows]
+        return
+
+    pending, carry = [], None  # carry: rows not yet released, already in ts order
+    for i, (pf, g, _) in enumerate(groups):
+        pending.append(pf.read_row_group(g, columns=TELEMETRY_COLUMNS))
+        last = i + 1 == len(groups)
+        if not last and sum(t.num_rows for t in pending) < batch_rows:
+            continue
+        table = pa.concat_tables(([carry] if carry is not None else []) + pending)
+        pending = []
+        ts = table["ts"].to_numpy().astype("datetime64[ns]").astype(np.int64)
+        order = np.argsort(ts, kind="stable")  # timsort: merges the already-sorted runs
+        cut = len(ts) if last else int(np.searchsorted(ts[order], pd.Timestamp(groups[i + 1][2]).value))
+        carry = table.take(order[cut:]) if cut < len(ts) else None
+        if cut:
+            yield table.take(order[:cut]).to_pandas()
+
+
+def detect(data_dir: str, batch_rows: int = BATCH_ROWS, detector: DriftDetector = None):
+    """Replay the telemetry through a DriftDetector; returns (alerts, rows, seconds in the detector)."""
+    detector = detector or DriftDetector()
+    alerts, rows, busy = [], 0, 0.0
+    for batch in replay(data_dir, batch_rows):
+        t0 = time.perf_counter()
+        found = detector.update(batch)
+        busy += time.perf_counter() - t0
+        rows += len(batch)
+        if len(found):
+            alerts.append(found)
+    if not alerts:
+        return pd.DataFrame(columns=ALERT_COLUMNS), rows, busy
+    return pd.concat(alerts, ignore_index=True), rows, busy
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Replay burn-in telemetry through the EWMA/CUSUM drift detector.")
+    ap.add_argument("--data-dir", default=os.getenv("FMA_DATA_DIR", "data"))
+    ap.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    ap.add_argument("--out", default=None, help="write the alerts to this CSV")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    alerts, rows, busy = detect(args.data_dir, args.batch_rows)
+    wall = time.perf_counter() - t0
+    print(f"{rows:,} telemetry rows, {len(alerts):,} alerts: {rows / max(wall, 1e-9):,.0f} rows/s replayed "
+          f"({rows / max(busy, 1e-9):,.0f} rows/s in the detector)")
+    print(alerts["failure_mode"].value_counts().to_string() if len(alerts) else "no alerts")
+    if args.out:
+        alerts.to_csv(args.out, index=False)
@@ -0,0 +1,396 @@
+"""
+Database backends behind rca_weibull.connect() / fetch_df().
+
+  mssql  - SQL Server through pymssql (the Docker setup: host.docker.internal:1433)
+  duckdb - embedded DuckDB file built straight from the generator's CSV/Parquet output, so the
+           whole pipeline runs in-process on one box without a server
+
+Pick one with FMA_BACKEND (default: mssql); `python -m src.backends` (re)builds the DuckDB file
+ahead of time. Queries are written in T-SQL (see rca_weibull.SQL and sql/*.sql); translate_sql()
+rewrites the few constructs DuckDB spells differently.
+"""
+import argparse
+import functools
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent builds still write separate tmp files
+    fcntl = None
+
+from src.instrument import stage
+from src.storage import find_table, table_candidates
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SQL_DIR = os.path.join(REPO_DIR, "sql")
+
+BACKEND = os.getenv("FMA_BACKEND", "mssql")
+DATA_DIR = os.getenv("FMA_DATA_DIR", os.path.join(REPO_DIR, "data"))
+DUCKDB_PATH = os.getenv("FMA_DUCKDB_PATH")  # default: <data dir>/fma.duckdb
+# 0: never rebuild on connect (src/pipeline.py builds it once, in its load stage, from content hashes)
+DUCKDB_AUTOBUILD = os.getenv("FMA_DUCKDB_AUTOBUILD", "1") != "0"
+POOL_SIZE = int(os.getenv("FMA_POOL_SIZE", "4"))
+
+# table -> (generator file name, surrogate id column; the SQL Server loaders assign these as IDENTITY 1..N
+# in file order, and dim_unit.csv / the facts already reference those ids)
+TABLES = {
+    "Dim_LineCard": ("dim_linecard", "linecard_id"),
+    "Dim_SupplierLot": ("dim_supplier_lot", "supplier_lot_id"),
+    "Dim_Station": ("dim_station", "station_id"),
+    "Dim_Unit": ("dim_unit", None),
+    "Fact_TestRun": ("fact_testrun", "test_run_id"),
+    "Fact_FieldReturn": ("fact_fieldreturn", "rma_id"),
+    "Fact_BurnInTelemetry": ("fact_burnin_telemetry", "telemetry_id"),
+}
+
+
+# -----------------------------
+# Connections
+# -----------------------------
+def connect_mssql():
+    import pymssql  # pure-python friendly in Docker; only needed for this backend
+
+    # From a Docker container on Mac, connect to host-mapped port 1433:
+    host = os.getenv("SQL_HOST", "host.docker.internal")
+    user = os.getenv("SQL_USER", "sa")
+    pwd  = os.getenv("SQL_PASSWORD", "Str0ng!Passw0rd123")
+    port = int(os.getenv("SQL_PORT", "1433"))
+    return pymssql.connect(server=host, user=user, password=pwd, port=port, database="master")
+
+
+def connect_duckdb(db_path: str = None, data_dir: str = None):
+    """Read-only connection to the embedded database, (re)building it first if the data is newer."""
+    import duckdb
+
+    data_dir = data_dir or DATA_DIR
+    db_path = db_path or duckdb_path(data_dir)
+    if DUCKDB_AUTOBUILD and duckdb_is_stale(db_path, data_dir):
+        build_duckdb(data_dir, db_path, if_stale=True)
+    return duckdb.connect(db_path, read_only=True)
+
+
+def connect(backend: str = None):
+    backend = backend or BACKEND
+    if backend == "mssql":
+        return connect_mssql()
+    if backend == "duckdb":
+        return connect_duckdb()
+    raise ValueError(f"Unknown backend {backend!r} (expected 'mssql' or 'duckdb')")
+
+
+class ConnectionPool:
+    """
+    At most `size` open connections from `factory`, each used by one caller at a time (neither
+    pymssql nor DuckDB connections may be shared between threads). Connections are opened on
+    demand and reused; one that raised mid-query is closed rather than handed out again.
+    """
+
+    def __init__(self, factory=connect, size: int = POOL_SIZE):
+        self.factory = factory
+        self.size = size
+        self._idle = queue.LifoQueue()  # most recently used first, so a quiet pool keeps few warm
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        if not self._slots.acquire(timeout=timeout if timeout is not None else -1):
+            raise TimeoutError(f"No free connection in the pool after {timeout}s")
+        conn = None
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self.factory()
+            yield conn
+        except BaseException:
+            if conn is not None:
+                conn.close()
+            raise
+        else:
+            self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def fetch_df(self, query: str) -> pd.DataFrame:
+        with self.connection() as conn:
+            return fetch_df(conn, query)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def dialect_of(conn) -> str:
+    # duckdb.DuckDBPyConnection lives in the `_duckdb` extension module (`duckdb` in older releases)
+    return "duckdb" if type(conn).__module__.lstrip("_").startswith("duckdb") else "mssql"
+
+
+def fetch_df(conn, query: str) -> pd.DataFrame:
+    if dialect_of(conn) == "duckdb":
+        with stage("query"):
+            result = conn.execute(translate_sql(query, "duckdb"))
+        with stage("decode") as s:
+            df = result.df()  # columnar result straight into pandas (no per-row decoding)
+            s.rows = len(df)
+        return df
+
+    # what pd.read_sql does on a DB-API connection, split so the stages show where time goes
+    cur = conn.cursor()
+    try:
+        with stage("query"):
+            cur.execute(query)
+        with stage("fetch") as s:
+            rows = cur.fetchall()
+            s.rows = len(rows)
+        with stage("decode", rows=len(rows)):
+            return pd.DataFrame.from_records(rows, columns=[d[0] for d in cur.description], coerce_float=True)
+    finally:
+        cur.close()
+
+
+def fetch_chunks(conn, query: str, chunk_rows: int = 1_000_000):
+    """Yield the result of `query` as DataFrames of at most chunk_rows rows, so memory stays bounded."""
+    if dialect_of(conn) == "duckdb":
+        with stage("query"):
+            result = conn.execute(translate_sql(query, "duckdb"))
+        # to_arrow_reader() replaced fetch_record_batch() in DuckDB 1.4
+        to_reader = getattr(result, "to_arrow_reader", None) or result.fetch_record_batch
+        reader = iter(to_reader(chunk_rows))
+        while True:
+            # stages close before each yield, so the consumer's time is not billed to the fetch
+            with stage("fetch") as s:
+                batch = next(reader, None)
+                if batch is not None:
+                    chunk = batch.to_pandas()
+                    s.rows = len(chunk)
+            if batch is None:
+                return
+            yield chunk
+
+    cur = conn.cursor()
+    try:
+        with stage("query"):
+            cur.execute(query)
+        columns = [d[0] for d in cur.description]
+        while True:
+            with stage("fetch") as s:
+                rows = cur.fetchmany(chunk_rows)
+                s.rows = len(rows)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=columns)
+    finally:
+        cur.close()
+
+
+# -----------------------------
+# T-SQL -> DuckDB
+# -----------------------------
+_TOP = re.compile(r"\bSELECT\s+TOP\s*(?:\(\s*(\d+)\s*\)|(\d+))", re.IGNORECASE)
+_USE = re.compile(r"^\s*USE\s+\w+\s*;?\s*$", re.IGNORECASE | re.MULTILINE)
+_GO = re.compile(r"^\s*GO\s*$", re.IGNORECASE | re.MULTILINE)
+_WEEK_START = re.compile(r"DATEADD\(\s*WEEK\s*,\s*DATEDIFF\(\s*WEEK\s*,\s*0\s*,\s*([\w.]+)\s*\)\s*,\s*0\s*\)",
+                         re.IGNORECASE)
+_ISNULL = re.compile(r"\bISNULL\s*\(", re.IGNORECASE)
+
+
+def translate_sql(query: str, dialect: str) -> str:
+    """
+    Rewrite a single T-SQL statement for `dialect`. Handles what this repo's queries use:
+    USE/GO batches, SELECT TOP (n), ISNULL() and the DATEADD/DATEDIFF week-start idiom.
+    """
+    if dialect == "mssql":
+        return query
+    if dialect != "duckdb":
+        raise ValueError(f"Unknown SQL dialect {dialect!r}")
+
+    q = _GO.sub("", _USE.sub("", query))
+    q = _WEEK_START.sub(r"CAST(date_trunc('week', \1) AS TIMESTAMP)", q)  # both start weeks on Monday
+    q = _ISNULL.sub("COALESCE(", q)
+    m = _TOP.search(q)
+    if m:
+        q = q[:m.start()] + "SELECT" + q[m.end():]
+        q = q.rstrip().rstrip(";") + f"\nLIMIT {m.group(1) or m.group(2)};"
+    return q.strip()
+
+
+# -----------------------------
+# sqlcmd scripts
+# -----------------------------
+# string literals and comments are matched first so a `;` inside them never splits a statement
+_SCRIPT_TOKEN = re.compile(r"'(?:[^']|'')*'|/\*.*?\*/|--[^\n]*|;|^\s*GO\s*$", re.IGNORECASE | re.MULTILINE | re.DOTALL)
+_COMMENT = re.compile(r"/\*.*?\*/|--[^\n]*", re.DOTALL)
+_DECLARE = re.compile(r"^DECLARE\s+@(\w+)\s+\w+(?:\s*\([\d\s,]+\))?\s*=\s*(.+)$", re.IGNORECASE | re.DOTALL)
+
+
+def split_script(script: str):
+    """
+    The SELECT statements of a sqlcmd script (sql/*.sql), in order, each runnable on its own.
+    `DECLARE @x TYPE = value` lines are folded into the statements after them as literals, and
+    each statement is prefixed with the script's USE so it runs against the right database.
+    """
+    pieces, last = [], 0
+    for m in _SCRIPT_TOKEN.finditer(script):
+        if m.group() == ";" or m.group().strip().upper() == "GO":
+            pieces.append(script[last:m.start()])
+            last = m.end()
+    pieces.append(script[last:])
+
+    use, variables, statements = "", {}, []
+    for piece in pieces:
+        code = _COMMENT.sub("", piece).strip()
+        if not code:
+            continue
+        if _USE.match(code):
+            use = code + ";\n"
+            continue
+        m = _DECLARE.match(code)
+        if m:
+            variables[m.group(1).lower()] = m.group(2).strip()
+            continue
+        stmt = piece.strip()
+        for name, value in variables.items():
+            stmt = re.sub(rf"@{name}\b", value, stmt, flags=re.IGNORECASE)
+        statements.append(use + stmt + ";")
+    return statements
+
+
+@functools.lru_cache(maxsize=None)
+def read_script(name: str):
+    """split_script() of sql/<name>."""
+    with open(os.path.join(SQL_DIR, name), "r", encoding="utf-8") as f:
+        return tuple(split_script(f.read()))
+
+
+# dashboard artifact -> (script under sql/, statement index in split_script() order)
+SCRIPT_QUERIES = {
+    "pbi_exec_overview": ("kpi_queries.sql", 0),
+    "pbi_failure_pareto": ("kpi_queries.sql", 1),
+    "pbi_weekly_trend": ("kpi_queries.sql", 2),
+    "pbi_hw_fw_fail_rate": ("kpi_queries.sql", 3),
+    "pbi_supplier_lot_fail_rate": ("kpi_queries.sql", 4),
+    "pbi_station_health": ("kpi_queries.sql", 5),
+    "pbi_pass_fail_deltas": ("kpi_queries.sql", 6),
+    "pbi_temp_risk": ("kpi_queries.sql", 7),
+    "pbi_ripple_risk": ("kpi_queries.sql", 8),
+    "pbi_vendor_lot_returns": ("kpi_queries.sql", 9),
+    "pbi_station_nff_link": ("rca_queries.sql", 0),
+    "pbi_driver_strength": ("rca_queries.sql", 1),
+    "pbi_fix_first": ("rca_queries.sql", 2),
+    "pbi_rca_by_failure_mode": ("rca_by_failure_mode.sql", 0),
+}
+
+
+def script_query(name: str) -> str:
+    script, index = SCRIPT_QUERIES[name]
+    return read_script(script)[index]
+
+
+# -----------------------------
+# Embedded database build
+# -----------------------------
+def duckdb_path(data_dir: str = None) -> str:
+    return DUCKDB_PATH or os.path.join(data_dir or DATA_DIR, "fma.duckdb")
+
+
+def _source(data_dir: str, name: str):
+    """DuckDB table function reading the newest representation of a generated table."""
+    path = find_table(data_dir, name).replace("'", "''")
+    if path.endswith(".csv"):
+        return f"read_csv('{path}', header = true, nullstr = '')"
+    if os.path.isdir(path):
+        return f"read_parquet('{path}/*.parquet')"
+    return f"read_parquet('{path}')"
+
+
+def duckdb_inputs(data_dir: str):
+    paths = []
+    for name, _ in TABLES.values():
+        paths += [p for p in table_candidates(data_dir, name) if os.path.exists(p)]
+    return paths
+
+
+def duckdb_is_stale(db_path: str, data_dir: str) -> bool:
+    if not os.path.exists(db_path):
+        return True
+    inputs = duckdb_inputs(data_dir)
+    return bool(inputs) and max(os.path.getmtime(p) for p in inputs) > os.path.getmtime(db_path)
+
+
+@contextmanager
+def _build_lock(db_path: str):
+    """Exclusive lock on <db>.lock: processes (or threads) that find the database stale take turns."""
+    if fcntl is None:
+        yield
+        return
+    with open(db_path + ".lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def build_duckdb(data_dir: str = None, db_path: str = None, if_stale: bool = False):
+    """
+    Load the generator's files into dbo.* tables with the same columns/ids as sql/schema.sql.
+    With if_stale, a build that another process finished while this one waited for the lock is
+    not repeated.
+    """
+    data_dir = data_dir or DATA_DIR
+    db_path = db_path or duckdb_path(data_dir)
+    with _build_lock(db_path):
+        if if_stale and not duckdb_is_stale(db_path, data_dir):
+            return db_path
+        tmp_path = f"{db_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            _build_duckdb(data_dir, db_path, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return db_path
+
+
+def _build_duckdb(data_dir: str, db_path: str, tmp_path: str):
+    import duckdb
+
+    t0 = time.perf_counter()
+    conn = duckdb.connect(tmp_path)
+    try:
+        conn.execute("CREATE SCHEMA IF NOT EXISTS dbo")
+        for table, (name, id_col) in TABLES.items():
+            src = _source(data_dir, name)
+            if table == "Dim_Unit":  # src/unit_dict.py ids: 1 + rank in sorted serial order
+                select = f"SELECT CAST(row_number() OVER (ORDER BY unit_serial) AS INTEGER) AS unit_id, * FROM {src}"
+            else:
+                id_sql = f"row_number() OVER () AS {id_col}, " if id_col else ""
+                select = f"SELECT {id_sql}* FROM {src}"
+            columns = [row[0] for row in conn.execute(f"DESCRIBE {select}").fetchall()]
+            if "unit_serial" in columns and "unit_id" not in columns:
+                # CSV facts carry only the serial: look the id up, keeping the file (id) order
+                select = (f"SELECT f.*, u.unit_id FROM ({select}) f "
+                          f"LEFT JOIN dbo.Dim_Unit u ON u.unit_serial = f.unit_serial ORDER BY f.{id_col}")
+            conn.execute(f"CREATE TABLE dbo.{table} AS {select}")
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)  # readers never see a half-built file
+    print(f"✅ Built {os.path.abspath(db_path)} from {os.path.abspath(data_dir)} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Build the embedded DuckDB database from generated data.")
+    ap.add_argument("--data-dir", default=DATA_DIR)
+    ap.add_argument("--db", default=None, help="database file (default: <data-dir>/fma.duckdb)")
+    args = ap.parse_args()
+    build_duckdb(args.data_dir, args.db)
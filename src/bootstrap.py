@@ -0,0 +1,225 @@
+"""
+Bootstrap confidence intervals for driver lift and Weibull reliability.
+
+Nothing is resampled row by row. Resampling N rows with replacement is the same as drawing the
+counts of the distinct rows from a multinomial, so replicates are drawn on aggregated counts:
+  - lift: the DriverLiftCounter histogram (16 driver patterns x 7 failure codes) is redrawn as
+    Multinomial(N, hist / N), and every driver x failure_code lift is computed for the whole
+    batch of replicates with array ops;
+  - Weibull: units are resampled within each dimension value (one draw shared by all of its
+    failure-mode groups, which hold the same units): they collapse to distinct (ttf_days, failed,
+    failure_mode) cells, each replicate draws Multinomial(n_value, cell share), and the counts are
+    summed into every mode group's (ttf_days, event) cells as frequency weights for the weighted
+    censored solver, all groups x replicates in a batch in one fit_weibull_groups() call.
+Batches run on a process pool; batch b always uses SeedSequence(seed).spawn(...)[b], so results
+depend on the seed only, not on the worker count.
+"""
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.rca_ranker import DriverLiftCounter, expand_counts
+from src.weibull import fit_weibull_groups, stack_rows, weibull_quantile
+
+N_REPLICATES = 10_000
+ALPHA = 0.05  # two-sided percentile interval
+BATCH_REPLICATES = {"lift": 2000, "weibull": 50}
+# a numpy binomial draw costs about as much as this many uniform picks + counts (see _group_multinomial)
+PICKS_PER_BINOMIAL = 10
+
+
+# -----------------------------
+# Batch runner
+# -----------------------------
+_payload = None
+
+
+def _init_worker(payload):
+    global _payload
+    _payload = payload
+
+
+def _run_batch(task):
+    kind, n_rep, seed = task
+    rng = np.random.default_rng(seed)
+    return _lift_batch(_payload, n_rep, rng) if kind == "lift" else _weibull_batch(_payload, n_rep, rng)
+
+
+def run_batches(kind: str, payload, n_replicates: int, seed: int = 42, workers: int = None):
+    """Draw n_replicates in fixed-size batches; returns the batch results stacked on axis 0."""
+    batch = BATCH_REPLICATES[kind]
+    sizes = [batch] * (n_replicates // batch) + ([n_replicates % batch] if n_replicates % batch else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(kind, n, s) for n, s in zip(sizes, seeds)]
+
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        _init_worker(payload)
+        results = [_run_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(payload,)) as pool:
+            results = list(pool.map(_run_batch, tasks))
+    return np.concatenate(results, axis=0)
+
+
+def percentile_interval(samples: np.ndarray, alpha: float = ALPHA):
+    """(low, high) percentile bounds over axis 0, ignoring replicates where the statistic is undefined."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN cells stay NaN
+        low, high = np.nanpercentile(samples, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+    return low, high
+
+
+# -----------------------------
+# Lift
+# -----------------------------
+def lift_statistics(hist: np.ndarray, n_drivers: int) -> np.ndarray:
+    """
+    [..., pattern, code] histograms -> [..., 1 + modes, driver] lift ratios: row 0 is any failure
+    (the scorecard), row m the m-th failure mode (by_failure_mode).
+    """
+    counts = expand_counts(hist, n_drivers).astype(np.float64)  # [..., driver, present, code]
+    n = counts.sum(axis=-1)
+    fails = np.concatenate([counts[..., 1:].sum(axis=-1, keepdims=True), counts[..., 1:-1]], axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = fails / n[..., None]  # [..., driver, present, target]
+        lift = rate[..., 1, :] / rate[..., 0, :]
+    return np.moveaxis(lift, -1, -2)
+
+
+def _lift_batch(payload, n_rep, rng):
+    hist, n_drivers = payload
+    n = int(hist.sum())
+    draws = rng.multinomial(n, hist.ravel() / n, size=n_rep).reshape((n_rep,) + hist.shape)
+    return lift_statistics(draws, n_drivers)
+
+
+def lift_intervals(counter: DriverLiftCounter, n_replicates: int = N_REPLICATES, alpha: float = ALPHA,
+                   seed: int = 42, workers: int = None):
+    """counter.scorecard() and counter.by_failure_mode() with lift_ci_low / lift_ci_high added."""
+    samples = run_batches("lift", (counter.hist, len(counter.drivers)), n_replicates, seed, workers)
+    low, high = percentile_interval(samples, alpha)  # [1 + modes, driver]
+
+    scorecard = counter.scorecard()
+    ci = pd.DataFrame({"driver": counter.drivers, "lift_ci_low": low[0], "lift_ci_high": high[0]})
+    scorecard = scorecard.merge(ci, on="driver", how="left")
+
+    by_mode = counter.by_failure_mode()
+    ci = pd.DataFrame([
+        (mode, driver, low[m, d], high[m, d])
+        for m, mode in enumerate(counter.modes, start=1)
+        for d, driver in enumerate(counter.drivers)
+    ], columns=["failure_code", "driver", "lift_ci_low", "lift_ci_high"])
+    by_mode = by_mode.merge(ci, on=["failure_code", "driver"], how="left")
+    return scorecard, by_mode
+
+
+# -----------------------------
+# Weibull
+# -----------------------------
+def collapse_cells(surv: pd.DataFrame, dims, modes=None):
+    """
+    stack_rows() collapsed for resampling. Returns (keys, cells, units):
+      - cells = (group, t, event): the distinct cells the solver sees, sorted by group;
+      - units = (unit_group, count, n_unit_groups, first, extra): the distinct (dimension value,
+        ttf_days, failed, failure_mode) cells that are resampled, sorted by unit_group. Solver cell j
+        is unit cell first[j] plus, for every (cell, unit) array pair in extra, unit[i] on cell[i].
+    """
+    keys, row, event, group = stack_rows(surv, dims, modes)
+    by_value = keys.groupby(["dimension", "group_value"], sort=False)
+    unit_group = by_value.ngroup().to_numpy(np.intp)[group]
+    kind = surv.groupby(["ttf_days", "failed", "failure_mode"], dropna=False, sort=False).ngroup().to_numpy()[row]
+    t = surv["ttf_days"].to_numpy(np.float64)[row]
+    unit = pd.DataFrame({"g": unit_group, "k": kind}).groupby(["g", "k"], sort=True).ngroup().to_numpy()
+    cell = pd.DataFrame({"g": group, "t": t, "e": event}).groupby(["g", "t", "e"], sort=True).ngroup().to_numpy()
+
+    first_row = np.unique(cell, return_index=True)[1]
+    cells = (group[first_row], t[first_row], event[first_row])
+
+    # every mode group of a dimension value holds all of its units; count them in the "ALL" one
+    unit_row = np.unique(unit, return_index=True)[1]
+    count = np.bincount(unit[(keys["failure_mode"] == "ALL").to_numpy()[group]], minlength=unit_row.size)
+
+    # cell <- unit links in layers that touch each cell at most once (few cells take several unit cells:
+    # other modes' failures are censored into the same t)
+    link = np.unique(cell.astype(np.int64) * max(unit_row.size, 1) + unit)
+    link_cell, link_unit = np.divmod(link, max(unit_row.size, 1))
+    rank = np.arange(link.size) - np.searchsorted(link_cell, link_cell)
+    extra = [(link_cell[rank == r], link_unit[rank == r]) for r in range(1, rank.max(initial=0) + 1)]
+    units = (unit_group[unit_row], count, by_value.ngroups, link_unit[rank == 0], extra)
+    return keys, cells, units
+
+
+def _group_multinomial(rng, group, count, n_groups, n_rep):
+    """
+    Multinomial(n_g, count / n_g) draws within each group (rows sorted by group), each group the
+    cheaper of two ways:
+      - few units per cell: n_g uniform picks among the group's units, counted per cell;
+      - otherwise recursive halving: a run of cells holding m draws sends Binomial(m, left-half
+        count / run count) of them to its left half and the rest to its right half. Vectorized over
+        replicates and runs; loops over the halving depth, log2 of the largest group's cell count.
+    """
+    c_sum = np.concatenate([[0], np.cumsum(count)])
+    lo = np.searchsorted(group, np.arange(n_groups))
+    hi = np.searchsorted(group, np.arange(n_groups), side="right")
+    n = c_sum[hi] - c_sum[lo]
+    pick = n <= PICKS_PER_BINOMIAL * (hi - lo)
+    out = np.zeros((n_rep, group.size), dtype=np.int64)
+
+    # one slot per unit of the picking groups (a group's slots are contiguous); each draws a slot
+    cells = np.flatnonzero(pick[group])
+    slot_cell = np.repeat(cells, count[cells])
+    if slot_cell.size:
+        slot_group = group[slot_cell]
+        first = np.searchsorted(slot_group, slot_group)
+        drawn = slot_cell[first + (rng.random((n_rep, slot_cell.size)) * n[slot_group]).astype(np.int64)]
+        drawn += np.arange(n_rep)[:, None] * group.size
+        out += np.bincount(drawn.ravel(), minlength=out.size).reshape(out.shape)
+
+    keep = ~pick & (hi > lo)
+    lo, hi = lo[keep], hi[keep]
+    m = np.tile(n[keep], (n_rep, 1))
+    while lo.size:
+        cell = hi - lo == 1
+        out[:, lo[cell]] = m[:, cell]
+        lo, hi, m = lo[~cell], hi[~cell], m[:, ~cell]
+        mid = (lo + hi) // 2
+        left = rng.binomial(m, (c_sum[mid] - c_sum[lo]) / (c_sum[hi] - c_sum[lo]))
+        lo, hi, m = np.concatenate([lo, mid]), np.concatenate([mid, hi]), np.concatenate([left, m - left], axis=1)
+    return out
+
+
+def _weibull_batch(payload, n_rep, rng):
+    (group, t, event), (unit_group, count, n_unit_groups, first, extra), n_groups, shape0 = payload
+    draws = _group_multinomial(rng, unit_group, count, n_unit_groups, n_rep)  # [replicate, unit cell]
+    weights = draws[:, first].astype(np.float64)  # [replicate, cell]
+    for cell, unit in extra:
+        weights[:, cell] += draws[:, unit]
+    # the percentiles carry Monte Carlo error far above 1e-6 relative: a tighter solve buys nothing
+    fit = fit_weibull_groups(t, event, group, n_groups, weights=weights, shape0=shape0, tol=1e-6)
+    shape, scale = fit["shape"], fit["scale"]
+    with np.errstate(invalid="ignore"):
+        median = weibull_quantile(shape, scale, 0.5)
+    return np.stack([shape, scale, median], axis=1)  # [replicate, stat, group]
+
+
+def weibull_intervals(surv: pd.DataFrame, table: pd.DataFrame, dims=("optic_vendor", "lot_code", "fw_version"),
+                      modes=None, n_replicates: int = N_REPLICATES, alpha: float = ALPHA, seed: int = 42,
+                      workers: int = None):
+    """
+    weibull.reliability_table() output (`table`, same surv/dims/modes) with percentile CIs for
+    shape, scale and median TTF, resampling units within each group.
+    """
+    keys, cells, units = collapse_cells(surv, dims, modes)
+    payload = (cells, units, len(keys), table["weibull_shape_k"].to_numpy())
+    samples = run_batches("weibull", payload, n_replicates, seed, workers)
+    low, high = percentile_interval(samples, alpha)
+
+    out = table.copy()
+    for i, col in enumerate(["weibull_shape_k", "weibull_scale_lambda_days", "median_ttf_days"]):
+        out[col + "_ci_low"] = low[i]
+        out[col + "_ci_high"] = high[i]
+    return out
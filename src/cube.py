@@ -0,0 +1,384 @@
+"""
+Test-run cube: (runs, fails) per cell, so KPI slices and roll-ups never rescan Fact_TestRun.
+
+One pass over Fact_TestRun joined to Dim_Unit counts runs and fails per cell of
+
+  failure_code x test_type x build_week x linecard_id x supplier_lot_id x station_id
+
+Only non-empty cells are stored, as parallel code arrays (sparse COO). The dimension hierarchy
+above those keys is kept as small code arrays indexed by id, with slot 0 as NULL, like
+src/star_join.py. A line card carries product_family / hw_revision / fw_version. A supplier
+lot carries optic_vendor / lot_code / lot_date. A station carries station_name / station_type /
+calibration_date. Rolling up by any mix of keys and attributes is one gather per dimension
+plus a bincount over the cells. That is a pass over the cells, not the test runs: 5M runs
+collapse to about 200k cells. Weeks start on Monday, as in backends.translate_sql.
+Cubes over disjoint sets of runs add up with merge(), which src/incremental.py uses to fold in
+new batches.
+
+  cube = TestRunCube.from_db(conn)                        # or TestRunCube.from_tables("data")
+  cube.save("outputs/testrun_cube.npz")
+  cube.where(optic_vendor=["PhotonWorks"]).rollup(["fw_version"])
+  cube.kpi("pbi_hw_fw_fail_rate")                         # same columns as the sql/kpi_queries.sql export
+
+  python -m src.cube --data-dir data --out outputs        # build from the generated files
+  python -m src.cube --cube outputs/testrun_cube.npz --by product_family fw_version --where optic_vendor=PhotonWorks
+"""
+import argparse
+import io
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.backends import TABLES, fetch_chunks, fetch_df
+from src.star_join import DATE_SUFFIXES, StarSchema
+from src.storage import load_table
+
+CUBE_FILE = "testrun_cube.npz"
+CHUNK_ROWS = 1_000_000
+
+# cell keys; the id keys index their dimension's attribute arrays
+KEYS = ["failure_code", "test_type", "build_week", "linecard_id", "supplier_lot_id", "station_id"]
+HIERARCHY = {"linecard_id": "Dim_LineCard", "supplier_lot_id": "Dim_SupplierLot", "station_id": "Dim_Station"}
+FACT_COLUMNS = ["failure_code", "test_type", "pass_fail", "station_id"]
+UNIT_COLUMNS = ["linecard_id", "supplier_lot_id", "build_date"]
+
+CUBE_SQL = """
+    USE NokiaFMA;
+
+    SELECT
+        tr.failure_code,
+        tr.test_type,
+        tr.pass_fail,
+        tr.station_id,
+        u.linecard_id,
+        u.supplier_lot_id,
+        u.build_date
+    FROM dbo.Fact_TestRun tr
+    JOIN dbo.Dim_Unit u ON u.unit_serial = tr.unit_serial;
+"""
+
+# sql/kpi_queries.sql exports -> (group by, sort); the cube answers these without touching the facts
+KPIS = {
+    "pbi_weekly_trend": (["build_week"], None),
+    "pbi_hw_fw_fail_rate": (["product_family", "hw_revision", "fw_version"], "rate"),
+    "pbi_supplier_lot_fail_rate": (["optic_vendor", "lot_code", "lot_date"], "rate"),
+    "pbi_station_health": (["station_name", "station_type", "calibration_date"], "rate"),
+}
+
+
+def _labels(values: pd.Series):
+    """(codes with 0 = NULL, labels with a placeholder in slot 0) of a dimension column."""
+    if values.name.endswith(DATE_SUFFIXES):
+        values = pd.to_datetime(values).dt.floor("D")
+        codes, uniques = pd.factorize(values, sort=True)
+        labels = np.concatenate([[np.datetime64("NaT", "D")], uniques.to_numpy().astype("datetime64[D]")])
+    else:
+        codes, uniques = pd.factorize(values, sort=True)
+        uniques = np.asarray(uniques)
+        if uniques.dtype.kind in "iuf":
+            labels = np.concatenate([[0], uniques]).astype(uniques.dtype)
+        else:
+            labels = np.array([""] + [str(v) for v in uniques])
+    return codes.astype(np.int32) + 1, labels
+
+
+def _decode(codes: np.ndarray, labels: np.ndarray) -> pd.Series:
+    values = pd.Series(labels[codes])
+    return values if labels.dtype.kind == "M" else values.where(codes != 0)
+
+
+def pct(num, den):
+    """100 * num / den rounded half-up to 2 places in integer arithmetic, like CAST(... AS DECIMAL(5,2))."""
+    num, den = np.asarray(num, dtype=np.int64), np.asarray(den, dtype=np.int64)
+    safe = np.where(den > 0, den, 1)
+    return np.where(den > 0, ((20_000 * num + safe) // (2 * safe)) / 100.0, np.nan)
+
+
+def _group(columns, sizes, *weights):
+    """Unique rows of the code columns, plus the summed weights of each."""
+    flat = np.ravel_multi_index(columns, sizes)
+    uniq, inverse = np.unique(flat, return_inverse=True)
+    sums = [np.bincount(inverse, weights=w, minlength=len(uniq)).astype(np.int64) for w in weights]
+    return np.unravel_index(uniq, sizes), sums
+
+
+class _CellCounter:
+    """Streams joined fact chunks into cell counts; string keys get stable codes across chunks."""
+
+    def __init__(self):
+        self.members = {"failure_code": {}, "test_type": {}}
+        self.parts = []
+        self.rows = 0
+
+    def _encode(self, key: str, values: pd.Series) -> np.ndarray:
+        cat = pd.Categorical(values)
+        lookup = self.members[key]
+        lut = np.array([0] + [lookup.setdefault(v, len(lookup) + 1) for v in cat.categories], dtype=np.int32)
+        return lut[cat.codes.astype(np.int64) + 1]  # -1 (NULL) -> slot 0
+
+    def update(self, chunk: pd.DataFrame):
+        days = pd.to_datetime(chunk["build_date"]).to_numpy(dtype="datetime64[D]")
+        week = np.where(np.isnat(days), -1, (days.astype(np.int64) + 3) // 7)  # 1970-01-01 is a Thursday
+        columns = [
+            self._encode("failure_code", chunk["failure_code"]),
+            self._encode("test_type", chunk["test_type"]),
+            week + 1,
+            chunk["linecard_id"].to_numpy(dtype=np.int64),
+            chunk["supplier_lot_id"].to_numpy(dtype=np.int64),
+            chunk["station_id"].to_numpy(dtype=np.int64),
+        ]
+        fails = (chunk["pass_fail"].to_numpy() == 0).astype(np.float64)
+        sizes = [int(c.max(initial=0)) + 1 for c in columns]
+        cells, (runs, fails) = _group(columns, sizes, np.ones(len(chunk)), fails)
+        self.parts.append((cells, runs, fails))
+        self.rows += len(chunk)
+
+    def cells(self):
+        """(codes per key, runs, fails, week starts) merged over all chunks."""
+        empty = np.zeros(0, dtype=np.int64)
+        columns = [np.concatenate([empty] + [p[0][i] for p in self.parts]) for i in range(len(KEYS))]
+        runs = np.concatenate([empty] + [p[1] for p in self.parts])
+        fails = np.concatenate([empty] + [p[2] for p in self.parts])
+        sizes = [int(c.max(initial=0)) + 1 for c in columns]
+        columns, (runs, fails) = _group(columns, sizes, runs, fails)
+        codes = dict(zip(KEYS, (c.astype(np.int32) for c in columns)))
+
+        # build weeks: (weeks since epoch + 1) -> dense codes over the weeks present, 0 = no build date
+        week = codes["build_week"]
+        present = np.unique(week[week > 0])
+        codes["build_week"] = np.where(week > 0, np.searchsorted(present, week) + 1, 0).astype(np.int32)
+        week_starts = ((present.astype(np.int64) - 1) * 7 - 3).astype("datetime64[D]")
+        return codes, runs, fails, np.concatenate([[np.datetime64("NaT", "D")], week_starts])
+
+
+def hierarchy_tables(data_dir: str) -> dict:
+    """The HIERARCHY dimensions from the generator's files, with their ids (file order, as loaded)."""
+    dims = {}
+    for table in HIERARCHY.values():
+        df = load_table(data_dir, TABLES[table][0])
+        df.insert(0, TABLES[table][1], np.arange(1, len(df) + 1))
+        dims[table] = df
+    return dims
+
+
+class TestRunCube:
+    """Non-empty cells (codes per KEY, runs, fails) plus labels for every key and attribute."""
+
+    def __init__(self, codes: dict, runs: np.ndarray, fails: np.ndarray, labels: dict, attributes: dict):
+        """
+        `codes`: {key: int32 per cell}. `labels`: {key or attribute: label array, slot 0 = NULL}.
+        `attributes`: {attribute: (id key, int32 code per id)}.
+        """
+        self.codes = codes
+        self.runs = runs
+        self.fails = fails
+        self.labels = labels
+        self.attributes = attributes
+
+    # ---- building ----
+    @classmethod
+    def build(cls, chunks, dims: dict) -> "TestRunCube":
+        """`chunks`: frames with FACT_COLUMNS + UNIT_COLUMNS; `dims`: {table: DataFrame with its id column}."""
+        counter = _CellCounter()
+        for chunk in chunks:
+            counter.update(chunk)
+        codes, runs, fails, week_starts = counter.cells()
+        labels = {key: np.array([""] + list(counter.members[key])) for key in ("failure_code", "test_type")}
+        labels["build_week"] = week_starts
+        attributes = {}
+        for key, table in HIERARCHY.items():
+            id_col = TABLES[table][1]
+            df = dims[table]
+            ids = df[id_col].to_numpy(dtype=np.intp)
+            labels[key] = np.arange(int(ids.max(initial=0)) + 1)
+            for col in df.columns.drop(id_col):
+                col_codes, labels[col] = _labels(df[col])
+                by_id = np.zeros(len(labels[key]), dtype=np.int32)
+                by_id[ids] = col_codes
+                attributes[col] = (key, by_id)
+        return cls(codes, runs, fails, labels, attributes)
+
+    @classmethod
+    def from_tables(cls, data_dir: str, chunk_rows: int = CHUNK_ROWS) -> "TestRunCube":
+        """From the generator's files, joined in process (src/star_join.py)."""
+        star = StarSchema.from_tables(data_dir)
+        chunks = star.scan(data_dir, "fact_testrun", (FACT_COLUMNS, UNIT_COLUMNS), chunk_rows)
+        return cls.build(chunks, hierarchy_tables(data_dir))
+
+    @classmethod
+    def from_db(cls, conn, chunk_rows: int = CHUNK_ROWS) -> "TestRunCube":
+        """From an open backends connection: one streamed pass over the fact join, one small query per dimension."""
+        dims = {table: fetch_df(conn, f"USE NokiaFMA;\nSELECT * FROM dbo.{table};") for table in HIERARCHY.values()}
+        return cls.build(fetch_chunks(conn, CUBE_SQL, chunk_rows), dims)
+
+    # ---- querying ----
+    @property
+    def names(self):
+        return KEYS + list(self.attributes)
+
+    def cell_codes(self, name: str) -> np.ndarray:
+        """Per-cell codes into labels[name] (attributes are gathered through their id key)."""
+        if name in self.codes:
+            return self.codes[name]
+        if name not in self.attributes:
+            raise KeyError(f"Unknown cube dimension {name!r}; expected one of {self.names}")
+        key, by_id = self.attributes[name]
+        return by_id[self.codes[key]]
+
+    def members(self, name: str) -> list:
+        """Non-NULL labels of `name` that occur in some cell, in label order."""
+        used = np.unique(self.cell_codes(name))
+        return self.labels[name][used[used != 0]].tolist()
+
+    def where(self, **filters) -> "TestRunCube":
+        """Cells whose labels are among the given values, e.g. where(optic_vendor=["PhotonWorks"], test_type="X")."""
+        mask = np.ones(len(self.runs), dtype=bool)
+        for name, values in filters.items():
+            labels = self.labels[name] if name in self.labels else None
+            if labels is None:
+                raise KeyError(f"Unknown cube dimension {name!r}; expected one of {self.names}")
+            values = list(values) if isinstance(values, (list, tuple, set, np.ndarray, pd.Index)) else [values]
+            if labels.dtype.kind in "iufM":
+                values = np.asarray(values).astype(labels.dtype)
+            allowed = pd.Index(labels).isin(values)
+            allowed[0] = False  # NULL matches nothing
+            mask &= allowed[self.cell_codes(name)]
+        codes = {k: v[mask] for k, v in self.codes.items()}
+        return TestRunCube(codes, self.runs[mask], self.fails[mask], self.labels, self.attributes)
+
+    def totals(self):
+        return int(self.runs.sum()), int(self.fails.sum())
+
+    def rollup(self, by) -> pd.DataFrame:
+        """test_runs, fails and fail_rate_pct per combination of `by` (keys and/or attributes) that has runs."""
+        by = list(by)
+        if not by:
+            runs, fails = self.totals()
+            out = pd.DataFrame({"test_runs": [runs], "fails": [fails]})
+        else:
+            columns = [self.cell_codes(name) for name in by]
+            sizes = [len(self.labels[name]) for name in by]
+            groups, (runs, fails) = _group(columns, sizes, self.runs, self.fails)
+            out = pd.DataFrame({name: _decode(codes, self.labels[name]) for name, codes in zip(by, groups)})
+            out["test_runs"], out["fails"] = runs, fails
+        out["fail_rate_pct"] = pct(out["fails"], out["test_runs"])
+        return out
+
+    def kpi(self, name: str) -> pd.DataFrame:
+        """A sql/kpi_queries.sql result (backends.SCRIPT_QUERIES name) computed from the cells."""
+        if name == "pbi_exec_overview":
+            runs, fails = self.totals()
+            rate = float(pct(runs - fails, runs))
+            return pd.DataFrame({"pass_rate_pct": [rate], "total_test_runs": [runs]})
+        if name == "pbi_failure_pareto":
+            df = self.rollup(["failure_code"]).dropna(subset=["failure_code"])
+            df = df[df["fails"] > 0].rename(columns={"fails": "fail_count"})
+            return df.sort_values("fail_count", ascending=False, kind="stable")[["failure_code", "fail_count"]] \
+                .head(10).reset_index(drop=True)
+        if name not in KPIS:
+            raise KeyError(f"No cube KPI {name!r}; expected pbi_exec_overview, pbi_failure_pareto or one of "
+                           f"{list(KPIS)}")
+        by, order = KPIS[name]
+        df = self.rollup(by)
+        if order == "rate":
+            df = df.sort_values(["fail_rate_pct", "fails"], ascending=False, kind="stable")
+        else:
+            df = df.dropna(subset=by).sort_values(by).rename(columns={"build_week": "build_week_start"})
+        return df.reset_index(drop=True)
+
+    # ---- combining ----
+    def merge(self, other: "TestRunCube") -> "TestRunCube":
+        """
+        This cube plus the cells of `other` (e.g. one built from a new batch of test runs). Labels
+        new to `other` are appended to this cube's, so existing codes stay put. The hierarchy comes
+        from `other`, which was built against the current dimension tables.
+        """
+        codes, labels = {}, {**self.labels, **other.labels}
+        for key in KEYS:
+            if key in HIERARCHY:  # ids are labels of their own
+                codes[key] = other.codes[key]
+                continue
+            mine, theirs = self.labels[key], other.labels[key]
+            pos = pd.Index(mine[1:]).get_indexer(theirs)
+            new = pos < 0
+            new[0] = False  # NULL stays in slot 0
+            lut = pos + 1
+            lut[new] = len(mine) + np.arange(int(new.sum()))
+            lut[0] = 0
+            labels[key] = np.concatenate([mine, theirs[new]])
+            codes[key] = lut[other.codes[key]].astype(np.int32)
+        for key in HIERARCHY:
+            labels[key] = max(self.labels[key], other.labels[key], key=len)
+        columns = [np.concatenate([self.codes[k], codes[k]]) for k in KEYS]
+        sizes = [len(labels[k]) for k in KEYS]
+        columns, (runs, fails) = _group(columns, sizes, np.concatenate([self.runs, other.runs]),
+                                        np.concatenate([self.fails, other.fails]))
+        codes = dict(zip(KEYS, (c.astype(np.int32) for c in columns)))
+        return TestRunCube(codes, runs, fails, labels, other.attributes)
+
+    # ---- persistence ----
+    def arrays(self) -> dict:
+        """The cube as named arrays (what save() writes)."""
+        arrays = {"runs": self.runs, "fails": self.fails}
+        arrays.update({f"code/{k}": v for k, v in self.codes.items()})
+        arrays.update({f"label/{k}": v for k, v in self.labels.items()})
+        arrays.update({f"attr/{a}": by_id for a, (_, by_id) in self.attributes.items()})
+        meta = {"keys": KEYS, "attributes": {a: key for a, (key, _) in self.attributes.items()},
+                "cells": int(len(self.runs)), "test_runs": int(self.runs.sum())}
+        arrays["meta"] = np.array(json.dumps(meta))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "TestRunCube":
+        """Inverse of arrays(); `arrays` may be an open npz file."""
+        meta = json.loads(str(arrays["meta"]))
+        codes = {k: arrays[f"code/{k}"] for k in meta["keys"]}
+        labels = {k[len("label/"):]: arrays[k] for k in arrays if k.startswith("label/")}
+        attributes = {a: (key, arrays[f"attr/{a}"]) for a, key in meta["attributes"].items()}
+        return cls(codes, arrays["runs"], arrays["fails"], labels, attributes)
+
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        buf = io.BytesIO()
+        np.savez_compressed(buf, **self.arrays())
+        with open(path + ".tmp", "wb") as f:
+            f.write(buf.getvalue())
+        os.replace(path + ".tmp", path)  # the dashboard never reads a half-written cube
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "TestRunCube":
+        with np.load(path, allow_pickle=False) as npz:
+            return cls.from_arrays(npz)
+
+if __name__ == "__main__":
+    from src import backends
+
+    ap = argparse.ArgumentParser(description="Build or query the test-run cube.")
+    ap.add_argument("--data-dir", default=backends.DATA_DIR, help="build from these generated files")
+    ap.add_argument("--db", action="store_true", help="build through the FMA_BACKEND connection instead")
+    ap.add_argument("--out", default="outputs", help="directory for testrun_cube.npz")
+    ap.add_argument("--cube", help="query this cube file instead of building one")
+    ap.add_argument("--by", nargs="*", default=[], help="roll up by these keys/attributes")
+    ap.add_argument("--where", nargs="*", default=[], metavar="NAME=VALUE[,VALUE]", help="slice before rolling up")
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = ap.parse_args()
+
+    if args.cube:
+        t0 = time.perf_counter()
+        cube = TestRunCube.load(args.cube)
+        filters = dict(w.split("=", 1) for w in args.where)
+        df = cube.where(**{k: v.split(",") for k, v in filters.items()}).rollup(args.by)
+        print(df.to_string(index=False))
+        print(f"({len(cube.runs):,} cells, {(time.perf_counter() - t0) * 1000:.0f}ms including load)")
+    else:
+        t0 = time.perf_counter()
+        cube = TestRunCube.from_db(backends.connect()) if args.db else \
+            TestRunCube.from_tables(args.data_dir, args.chunk_rows)
+        path = cube.save(os.path.join(args.out, CUBE_FILE))
+        runs, fails = cube.totals()
+        print(f"✅ Wrote {os.path.abspath(path)}: {runs:,} test runs in {len(cube.runs):,} cells "
+              f"({time.perf_counter() - t0:.1f}s)")
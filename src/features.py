@@ -0,0 +1,137 @@
+"""
+Driver-model features, built straight into one float32 design matrix.
+
+The joined test-run columns (rca_weibull.SQL["model_base"]) are written column by column into a
+preallocated C-contiguous float32 array, filled from the source Series without any intermediate
+DataFrame, dummy frame or concat. C order is what sklearn's solvers consume without copying
+(a Fortran-order matrix gets a full-size C copy inside LogisticRegression.fit). The driver
+flags come from rca_ranker.driver_pattern(), so the model and the lift ranker share one
+definition of HIGH_TEMP / HIGH_RIPPLE / DRIFT_STATION / OPTIC_VENDOR_OPTICORE.
+
+Categorical columns are one-hot encoded against a category list fixed at fit time. The mapping
+from a chunk's own category dictionary to output columns is cached. Parquet chunks share one
+dictionary, so after the first chunk each encode is a single take on the integer codes.
+"""
+import numpy as np
+import pandas as pd
+
+from src.rca_ranker import FLAGGED_VENDOR, driver_pattern
+
+CONTINUOUS = ["temp_c", "ripple_mv", "q_factor", "eye_height_mv", "rx_power_dbm", "log10_ber"]
+FLAGS = ["high_temp", "high_ripple", "drift_station", "opti_vendor"]  # bit order of rca_ranker.DRIVERS
+NUMERIC = CONTINUOUS + FLAGS
+BER_FLOOR = 1e-12
+
+# one-hot encoded column -> feature name prefix
+CATEGORICAL = {"test_type": "test", "fw_version": "fw", "optic_vendor": "vendor"}
+# levels left out of their one-hot block because a flag already encodes them
+DROP = {"optic_vendor": (FLAGGED_VENDOR,)}
+
+
+def _as_category(values: pd.Series) -> pd.Series:
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    return values.astype("category")  # one hash pass; Parquet dictionary columns skip it
+
+
+class CategoryEncoder:
+    """
+    Category values -> column offsets 0..k-1 (unknown, dropped values and NULL -> -1).
+    Categories are collected with partial_fit() and frozen (sorted) on first use, so every chunk
+    encodes into the same columns.
+    """
+
+    def __init__(self, categories=None, drop=()):
+        self.drop = set(drop)
+        self.categories = None if categories is None else [c for c in categories if c not in self.drop]
+        self._seen = set()
+        self._luts = {}  # tuple of a chunk's categories -> code lookup table
+
+    def partial_fit(self, values: pd.Series):
+        if self.categories is not None:
+            raise RuntimeError("CategoryEncoder is already frozen")
+        values = _as_category(values)
+        used = np.bincount(values.cat.codes.to_numpy() + 1, minlength=len(values.cat.categories) + 1)[1:] > 0
+        self._seen.update(values.cat.categories[used])
+        return self
+
+    def freeze(self):
+        if self.categories is None:
+            self.categories = sorted(self._seen - self.drop)
+        return self
+
+    def codes(self, values: pd.Series) -> np.ndarray:
+        self.freeze()
+        values = _as_category(values)
+        key = tuple(values.cat.categories)
+        lut = self._luts.get(key)
+        if lut is None:
+            index = {c: i for i, c in enumerate(self.categories)}
+            # trailing -1 for the -1 (NULL) code
+            lut = np.array([index.get(c, -1) for c in key] + [-1], dtype=np.int32)
+            self._luts[key] = lut
+        return lut[values.cat.codes.to_numpy()]
+
+
+class FeaturePipeline:
+    """
+    Numeric features (CONTINUOUS + FLAGS) followed by the one-hot blocks of CATEGORICAL.
+
+    fit()/partial_fit() only collect categories (stream them over chunks for the full table);
+    transform() returns the float32 design matrix. Pass `categories` ({column: values}) to pin
+    the one-hot columns up front.
+    """
+
+    def __init__(self, categorical=CATEGORICAL, categories=None, drop=DROP):
+        self.categorical = dict(categorical)
+        categories = categories or {}
+        self.encoders = {col: CategoryEncoder(categories.get(col), drop.get(col, ())) for col in self.categorical}
+
+    def partial_fit(self, df: pd.DataFrame):
+        for col, encoder in self.encoders.items():
+            if encoder.categories is None:
+                encoder.partial_fit(df[col])
+        return self
+
+    def fit(self, df: pd.DataFrame):
+        return self.partial_fit(df)
+
+    @property
+    def columns(self):
+        names = list(NUMERIC)
+        for col, prefix in self.categorical.items():
+            names += [f"{prefix}_{c}" for c in self.encoders[col].freeze().categories]
+        return names
+
+    def transform(self, df: pd.DataFrame, numeric_only: bool = False) -> np.ndarray:
+        """(rows, features) float32, C order; NULL numeric inputs stay NaN."""
+        n = len(df)
+        width = len(NUMERIC) if numeric_only else len(self.columns)
+        X = np.empty((n, width), dtype=np.float32)
+
+        for j, col in enumerate(CONTINUOUS[:-1]):
+            X[:, j] = df[col].to_numpy(dtype=np.float32, na_value=np.nan)
+        ber = df["ber"].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        np.maximum(ber, BER_FLOOR, out=ber)  # NaN propagates
+        X[:, len(CONTINUOUS) - 1] = np.log10(ber, out=ber)
+
+        pattern = driver_pattern(df)
+        bit_buf = np.empty_like(pattern)
+        for bit in range(len(FLAGS)):
+            np.right_shift(pattern, bit, out=bit_buf)
+            X[:, len(CONTINUOUS) + bit] = np.bitwise_and(bit_buf, 1, out=bit_buf)
+
+        if numeric_only:
+            return X
+        offset = len(NUMERIC)
+        for col, encoder in self.encoders.items():
+            code = encoder.codes(df[col])
+            for k in range(len(encoder.categories)):  # a handful of levels: one compare per column
+                X[:, offset + k] = code == k
+            offset += len(encoder.categories)
+        return X
+
+
+def fail_target(df: pd.DataFrame) -> np.ndarray:
+    """1 = failed run, 0 = pass (int8)."""
+    return (df["pass_fail"].to_numpy() == 0).astype(np.int8)
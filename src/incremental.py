@@ -0,0 +1,399 @@
+"""
+Incremental ingest: append a batch of test runs / field returns and update the KPIs from the batch alone.
+
+Every KPI and RCA table the dashboard reads is a roll-up of three sets of additive counters:
+
+  - the test-run cube (src/cube.py): runs and fails per (failure code, test type, build week,
+    line card, supplier lot, station) cell. Pass rate, Pareto, weekly trend and the HW/FW,
+    supplier-lot and station fail rates are read off it;
+  - the driver pattern x failure code histogram of rca_ranker.DriverLiftCounter, which expands
+    into the driver x present/absent x failure_code contingency counts behind rca_scorecard and
+    rca_by_failure_mode (bootstrap intervals are redrawn from the same histogram);
+  - returns with a repair action, and NFF returns, per supplier lot (pbi_vendor_lot_returns; the
+    units built per lot come from Dim_Unit).
+
+KpiState keeps them in <data dir>/kpi_state.npz. An ingest star-joins the batch to the dimensions
+(src/star_join.py), counts it into a state of its own and adds that to the saved one. The cost is
+the batch plus a merge of the cube's cells, which are bounded by the dimensions, not by the
+history. The batch is appended to the fact tables as well, so the files (and the DuckDB build,
+which notices the newer data) still hold the full history. A CSV fact gets the rows appended. A
+Parquet fact gets a new part file; a single .parquet file is first moved into a <table>/ dataset
+directory, which every reader already handles. The refreshed KPI tables and the cube are then
+written to the outputs directory.
+
+`check` recounts the full fact tables and compares the result with the saved state, counter by
+counter, exactly. `rebuild` replaces the state with that recount; the first ingest builds it.
+
+  python -m src.incremental ingest --testruns batch_testrun.csv --returns batch_returns.csv
+  python -m src.incremental check
+  python -m src.incremental rebuild --data-dir data --out outputs
+
+The batch's units and stations must already be in the dimension tables. Rows that reference
+unknown ones are rejected, rather than silently dropped the way the SQL joins would drop them.
+Each batch file is recorded by content hash, and ingesting the same file twice is refused.
+"""
+import argparse
+import datetime as dt
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src import cube as cube_module
+from src.backends import DATA_DIR, TABLES
+from src.bootstrap import N_REPLICATES, lift_intervals
+from src.cube import CUBE_FILE, FACT_COLUMNS, UNIT_COLUMNS, TestRunCube, hierarchy_tables, pct
+from src.rca_ranker import DriverLiftCounter
+from src.star_join import RCA_BASE, StarSchema
+from src.storage import find_table, iter_table, pa, pq, read_table, table_columns, write_table
+
+STATE_FILE = "kpi_state.npz"
+OUT_DIR = "outputs"
+MANIFEST = "manifest.json"
+CHUNK_ROWS = 1_000_000
+HASH_BLOCK = 1 << 20
+
+TESTRUN_TABLE = TABLES["Fact_TestRun"][0]
+RETURN_TABLE = TABLES["Fact_FieldReturn"][0]
+
+# one star-joined pass feeds both the cube and the lift counter
+TESTRUN_SPEC = (list(dict.fromkeys(FACT_COLUMNS + RCA_BASE[0])), list(dict.fromkeys(UNIT_COLUMNS + RCA_BASE[1])))
+RETURN_COLUMNS = ["unit_serial", "repair_action"]
+
+# sql/kpi_queries.sql exports the cube reproduces
+CUBE_KPIS = ["pbi_exec_overview", "pbi_failure_pareto", *cube_module.KPIS]
+
+
+# -----------------------------
+# State
+# -----------------------------
+def _lot_counts(star: StarSchema, returns: pd.DataFrame, n_lots: int):
+    """(returns with a repair action, NFF returns) per supplier_lot_id; slot 0 = unknown unit or lot."""
+    lot = star.resolve(returns, ["supplier_lot_id"])["supplier_lot_id"]
+    action = returns["repair_action"]
+    returned = action.notna().to_numpy(dtype=np.float64)
+    nff = (action == "NFF").to_numpy(dtype=np.float64, na_value=False)
+    return (np.bincount(lot, weights=returned, minlength=n_lots).astype(np.int64),
+            np.bincount(lot, weights=nff, minlength=n_lots).astype(np.int64))
+
+
+def _counted(chunks, lift: DriverLiftCounter):
+    for chunk in chunks:
+        lift.update(chunk)
+        yield chunk
+
+
+def _resized(a: np.ndarray, size: int) -> np.ndarray:
+    """Per-id counts zero-padded to `size` ids (the lot table may have grown since they were counted)."""
+    out = np.zeros(max(size, len(a)), dtype=np.int64)
+    out[:len(a)] = a
+    return out
+
+
+class KpiState:
+    """Additive counters over a set of test runs and field returns (see the module docstring)."""
+
+    def __init__(self, cube: TestRunCube, lift: DriverLiftCounter, returned: np.ndarray, nff: np.ndarray,
+                 batches=None):
+        self.cube = cube
+        self.lift = lift
+        self.returned = returned  # int64 per supplier_lot_id
+        self.nff = nff
+        self.batches = list(batches or [])  # ingested files: {"table", "file", "sha256", "rows", "ingested_at"}
+
+    @classmethod
+    def count(cls, star: StarSchema, dims: dict, testruns, returns) -> "KpiState":
+        """Counters of star-joined test-run chunks (TESTRUN_SPEC) and field-return chunks (RETURN_COLUMNS)."""
+        lift = DriverLiftCounter()
+        cube = TestRunCube.build(_counted(testruns, lift), dims)
+        n_lots = len(cube.labels["supplier_lot_id"])
+        returned, nff = np.zeros(n_lots, dtype=np.int64), np.zeros(n_lots, dtype=np.int64)
+        for chunk in returns:
+            r, n = _lot_counts(star, chunk, n_lots)
+            returned, nff = returned + r, nff + n
+        return cls(cube, lift, returned, nff)
+
+    @classmethod
+    def recount(cls, data_dir: str, star: StarSchema = None, dims: dict = None,
+                chunk_rows: int = CHUNK_ROWS) -> "KpiState":
+        """The full recompute: one pass over each fact table."""
+        star = star or StarSchema.from_tables(data_dir)
+        dims = dims or hierarchy_tables(data_dir)
+        testruns = star.scan(data_dir, TESTRUN_TABLE, TESTRUN_SPEC, chunk_rows)
+        returns = iter_table(find_table(data_dir, RETURN_TABLE), columns=RETURN_COLUMNS, chunk_rows=chunk_rows)
+        return cls.count(star, dims, testruns, returns)
+
+    def merge(self, other: "KpiState") -> "KpiState":
+        lift = DriverLiftCounter(self.lift.drivers, self.lift.modes)
+        lift.hist = self.lift.hist + other.lift.hist
+        size = max(len(self.returned), len(other.returned))
+        returned = _resized(self.returned, size) + _resized(other.returned, size)
+        nff = _resized(self.nff, size) + _resized(other.nff, size)
+        return KpiState(self.cube.merge(other.cube), lift, returned, nff, self.batches + other.batches)
+
+    @property
+    def test_runs(self) -> int:
+        return int(self.cube.runs.sum())
+
+    @property
+    def field_returns(self) -> int:
+        return int(self.returned.sum())
+
+    def differences(self, other: "KpiState") -> list:
+        """Names of the counters that differ from `other`'s (empty when they all match)."""
+        out = []
+        a, b = (c.rollup(cube_module.KEYS).sort_values(cube_module.KEYS, ignore_index=True)
+                for c in (self.cube, other.cube))
+        if not a.equals(b):
+            out.append("test-run cube")
+        if (self.lift.drivers, self.lift.modes) != (other.lift.drivers, other.lift.modes) or \
+                not np.array_equal(self.lift.hist, other.lift.hist):
+            out.append("driver x failure_code counts")
+        size = max(len(self.returned), len(other.returned))
+        if not np.array_equal(_resized(self.returned, size), _resized(other.returned, size)):
+            out.append("field returns per lot")
+        if not np.array_equal(_resized(self.nff, size), _resized(other.nff, size)):
+            out.append("NFF returns per lot")
+        return out
+
+    # ---- persistence ----
+    def save(self, data_dir: str) -> str:
+        path = os.path.join(data_dir, STATE_FILE)
+        arrays = {f"cube/{k}": v for k, v in self.cube.arrays().items()}
+        arrays.update({"lift": self.lift.hist, "returned": self.returned, "nff": self.nff})
+        meta = {"drivers": self.lift.drivers, "modes": self.lift.modes, "batches": self.batches,
+                "test_runs": self.test_runs, "field_returns": self.field_returns}
+        arrays["meta"] = np.array(json.dumps(meta))
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(path + ".tmp", path)
+        return path
+
+    @classmethod
+    def load(cls, data_dir: str) -> "KpiState":
+        with np.load(os.path.join(data_dir, STATE_FILE), allow_pickle=False) as npz:
+            meta = json.loads(str(npz["meta"]))
+            lift = DriverLiftCounter(meta["drivers"], meta["modes"])
+            if npz["lift"].shape != lift.hist.shape:
+                raise ValueError(f"{STATE_FILE} does not match its drivers/modes; run `python -m src.incremental "
+                                 f"rebuild`")
+            lift.hist = npz["lift"]
+            cube = TestRunCube.from_arrays({k[len("cube/"):]: npz[k] for k in npz.files if k.startswith("cube/")})
+            return cls(cube, lift, npz["returned"], npz["nff"], meta["batches"])
+
+
+# -----------------------------
+# KPI tables
+# -----------------------------
+def vendor_lot_returns(state: KpiState, star: StarSchema, dims: dict) -> pd.DataFrame:
+    """pbi_vendor_lot_returns (sql/kpi_queries.sql #10) from the per-lot counters."""
+    unit_lot = star.attributes["supplier_lot_id"][1].values
+    lots = dims["Dim_SupplierLot"]
+    ids = lots["supplier_lot_id"].to_numpy(dtype=np.intp)
+    size = int(max(ids.max(initial=0), len(state.returned) - 1)) + 1
+    built = np.bincount(unit_lot[unit_lot > 0], minlength=size)
+    df = lots[["optic_vendor", "lot_code"]].assign(
+        units_built=built[ids], units_returned=_resized(state.returned, size)[ids],
+        nff_count=_resized(state.nff, size)[ids])
+    df = df[df["units_built"] > 0].groupby(["optic_vendor", "lot_code"], as_index=False, sort=False).sum()
+    df.insert(4, "field_return_rate_pct", pct(df["units_returned"], df["units_built"]))
+    df["nff_pct_of_returns"] = pct(df["nff_count"], df["units_returned"])
+    return df.sort_values("field_return_rate_pct", ascending=False, kind="stable", ignore_index=True)
+
+
+def kpi_tables(state: KpiState, star: StarSchema, dims: dict, n_boot: int = N_REPLICATES) -> dict:
+    """{artifact name: frame} for every dashboard table the state covers."""
+    tables = {name: state.cube.kpi(name) for name in CUBE_KPIS}
+    tables["pbi_vendor_lot_returns"] = vendor_lot_returns(state, star, dims)
+    if n_boot:
+        tables["rca_scorecard"], tables["rca_by_failure_mode"] = lift_intervals(state.lift, n_replicates=n_boot)
+    else:
+        tables["rca_scorecard"], tables["rca_by_failure_mode"] = state.lift.scorecard(), state.lift.by_failure_mode()
+    return tables
+
+
+def write_outputs(tables: dict, cube: TestRunCube, out_dir: str):
+    """Parquet artifacts + the cube, and their manifest.json entries (other entries are kept)."""
+    os.makedirs(out_dir, exist_ok=True)
+    artifacts = {}
+    for name, df in tables.items():
+        path = os.path.join(out_dir, name + ".parquet")
+        write_table(df, path + ".tmp")
+        os.replace(path + ".tmp", path)  # the dashboard never reads a half-written file
+        artifacts[name] = {"file": os.path.basename(path), "query": STATE_FILE, "rows": len(df),
+                           "columns": {col: str(dtype) for col, dtype in df.dtypes.items()}}
+    cube.save(os.path.join(out_dir, CUBE_FILE))
+
+    path = os.path.join(out_dir, MANIFEST)
+    manifest = {"artifacts": {}}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    manifest["generated_at"] = dt.datetime.now().isoformat(timespec="seconds")
+    manifest.setdefault("artifacts", {}).update(artifacts)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+# -----------------------------
+# Appending to the fact tables
+# -----------------------------
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_batch(path: str) -> pd.DataFrame:
+    if path.endswith(".csv"):  # exact floats, so appended rows read back as the values given
+        return pd.read_csv(path, float_precision="round_trip")
+    return read_table(path)
+
+
+def check_keys(star: StarSchema, df: pd.DataFrame, name: str):
+    """Raise ValueError when batch rows reference units (or stations) missing from the dimensions."""
+    unknown = df["unit_serial"][star.units.encode(df["unit_serial"]) == 0]
+    if len(unknown):
+        raise ValueError(f"{name}: {len(unknown):,} rows reference units not in dim_unit "
+                         f"(e.g. {unknown.iloc[0]!r}); load the units first")
+    if "station_id" in df.columns:
+        stations = star.attributes["station_name"][1].values
+        ids = pd.to_numeric(df["station_id"], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        known = (ids >= 1) & (ids < len(stations))
+        if not known.all():
+            raise ValueError(f"{name}: {int((~known).sum()):,} rows reference stations not in dim_station")
+
+
+def append_rows(data_dir: str, table: str, df: pd.DataFrame, star: StarSchema) -> str:
+    """Append a batch to a generated fact table, in its own format; returns the path written."""
+    path = find_table(data_dir, table)
+    if path.endswith(".csv"):
+        columns = table_columns(path)
+        with open(path, "rb") as f:
+            newline = False
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                newline = f.read(1) != b"\n"
+        with open(path, "a", encoding="utf-8", newline="") as f:
+            if newline:  # a file written without a trailing newline
+                f.write("\n")
+            df[columns].to_csv(f, header=False, index=False, date_format="%Y-%m-%d %H:%M:%S")
+        return path
+
+    if not os.path.isdir(path):  # single file -> dataset directory, so the batch can be one more part
+        part = os.path.join(data_dir, table, "part-000.parquet")
+        os.makedirs(os.path.dirname(part))
+        os.replace(path, part)
+        path = os.path.dirname(part)
+    parts = sorted(f for f in os.listdir(path) if f.endswith(".parquet"))
+    schema = pq.read_schema(os.path.join(path, parts[0]))
+    arrays = []
+    for field in schema:
+        if field.name == "unit_id":
+            values = star.units.encode(df["unit_serial"])
+        elif pa.types.is_timestamp(field.type) or pa.types.is_date(field.type):
+            values = pd.to_datetime(df[field.name]).to_numpy(dtype="datetime64[ms]")
+        else:
+            values = df[field.name].to_numpy()
+        arrays.append(pa.array(values, from_pandas=True).cast(field.type))
+    n = len(parts)
+    while os.path.exists(os.path.join(path, f"part-{n:03d}.parquet")):
+        n += 1
+    out = os.path.join(path, f"part-{n:03d}.parquet")
+    tmp = os.path.join(path, "." + os.path.basename(out))  # dot files are not part of the dataset
+    pq.write_table(pa.Table.from_arrays(arrays, schema=schema), tmp, compression="zstd")
+    os.replace(tmp, out)
+    return out
+
+
+# -----------------------------
+# Commands
+# -----------------------------
+def ingest(data_dir: str, out_dir: str = OUT_DIR, testruns: str = None, returns: str = None,
+           n_boot: int = N_REPLICATES) -> KpiState:
+    """Append the batch files to the fact tables and fold them into the state; rewrites the KPI outputs."""
+    star = StarSchema.from_tables(data_dir)
+    dims = hierarchy_tables(data_dir)
+    have_state = os.path.exists(os.path.join(data_dir, STATE_FILE))
+    state = KpiState.load(data_dir) if have_state else KpiState.recount(data_dir, star, dims)
+
+    seen = {b["sha256"]: b for b in state.batches}
+    batches, frames = [], {}
+    for table, path in ((TESTRUN_TABLE, testruns), (RETURN_TABLE, returns)):
+        if path is None:
+            continue
+        digest = file_digest(path)
+        if digest in seen:
+            raise ValueError(f"{path} was already ingested on {seen[digest]['ingested_at']} "
+                             f"(as {seen[digest]['file']})")
+        df = read_batch(path)
+        check_keys(star, df, path)
+        frames[table] = df
+        batches.append({"table": table, "file": os.path.abspath(path), "sha256": digest, "rows": len(df),
+                        "ingested_at": dt.datetime.now().isoformat(timespec="seconds")})
+
+    testrun_chunks = [star.view(frames[TESTRUN_TABLE], TESTRUN_SPEC[1])] if TESTRUN_TABLE in frames else []
+    batch = KpiState.count(star, dims, testrun_chunks, [frames[RETURN_TABLE]] if RETURN_TABLE in frames else [])
+    batch.batches = batches
+    for table, df in frames.items():
+        append_rows(data_dir, table, df, star)
+    state = state.merge(batch)
+    state.save(data_dir)
+    write_outputs(kpi_tables(state, star, dims, n_boot), state.cube, out_dir)
+    return state
+
+
+def rebuild(data_dir: str, out_dir: str = OUT_DIR, n_boot: int = N_REPLICATES) -> KpiState:
+    star = StarSchema.from_tables(data_dir)
+    dims = hierarchy_tables(data_dir)
+    state = KpiState.recount(data_dir, star, dims)
+    if os.path.exists(os.path.join(data_dir, STATE_FILE)):
+        state.batches = KpiState.load(data_dir).batches
+    state.save(data_dir)
+    write_outputs(kpi_tables(state, star, dims, n_boot), state.cube, out_dir)
+    return state
+
+
+def check(data_dir: str) -> list:
+    """Counters of the saved state that differ from a full recount (empty when consistent)."""
+    return KpiState.load(data_dir).differences(KpiState.recount(data_dir))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Append fact batches and keep the KPI/RCA counters up to date.")
+    ap.add_argument("command", choices=["ingest", "check", "rebuild"])
+    ap.add_argument("--data-dir", default=DATA_DIR)
+    ap.add_argument("--out", default=OUT_DIR, help="directory for the refreshed KPI artifacts and cube")
+    ap.add_argument("--testruns", help="CSV/Parquet batch of fact_testrun rows (ingest)")
+    ap.add_argument("--returns", help="CSV/Parquet batch of fact_fieldreturn rows (ingest)")
+    ap.add_argument("--bootstrap", type=int, default=N_REPLICATES, help="lift interval replicates (0 = none)")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    if args.command == "check":
+        diffs = check(args.data_dir)
+        if diffs:
+            print(f"❌ {STATE_FILE} differs from a full recount: {', '.join(diffs)}")
+            sys.exit(1)
+        state = KpiState.load(args.data_dir)
+        print(f"✅ {STATE_FILE} matches a full recount of {state.test_runs:,} test runs and "
+              f"{state.field_returns:,} field returns ({time.perf_counter() - t0:.1f}s)")
+    elif args.command == "ingest":
+        if not (args.testruns or args.returns):
+            ap.error("ingest needs --testruns and/or --returns")
+        state = ingest(args.data_dir, args.out, args.testruns, args.returns, args.bootstrap)
+        n_files = sum(p is not None for p in (args.testruns, args.returns))
+        added = ", ".join(f"{b['rows']:,} {b['table']} rows" for b in state.batches[-n_files:])
+        print(f"✅ Ingested {added}; now {state.test_runs:,} test runs and {state.field_returns:,} field returns "
+              f"({time.perf_counter() - t0:.2f}s)")
+    else:
+        state = rebuild(args.data_dir, args.out, args.bootstrap)
+        print(f"✅ Rebuilt {STATE_FILE} from {state.test_runs:,} test runs and {state.field_returns:,} field returns "
+              f"({time.perf_counter() - t0:.1f}s)")
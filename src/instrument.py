@@ -0,0 +1,230 @@
+"""
+Stage-level instrumentation: wall/CPU time, rows, peak memory and optional cProfile per stage.
+
+A Run collects named stages for one job (rca_weibull, the generator, ...). Library code marks
+stages with the module-level stage() context manager. Outside an active run it is a no-op, and
+so is any call on a thread other than the one that entered the run (e.g. export workers).
+Stages nest, and a record's name is its path ("driver_model/fit"). A stage entered repeatedly
+(e.g. once per streamed chunk) accumulates into one record, with its call count.
+
+  run = Run("rca_weibull", out_dir, profile=["driver_model"])
+  with run:
+      with stage("driver_model") as s:
+          ...
+          s.rows = len(df)
+  run.write()   # <out_dir>/metrics/rca_weibull.json (latest) + metrics/history.jsonl (one line per run)
+
+Peak memory is per stage on Linux: the kernel's high-water mark (VmHWM) is reset through
+/proc/self/clear_refs when a stage starts and read back when it ends. Elsewhere the record
+falls back to the process peak so far (peak_rss_scope = "process"). A profiled stage's cProfile
+dump goes to <out_dir>/metrics/<run>.<stage>.prof, and its top functions are embedded in the record.
+"""
+import contextlib
+import cProfile
+import datetime as dt
+import io
+import json
+import os
+import platform
+import pstats
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_DIR = "metrics"
+HISTORY = "history.jsonl"
+PROFILE_TOP = 25
+
+_active = None  # the Run entered on its owner thread
+
+
+# -----------------------------
+# Memory
+# -----------------------------
+def _process_peak_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _can_reset_hwm() -> bool:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _take_hwm_mb() -> float:
+    """VmHWM since the last reset (MB), then reset it."""
+    peak = 0.0
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                peak = int(line.split()[1]) / 1024
+                break
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    return peak
+
+
+# -----------------------------
+# Stages
+# -----------------------------
+class Stage:
+    """One timed stage; set .rows (or call add_rows) inside the block."""
+
+    def __init__(self, path: str, rows=None):
+        self.path = path
+        self.rows = rows
+        self.peak_mb = 0.0
+        self.record = None
+
+    def add_rows(self, n: int):
+        self.rows = (self.rows or 0) + int(n)
+
+
+class _NullStage(Stage):
+    def __init__(self):
+        super().__init__("")
+
+
+class Run:
+    def __init__(self, name: str, out_dir: str, profile=()):
+        self.name = name
+        self.out_dir = out_dir
+        self.profile = set(profile or ())
+        self.records = []
+        self._by_path = {}
+        self.started_at = None
+        self.wall_seconds = None
+        self._stack = []
+        self._thread = None
+        self._profiling = False
+        self._hwm = _can_reset_hwm()
+
+    def __enter__(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError(f"Run {_active.name!r} is already active")
+        _active = self
+        self._thread = threading.get_ident()
+        self.started_at = dt.datetime.now().isoformat(timespec="seconds")
+        self._t0 = time.perf_counter()
+        if self._hwm:
+            _take_hwm_mb()
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        self.wall_seconds = time.perf_counter() - self._t0
+        _active = None
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows=None):
+        parent = self._stack[-1] if self._stack else None
+        current = Stage(f"{parent.path}/{name}" if parent else name, rows)
+        if self._hwm and parent is not None:
+            parent.peak_mb = max(parent.peak_mb, _take_hwm_mb())  # parent's peak before the child resets it
+        elif self._hwm:
+            _take_hwm_mb()
+        profiler = None  # the first call of a profiled stage (cProfile does not nest)
+        if name in self.profile and not self._profiling and current.path not in self._by_path:
+            profiler, self._profiling = cProfile.Profile(), True
+        self._stack.append(current)
+        current.record = self._by_path.get(current.path)
+        if current.record is None:  # listed in first-start order, filled in on exit
+            current.record = {"stage": current.path, "calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                              "rows": None, "peak_rss_mb": None}
+            self._by_path[current.path] = current.record
+            self.records.append(current.record)
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield current
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+            wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+            self._stack.pop()
+            if self._hwm:
+                current.peak_mb = max(current.peak_mb, _take_hwm_mb())
+                if parent is not None:
+                    parent.peak_mb = max(parent.peak_mb, current.peak_mb)
+            peak = current.peak_mb if self._hwm else _process_peak_mb()
+            r = current.record
+            r["calls"] += 1
+            r["wall_seconds"] = round(r["wall_seconds"] + wall, 6)
+            r["cpu_seconds"] = round(r["cpu_seconds"] + cpu, 6)
+            if current.rows is not None:
+                r["rows"] = (r["rows"] or 0) + current.rows
+            r["rows_per_sec"] = round(r["rows"] / r["wall_seconds"], 1) if r["rows"] and r["wall_seconds"] else None
+            if peak is not None:
+                r["peak_rss_mb"] = round(max(peak, r["peak_rss_mb"] or 0.0), 1)
+            r["peak_rss_scope"] = "stage" if self._hwm else "process"
+            if profiler is not None:
+                current.record.update(self._dump_profile(profiler, current.path))
+
+    def _dump_profile(self, profiler, path: str) -> dict:
+        out_dir = os.path.join(self.out_dir, METRICS_DIR)
+        os.makedirs(out_dir, exist_ok=True)
+        prof_path = os.path.join(out_dir, f"{self.name}.{path.replace('/', '.')}.prof")
+        profiler.dump_stats(prof_path)
+        stats = pstats.Stats(profiler, stream=io.StringIO()).sort_stats("cumulative")
+        top = []
+        for func in stats.fcn_list[:PROFILE_TOP]:
+            _, ncalls, tottime, cumtime, _ = stats.stats[func]
+            top.append({"function": pstats.func_std_string(func), "ncalls": ncalls,
+                        "tottime": round(tottime, 6), "cumtime": round(cumtime, 6)})
+        return {"profile": os.path.basename(prof_path), "profile_top": top}
+
+    def summary(self) -> dict:
+        return {
+            "run": self.name,
+            "started_at": self.started_at,
+            "wall_seconds": round(self.wall_seconds, 6) if self.wall_seconds is not None else None,
+            "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+            "stages": self.records,
+        }
+
+    def write(self) -> str:
+        """Write <out_dir>/metrics/<name>.json and append the run to metrics/history.jsonl."""
+        out_dir = os.path.join(self.out_dir, METRICS_DIR)
+        os.makedirs(out_dir, exist_ok=True)
+        summary = self.summary()
+        path = os.path.join(out_dir, f"{self.name}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, default=str)
+        history = {**summary, "stages": [{k: v for k, v in r.items() if k != "profile_top"} for r in self.records]}
+        with open(os.path.join(out_dir, HISTORY), "a", encoding="utf-8") as f:
+            f.write(json.dumps(history, default=str) + "\n")
+        return path
+
+    def table(self) -> str:
+        """Human-readable per-stage summary."""
+        lines = [f"{'stage':<40}{'calls':>7}{'wall s':>9}{'cpu s':>9}{'rows':>13}{'rows/s':>13}{'peak MB':>9}"]
+        for r in self.records:
+            rows = f"{r['rows']:,}" if r["rows"] is not None else "-"
+            rate = f"{r['rows_per_sec']:,.0f}" if r["rows_per_sec"] is not None else "-"
+            peak = f"{r['peak_rss_mb']:,.0f}" if r["peak_rss_mb"] is not None else "-"
+            lines.append(f"{r['stage']:<40}{r['calls']:>7}{r['wall_seconds']:>9.2f}{r['cpu_seconds']:>9.2f}"
+                         f"{rows:>13}{rate:>13}{peak:>9}")
+        return "\n".join(lines)
+
+
+def stage(name: str, rows=None):
+    """Context manager timing `name` inside the active Run; a no-op stage when there is none."""
+    run = _active
+    if run is None or run._thread != threading.get_ident():
+        return contextlib.nullcontext(_NullStage())
+    return run.stage(name, rows)
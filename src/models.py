@@ -0,0 +1,124 @@
+"""
+Model registry and batch scoring for the driver (fail-probability) model.
+
+A fitted model is stored as plain arrays plus its feature spec, so scoring never needs
+scikit-learn (or anything else the training stack imports):
+
+  <models dir>/<name>/v<N>/model.npz   coef, intercept (raw feature units)
+  <models dir>/<name>/v<N>/model.json  feature columns, pinned categories, metrics, provenance
+
+Versions are append-only: save_model() writes the next v<N> next to the existing ones, and
+load_model() takes the latest unless asked for a specific version.
+
+Scoring rebuilds the training FeaturePipeline with the saved categories, so new rows encode into
+the same columns. It then takes one float32 matrix-vector product per block of rows. Blocks are
+sized to stay cache-friendly. A streaming source (fetch_chunks, Parquet batches) is scored chunk
+by chunk in constant memory.
+"""
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.features import CATEGORICAL, FeaturePipeline
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MODELS_DIR = os.getenv("FMA_MODELS_DIR", os.path.join(REPO_DIR, "outputs", "models"))
+BLOCK_ROWS = 65_536
+
+
+class LinearModel:
+    """
+    Logistic model on FeaturePipeline features: P(fail) = sigmoid(X @ coef + intercept).
+    `categories` pins the one-hot columns ({column: values}); `columns` must match the pipeline's.
+    """
+
+    def __init__(self, coef, intercept: float, columns, categories, metadata=None):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.columns = list(columns)
+        self.categories = {col: list(values) for col, values in categories.items()}
+        self.metadata = dict(metadata or {})
+        self.pipeline = FeaturePipeline(categorical={c: CATEGORICAL[c] for c in self.categories},
+                                        categories=self.categories)
+        if self.pipeline.columns != self.columns:
+            raise ValueError("Saved feature columns do not match the feature pipeline")
+        self._coef32 = self.coef.astype(np.float32)
+
+    @classmethod
+    def from_pipeline(cls, pipeline: FeaturePipeline, coef, intercept: float, metadata=None):
+        categories = {col: enc.freeze().categories for col, enc in pipeline.encoders.items()}
+        return cls(coef, intercept, pipeline.columns, categories, metadata)
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        return X @ self._coef32 + np.float32(self.intercept)
+
+    def predict_proba(self, df: pd.DataFrame) -> np.ndarray:
+        """Fail probability per row (float32), scored in blocks of BLOCK_ROWS."""
+        out = np.empty(len(df), dtype=np.float32)
+        for start in range(0, len(df), BLOCK_ROWS):
+            block = df.iloc[start:start + BLOCK_ROWS]
+            z = self.decision_function(self.pipeline.transform(block))
+            # sigmoid in place: 1 / (1 + exp(-z))
+            np.negative(z, out=z)
+            np.exp(z, out=z)
+            z += 1
+            np.reciprocal(z, out=out[start:start + len(block)])
+        return out
+
+
+def score_chunks(model: LinearModel, chunks):
+    """Yield (chunk, fail probability) for each DataFrame of an iterable (e.g. backends.fetch_chunks)."""
+    for chunk in chunks:
+        yield chunk, model.predict_proba(chunk)
+
+
+# -----------------------------
+# Registry
+# -----------------------------
+def _versions(name: str, root: str):
+    path = os.path.join(root, name)
+    if not os.path.isdir(path):
+        return []
+    return sorted(int(d[1:]) for d in os.listdir(path) if d.startswith("v") and d[1:].isdigit())
+
+
+def save_model(model: LinearModel, name: str, root: str = None) -> int:
+    """Persist `model` as the next version of `name`; returns the version number."""
+    root = root or MODELS_DIR
+    version = (_versions(name, root) or [0])[-1] + 1
+    path = os.path.join(root, name, f"v{version}")
+    tmp_path = path + ".tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+
+    np.savez(os.path.join(tmp_path, "model.npz"), coef=model.coef, intercept=np.array(model.intercept))
+    spec = {
+        "name": name,
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "kind": "logistic",
+        "columns": model.columns,
+        "categories": model.categories,
+        "metadata": model.metadata,
+    }
+    with open(os.path.join(tmp_path, "model.json"), "w", encoding="utf-8") as f:
+        json.dump(spec, f, indent=2, default=str)
+    os.replace(tmp_path, path)  # a version directory is either complete or absent
+    return version
+
+
+def load_model(name: str, version: int = None, root: str = None) -> LinearModel:
+    """Latest (or the given) version of `name`."""
+    root = root or MODELS_DIR
+    versions = _versions(name, root)
+    if not versions:
+        raise FileNotFoundError(f"No saved versions of model {name!r} under {root}")
+    version = versions[-1] if version is None else version
+    path = os.path.join(root, name, f"v{version}")
+    with open(os.path.join(path, "model.json"), "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    arrays = np.load(os.path.join(path, "model.npz"))
+    metadata = dict(spec["metadata"], name=spec["name"], version=spec["version"], created_at=spec["created_at"])
+    return LinearModel(arrays["coef"], float(arrays["intercept"]), spec["columns"], spec["categories"], metadata)
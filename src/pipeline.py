@@ -0,0 +1,579 @@
+"""
+Incremental pipeline runner: generate -> load -> (weibull | driver_model | rca | export | cube).
+
+Each stage has a key: a SHA-256 over everything that can change its outputs. That covers its
+config knobs, the source it runs, and the SQL text of its queries. For the Python analytics this
+means only the functions and SQL entries a stage actually uses in rca_weibull.py. For the export,
+each query under sql/ gets its own key. The key also covers the output digest of each upstream
+stage: the content of the generated files for `generate`, the key of everything else. A stage
+runs when its key differs from the one recorded in <data dir>/pipeline_state.json, or when an
+output it wrote is missing or was changed since. So:
+
+  - a tweak to one KPI query re-exports that query only;
+  - a change to the driver model code reruns the driver model only;
+  - regenerating identical data (same seed and knobs) reloads nothing, because load keys on the
+    files' content rather than on the generator having run;
+  - dashboard changes rerun nothing (the dashboard only reads outputs/).
+
+Input files are hashed in 1MB blocks, and the digests are cached in the state file by
+(size, mtime_ns), so unchanged multi-GB facts are not re-read. `generate` accepts data that is
+already in the data directory when it has no record for it (pass `--force generate` to
+regenerate). Stages whose dependencies are done run concurrently (--jobs), each in its own
+process. That keeps matplotlib and the bootstrap pools isolated. The output goes to
+<data dir>/pipeline_logs/<stage>.log.
+
+  FMA_BACKEND=duckdb python -m src.pipeline                     # run what changed
+  FMA_BACKEND=duckdb python -m src.pipeline --dry-run           # show what would run, and why
+  FMA_BACKEND=duckdb python -m src.pipeline --stages rca --force rca
+  python -m src.pipeline --testruns 10000000 --engine numpy --format parquet --jobs 4
+
+With FMA_BACKEND=mssql, `load` runs sql/schema.sql and the v3 staging/data scripts through
+sqlcmd (FMA_SQLCMD, SQL_HOST/SQL_PORT/SQL_USER/SQL_PASSWORD). BULK INSERT reads the CSVs from
+the server's import mount, so the data directory has to be that mount.
+"""
+import argparse
+import ast
+import datetime as dt
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src import backends
+
+REPO_DIR = backends.REPO_DIR
+STATE_FILE = "pipeline_state.json"
+LOG_DIR = "pipeline_logs"
+JOBS = int(os.getenv("FMA_PIPELINE_JOBS", str(os.cpu_count() or 1)))
+HASH_BLOCK = 1 << 20
+
+SQLCMD = os.getenv("FMA_SQLCMD", "sqlcmd")
+MSSQL_LOAD_SCRIPTS = ["schema.sql", "load_v3_staging.sql", "load_v3_data.sql"]
+
+GENERATOR = os.path.join(REPO_DIR, "data_gen", "generate_data.py")
+RCA_WEIBULL = os.path.join(REPO_DIR, "analytics", "rca_weibull.py")
+EXPORTER = os.path.join(REPO_DIR, "analytics", "export_dashboard.py")
+
+
+def _src(*names):
+    return [os.path.join(REPO_DIR, "src", name) for name in names]
+
+
+# -----------------------------
+# Content hashing
+# -----------------------------
+class FileHasher:
+    """SHA-256 of files and directories, cached by (size, mtime_ns) across runs."""
+
+    def __init__(self, cache: dict = None):
+        self.cache = cache if cache is not None else {}
+        self._lock = threading.Lock()
+
+    def file(self, path: str) -> str:
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            hit = self.cache.get(path)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            return hit[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        with self._lock:
+            self.cache[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def path(self, path: str) -> str:
+        """A file's digest, or a directory's over its files' relative paths and digests."""
+        if not os.path.isdir(path):
+            return self.file(path)
+        h = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                h.update(f"{os.path.relpath(full, path)}\0{self.file(full)}\n".encode())
+        return h.hexdigest()
+
+
+def definitions(path: str, names) -> dict:
+    """
+    Source of the named top-level functions, classes and assignments in a Python file, without
+    importing it. Entries of a top-level dict literal are addressable as NAME['key'] (the queries
+    in rca_weibull.SQL), so a stage keys on just the queries it runs.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+    found = {}
+    for node in ast.parse(source).body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            found[node.name] = ast.get_source_segment(source, node)
+        elif isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+            found[name] = ast.get_source_segment(source, node)
+            if isinstance(node.value, ast.Dict):
+                for k, v in zip(node.value.keys, node.value.values):
+                    if isinstance(k, ast.Constant) and isinstance(k.value, str):
+                        found[f"{name}[{k.value!r}]"] = ast.get_source_segment(source, v)
+    missing = [n for n in names if n not in found]
+    if missing:
+        raise ValueError(f"{os.path.relpath(path, REPO_DIR)} has no top-level {', '.join(missing)}")
+    return {n: found[n] for n in names}
+
+
+def _digest(material) -> str:
+    return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# -----------------------------
+# Stages
+# -----------------------------
+class Stage:
+    """
+    One node of the DAG. `inputs(cfg)` returns what the key covers: {"knobs": {...}, "files":
+    [paths], "code": {path: [definition names]}}. A stage with `parts(cfg)`
+    ({part: text}) keys each part separately and is handed only its stale parts to run.
+    `outputs(cfg, parts)` lists the local files it writes (checked for presence/changes).
+    """
+
+    def __init__(self, name, deps, run, inputs, outputs, parts=None, output_digest=None, adopt=False):
+        self.name = name
+        self.deps = deps
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.parts = parts
+        self.output_digest = output_digest
+        self.adopt = adopt
+
+    def keys(self, cfg, hasher: FileHasher, dep_digests: dict) -> dict:
+        """{part: key} ({"": key} for a stage without parts)."""
+        spec = self.inputs(cfg)
+        code = {}
+        for path, names in spec.get("code", {}).items():
+            code[os.path.relpath(path, REPO_DIR)] = definitions(path, names)
+        base = {
+            "stage": self.name,
+            "knobs": spec.get("knobs", {}),
+            "files": {os.path.relpath(p, REPO_DIR): hasher.path(p) for p in spec.get("files", [])},
+            "code": code,
+            "deps": dep_digests,
+        }
+        if self.parts is None:
+            return {"": _digest(base)}
+        return {part: _digest({**base, "part": part, "part_text": text}) for part, text in self.parts(cfg).items()}
+
+
+def _table_paths(base_dir: str, names):
+    return [p for name in names for p in backends.table_candidates(base_dir, name) if os.path.exists(p)]
+
+
+def _output(cfg, name: str) -> str:
+    ext = ".parquet" if cfg["output_format"] == "parquet" else ".csv"
+    return os.path.join(cfg["out_dir"], name + ext)
+
+
+def _env(cfg) -> dict:
+    # the load stage owns the DuckDB build: children never rebuild it from file mtimes
+    return {**os.environ, "FMA_BACKEND": cfg["backend"], "FMA_DATA_DIR": cfg["data_dir"],
+            "FMA_OUTPUT_FORMAT": cfg["output_format"], "FMA_DUCKDB_AUTOBUILD": "0"}
+
+
+# ---- generate ----
+def _generate_inputs(cfg):
+    return {"files": [GENERATOR],
+            "knobs": {k: cfg[k] for k in ("engine", "format", "testruns", "telemetry", "shards", "data_dir")}}
+
+
+def _generate_outputs(cfg, parts=None):
+    return _table_paths(cfg["data_dir"], [name for name, _ in backends.TABLES.values()])
+
+
+def _generate_digest(cfg, hasher, key):
+    """Content of the generated tables: identical regenerated data leaves everything downstream alone."""
+    return _digest({os.path.basename(p): hasher.path(p) for p in sorted(_generate_outputs(cfg))})
+
+
+def run_generate(cfg, parts=None):
+    cmd = [sys.executable, GENERATOR, "--out-dir", cfg["data_dir"]]
+    for knob in ("engine", "format", "testruns", "telemetry", "shards"):
+        if cfg[knob] is not None:
+            cmd += [f"--{knob}", str(cfg[knob])]
+    subprocess.run(cmd, check=True)
+
+
+# ---- load ----
+def _load_inputs(cfg):
+    spec = {"knobs": {"backend": cfg["backend"]}, "files": [os.path.join(REPO_DIR, "src", "backends.py")]}
+    if cfg["backend"] == "mssql":
+        spec["files"] += [os.path.join(backends.SQL_DIR, s) for s in MSSQL_LOAD_SCRIPTS]
+    else:
+        spec["knobs"]["db_path"] = backends.duckdb_path(cfg["data_dir"])
+    return spec
+
+
+def _load_outputs(cfg, parts=None):
+    return [] if cfg["backend"] == "mssql" else [backends.duckdb_path(cfg["data_dir"])]
+
+
+def run_load(cfg, parts=None):
+    if cfg["backend"] == "duckdb":
+        backends.build_duckdb(cfg["data_dir"])
+        return
+    server = f"{os.getenv('SQL_HOST', 'host.docker.internal')},{os.getenv('SQL_PORT', '1433')}"
+    for script in MSSQL_LOAD_SCRIPTS:
+        subprocess.run([SQLCMD, "-S", server, "-U", os.getenv("SQL_USER", "sa"),
+                        "-P", os.getenv("SQL_PASSWORD", "Str0ng!Passw0rd123"), "-b",
+                        "-i", os.path.join(backends.SQL_DIR, script)], check=True)
+
+
+# ---- analytics (rca_weibull.py) ----
+def _rca_weibull():
+    sys.path.insert(0, os.path.join(REPO_DIR, "analytics"))
+    import rca_weibull
+    return rca_weibull
+
+
+def _analytics_knobs(cfg, *names):
+    return {"output_format": cfg["output_format"], "out_dir": cfg["out_dir"], **{n: cfg[n] for n in names}}
+
+
+def _weibull_inputs(cfg):
+    return {"knobs": _analytics_knobs(cfg, "bootstrap"),
+            "files": _src("weibull.py", "bootstrap.py", "unit_dict.py", "storage.py", "backends.py"),
+            "code": {RCA_WEIBULL: ["SQL['returns_ttf']", "SQL['unit_survival']", "save_output", "with_unit_id",
+                                   "weibull_time_to_failure", "weibull_analysis", "weibull_fits"]}}
+
+
+def _weibull_outputs(cfg, parts=None):
+    return [_output(cfg, n) for n in ("weibull_summary", "returns_ttf", "weibull_reliability")] + [
+        os.path.join(cfg["out_dir"], "weibull_cdf.png")]
+
+
+def run_weibull(cfg, parts=None):
+    from src.unit_dict import UnitDictionary
+
+    rw = _rca_weibull()
+    conn = rw.connect()
+    rw.weibull_analysis(conn, UnitDictionary.from_db(conn), cfg["out_dir"], cfg["bootstrap"])
+
+
+def _driver_inputs(cfg):
+    return {"knobs": _analytics_knobs(cfg, "stream", "chunk_rows"),
+            "files": _src("features.py", "models.py", "storage.py", "backends.py"),
+            "code": {RCA_WEIBULL: ["SQL['model_base']", "HOLDOUT_EVERY", "STREAM_EPOCHS", "MODEL_NAME", "save_output",
+                                   "driver_model", "write_driver_report", "ScoreHistogram", "_holdout_mask",
+                                   "driver_model_streaming", "driver_analysis"]}}
+
+
+def _driver_outputs(cfg, parts=None):
+    return [_output(cfg, "logreg_feature_coeffs")] + [
+        os.path.join(cfg["out_dir"], f) for f in ("logreg_feature_coeffs.png", "model_report.txt")]
+
+
+def run_driver_model(cfg, parts=None):
+    rw = _rca_weibull()
+    rw.driver_analysis(rw.connect(), cfg["out_dir"], cfg["stream"], cfg["chunk_rows"])
+
+
+def _rca_inputs(cfg):
+    return {"knobs": _analytics_knobs(cfg, "bootstrap", "chunk_rows"),
+            "files": _src("rca_ranker.py", "bootstrap.py", "storage.py", "backends.py"),
+            "code": {RCA_WEIBULL: ["SQL['rca_base']", "save_output", "rca_analysis"]}}
+
+
+def _rca_outputs(cfg, parts=None):
+    return [_output(cfg, n) for n in ("rca_scorecard", "rca_by_failure_mode")]
+
+
+def run_rca(cfg, parts=None):
+    rw = _rca_weibull()
+    rw.rca_analysis(rw.connect(), cfg["out_dir"], cfg["chunk_rows"], cfg["bootstrap"])
+
+
+# ---- dashboard export (one key per query) ----
+def _export_inputs(cfg):
+    return {"knobs": {"out_dir": cfg["out_dir"]}, "files": [EXPORTER] + _src("storage.py")}
+
+
+def _export_parts(cfg):
+    return {name: backends.script_query(name) for name in backends.SCRIPT_QUERIES}
+
+
+def _export_outputs(cfg, parts=None):
+    return [os.path.join(cfg["out_dir"], name + ".parquet") for name in (parts or backends.SCRIPT_QUERIES)]
+
+
+def run_export(cfg, parts=None):
+    sys.path.insert(0, os.path.join(REPO_DIR, "analytics"))
+    import export_dashboard
+
+    export_dashboard.export_all(cfg["out_dir"], names=parts, backend=cfg["backend"])
+
+
+# ---- test-run cube (src/cube.py) for the dashboard's slicers ----
+def _cube_inputs(cfg):
+    return {"knobs": {"out_dir": cfg["out_dir"]}, "files": _src("cube.py", "star_join.py", "backends.py")}
+
+
+def _cube_outputs(cfg, parts=None):
+    from src.cube import CUBE_FILE
+
+    return [os.path.join(cfg["out_dir"], CUBE_FILE)]
+
+
+def run_cube(cfg, parts=None):
+    from src.cube import TestRunCube
+
+    TestRunCube.from_db(backends.connect(cfg["backend"])).save(_cube_outputs(cfg)[0])
+
+
+STAGES = [
+    Stage("generate", [], run_generate, _generate_inputs, _generate_outputs, output_digest=_generate_digest,
+          adopt=True),
+    Stage("load", ["generate"], run_load, _load_inputs, _load_outputs),
+    Stage("weibull", ["load"], run_weibull, _weibull_inputs, _weibull_outputs),
+    Stage("driver_model", ["load"], run_driver_model, _driver_inputs, _driver_outputs),
+    Stage("rca", ["load"], run_rca, _rca_inputs, _rca_outputs),
+    Stage("export", ["load"], run_export, _export_inputs, _export_outputs, parts=_export_parts),
+    Stage("cube", ["load"], run_cube, _cube_inputs, _cube_outputs),
+]
+BY_NAME = {s.name: s for s in STAGES}
+
+
+# -----------------------------
+# State
+# -----------------------------
+def _signature(paths):
+    """{path: [size, mtime_ns]} of the files a stage wrote (directories: their newest file)."""
+    out = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        if os.path.isdir(path):
+            stats = [os.stat(os.path.join(r, f)) for r, _, fs in os.walk(path) for f in fs]
+            out[path] = [sum(s.st_size for s in stats), max((s.st_mtime_ns for s in stats), default=0)]
+        else:
+            st = os.stat(path)
+            out[path] = [st.st_size, st.st_mtime_ns]
+    return out
+
+
+def load_state(data_dir: str) -> dict:
+    path = os.path.join(data_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {"stages": {}, "files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(data_dir: str, state: dict):
+    path = os.path.join(data_dir, STATE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def stale_parts(stage: Stage, cfg, keys: dict, record: dict, forced: bool):
+    """(parts to run, reason) - an empty list when the stage is up to date."""
+    if forced:
+        return list(keys), "forced"
+    record = record or {}
+    outputs = record.get("outputs", {})
+    current = _signature(outputs)
+    if stage.adopt:
+        if not _signature(stage.outputs(cfg)):
+            return list(keys), "no outputs"
+        if not record or record.get("keys", {}) == keys:
+            return [], "adopted" if not record else "up to date"
+        return list(keys), "inputs changed"
+    stale, reasons = [], set()
+    for part, key in keys.items():
+        expected = stage.outputs(cfg, [part] if part else None)
+        if record.get("keys", {}).get(part) != key:
+            stale.append(part)
+            reasons.add("inputs changed" if part in record.get("keys", {}) else "never run")
+        elif any(p not in current or current[p] != outputs[p] for p in expected):
+            stale.append(part)
+            reasons.add("outputs missing or modified")
+    return stale, ", ".join(sorted(reasons)) or "up to date"
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+class Pipeline:
+    def __init__(self, cfg: dict, targets=None, force=(), jobs: int = JOBS):
+        self.cfg = cfg
+        self.force = set(force)
+        self.jobs = max(1, jobs)
+        self.selected = self._closure(targets or [s.name for s in STAGES])
+        self.state = load_state(cfg["data_dir"])
+        self.hasher = FileHasher(self.state.setdefault("files", {}))
+        self._lock = threading.Lock()
+
+    def _closure(self, targets):
+        """The targets plus everything they depend on, in STAGES (topological) order."""
+        unknown = [t for t in targets if t not in BY_NAME]
+        if unknown:
+            raise ValueError(f"Unknown stage(s) {unknown}; expected some of {list(BY_NAME)}")
+        wanted, todo = set(), list(targets)
+        while todo:
+            name = todo.pop()
+            if name not in wanted:
+                wanted.add(name)
+                todo += BY_NAME[name].deps
+        return [s for s in STAGES if s.name in wanted]
+
+    def _plan(self, stage: Stage, digests: dict):
+        keys = stage.keys(self.cfg, self.hasher, {d: digests[d] for d in stage.deps})
+        record = self.state["stages"].get(stage.name)
+        parts, reason = stale_parts(stage, self.cfg, keys, record, stage.name in self.force)
+        return keys, parts, reason
+
+    def _digest(self, stage: Stage, keys: dict) -> str:
+        if stage.output_digest is not None:
+            return stage.output_digest(self.cfg, self.hasher, keys)
+        return _digest(keys)
+
+    def _record(self, stage: Stage, keys: dict, seconds=None):
+        with self._lock:
+            self.state["stages"][stage.name] = {
+                "keys": keys,
+                "outputs": _signature(stage.outputs(self.cfg)),
+                "finished_at": dt.datetime.now().isoformat(timespec="seconds"),
+                "seconds": round(seconds, 3) if seconds is not None else None,
+            }
+            save_state(self.cfg["data_dir"], self.state)
+
+    def _execute(self, stage: Stage, parts) -> float:
+        """Run one stage in a child process (`--run-stage`); its output goes to the stage log."""
+        log_dir = os.path.join(self.cfg["data_dir"], LOG_DIR)
+        os.makedirs(log_dir, exist_ok=True)
+        cmd = [sys.executable, "-m", "src.pipeline", "--run-stage", stage.name, "--config", json.dumps(self.cfg)]
+        if stage.parts is not None:
+            cmd += ["--parts", *parts]
+        t0 = time.perf_counter()
+        with open(os.path.join(log_dir, stage.name + ".log"), "w", encoding="utf-8") as log:
+            subprocess.run(cmd, cwd=REPO_DIR, env=_env(self.cfg), stdout=log, stderr=subprocess.STDOUT, check=True)
+        return time.perf_counter() - t0
+
+    def dry_run(self):
+        """Print the plan. Stages behind one that would run are shown as waiting on it."""
+        digests, waiting = {}, {}
+        for stage in self.selected:
+            blockers = sorted({b for d in stage.deps for b in waiting.get(d, [d] if d not in digests else [])})
+            if blockers:
+                waiting[stage.name] = blockers
+                print(f"   {stage.name:<14} after {', '.join(blockers)} (key depends on its outputs)")
+                continue
+            keys, parts, reason = self._plan(stage, digests)
+            if parts:
+                waiting[stage.name] = [stage.name]
+                what = f" ({len(parts)}/{len(keys)} parts: {', '.join(parts)})" if stage.parts is not None else ""
+                print(f"   {stage.name:<14} would run: {reason}{what}")
+            else:
+                digests[stage.name] = self._digest(stage, keys)
+                print(f"   {stage.name:<14} {reason}")
+
+    def run(self) -> bool:
+        """Run every stale stage, dependencies first and independent ones concurrently."""
+        t0 = time.perf_counter()
+        digests, failed, pending, running = {}, set(), list(self.selected), {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while pending or running:
+                for stage in list(pending):
+                    if any(d in failed for d in stage.deps):
+                        pending.remove(stage)
+                        failed.add(stage.name)
+                        print(f"   {stage.name:<14} skipped (dependency failed)")
+                    elif all(d in digests for d in stage.deps):
+                        pending.remove(stage)
+                        keys, parts, reason = self._plan(stage, digests)
+                        if not parts:
+                            if reason == "adopted":
+                                self._record(stage, keys)
+                            digests[stage.name] = self._digest(stage, keys)
+                            print(f"   {stage.name:<14} {reason}")
+                            continue
+                        what = f" {len(parts)}/{len(keys)} parts" if stage.parts is not None else ""
+                        print(f"   {stage.name:<14} running ({reason}){what}")
+                        running[pool.submit(self._execute, stage, parts)] = (stage, keys)
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, keys = running.pop(future)
+                    try:
+                        seconds = future.result()
+                    except subprocess.CalledProcessError:
+                        failed.add(stage.name)
+                        log = os.path.join(self.cfg["data_dir"], LOG_DIR, stage.name + ".log")
+                        print(f"❌ {stage.name} failed; see {log}")
+                        continue
+                    self._record(stage, keys, seconds)
+                    digests[stage.name] = self._digest(stage, keys)
+                    print(f"   {stage.name:<14} done in {seconds:.1f}s")
+        files = self.state["files"]
+        for path in [p for p in files if not os.path.exists(p)]:
+            del files[path]
+        save_state(self.cfg["data_dir"], self.state)  # file digests hashed for skipped stages, too
+        status = "✅ Pipeline done" if not failed else f"❌ Pipeline failed ({', '.join(sorted(failed))})"
+        print(f"{status} in {time.perf_counter() - t0:.1f}s")
+        return not failed
+
+
+def config(args) -> dict:
+    return {
+        "data_dir": os.path.abspath(args.data_dir),
+        "out_dir": os.path.abspath(args.out_dir),
+        "backend": backends.BACKEND,
+        "output_format": os.getenv("FMA_OUTPUT_FORMAT", "csv"),
+        "engine": args.engine, "format": args.format, "testruns": args.testruns,
+        "telemetry": args.telemetry, "shards": args.shards,
+        "bootstrap": args.bootstrap, "stream": args.stream, "chunk_rows": args.chunk_rows,
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Run the FMA pipeline, skipping stages whose inputs are unchanged.")
+    ap.add_argument("--data-dir", default=backends.DATA_DIR)
+    ap.add_argument("--out-dir", default=os.path.join(REPO_DIR, "outputs"))
+    ap.add_argument("--stages", nargs="+", choices=list(BY_NAME), help="run these (and what they depend on)")
+    ap.add_argument("--force", nargs="+", choices=list(BY_NAME), default=[], help="rerun even if up to date")
+    ap.add_argument("--jobs", type=int, default=JOBS, help="stages run concurrently")
+    ap.add_argument("--dry-run", action="store_true", help="print what would run, and why")
+    gen = ap.add_argument_group("generator (default: generate_data.py's own)")
+    gen.add_argument("--engine", choices=["python", "numpy"])
+    gen.add_argument("--format", choices=["csv", "parquet"])
+    gen.add_argument("--testruns", type=int)
+    gen.add_argument("--telemetry", type=int)
+    gen.add_argument("--shards", type=int)
+    ana = ap.add_argument_group("analytics")
+    ana.add_argument("--bootstrap", type=int, default=1000, help="bootstrap replicates (0 = point estimates)")
+    ana.add_argument("--stream", action="store_true", help="streamed driver model on the full Fact_TestRun")
+    ana.add_argument("--chunk-rows", type=int, default=500_000)
+    ap.add_argument("--run-stage", choices=list(BY_NAME), help=argparse.SUPPRESS)
+    ap.add_argument("--config", help=argparse.SUPPRESS)
+    ap.add_argument("--parts", nargs="*", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.run_stage:  # child process of Pipeline._execute
+        BY_NAME[args.run_stage].run(json.loads(args.config), args.parts)
+        sys.exit(0)
+
+    cfg = config(args)
+    os.makedirs(cfg["data_dir"], exist_ok=True)
+    os.makedirs(cfg["out_dir"], exist_ok=True)
+    pipeline = Pipeline(cfg, args.stages, args.force, args.jobs)
+    print(f"Pipeline over {cfg['data_dir']} ({cfg['backend']}, outputs in {cfg['out_dir']}):")
+    if args.dry_run:
+        pipeline.dry_run()
+    else:
+        sys.exit(0 if pipeline.run() else 1)
@@ -0,0 +1,135 @@
+"""
+Driver lift ranking in one pass over the joined test runs.
+
+Every row is reduced to two small integers: a driver bit pattern (bit d set when driver d is
+present) and a failure code index. One bincount over pattern x code gives a (patterns, codes)
+histogram, which expands into the driver x present/absent x failure_code contingency tensor.
+Both the global scorecard (rca_weibull's old rca_scorecard query) and the per-mode table
+(sql/rca_by_failure_mode.sql) are read off that tensor, so the base is scanned once instead of
+once per query (and five times over in the per-mode UNION ALL).
+"""
+import numpy as np
+import pandas as pd
+
+# bit order of driver_pattern(); thresholds match sql/rca_queries.sql
+DRIVERS = ["HIGH_TEMP", "HIGH_RIPPLE", "DRIFT_STATION", "OPTIC_VENDOR_OPTICORE"]
+TEMP_HIGH_C = 75
+RIPPLE_HIGH_MV = 35
+DRIFT_CALIBRATION_BEFORE = np.datetime64("2024-02-01")
+FLAGGED_VENDOR = "OptiCore"
+
+FAILURE_MODES = ["THERMAL_DRIFT", "VOLTAGE_RIPPLE", "OPTICS_DEGRADATION", "STATION_FALSE_FAIL", "FW_REGRESSION"]
+MIN_PRESENT = 500  # per-mode rows need this many driver-present runs (as in the SQL version)
+
+
+def expand_counts(hist: np.ndarray, n_drivers: int) -> np.ndarray:
+    """[..., pattern, code] histogram -> [..., driver, present (0/1), code] counts (batch dims allowed)."""
+    present = (np.arange(hist.shape[-2]) >> np.arange(n_drivers)[:, None]) & 1  # [driver, pattern]
+    on = np.einsum("dp,...pc->...dc", present, hist)
+    off = hist.sum(axis=-2)[..., None, :] - on
+    return np.stack([off, on], axis=-2)
+
+
+def driver_pattern(df: pd.DataFrame) -> np.ndarray:
+    """Per-row bit pattern of present drivers, bit d <-> DRIVERS[d]. NULL inputs count as absent."""
+    calibration = df["calibration_date"]
+    if not pd.api.types.is_datetime64_dtype(calibration):
+        calibration = pd.to_datetime(calibration)  # DB-API drivers hand back datetime.date objects
+    flags = (
+        df["temp_c"].to_numpy(dtype=np.float64, na_value=np.nan) >= TEMP_HIGH_C,
+        df["ripple_mv"].to_numpy(dtype=np.float64, na_value=np.nan) >= RIPPLE_HIGH_MV,
+        calibration.to_numpy() < DRIFT_CALIBRATION_BEFORE,  # any datetime64 unit; NaT compares False
+        (df["optic_vendor"] == FLAGGED_VENDOR).to_numpy(dtype=bool, na_value=False),
+    )
+    pattern = np.zeros(len(df), dtype=np.intp)
+    for bit, flag in enumerate(flags):
+        pattern |= flag.astype(np.intp) << bit
+    return pattern
+
+
+def failure_index(df: pd.DataFrame, modes=FAILURE_MODES) -> np.ndarray:
+    """0 = pass, 1..M = modes[i - 1], M + 1 = failed with any other code (e.g. UNKNOWN)."""
+    failure_code = df["failure_code"]
+    if not isinstance(failure_code.dtype, pd.CategoricalDtype):
+        failure_code = failure_code.astype("category")  # one hash pass; Parquet dictionary columns skip it
+    # category -> mode index, with a trailing 0 for the -1 (NULL) code
+    lut = np.array([modes.index(c) + 1 if c in modes else 0 for c in failure_code.cat.categories] + [0],
+                   dtype=np.intp)
+    code = lut[failure_code.cat.codes.to_numpy()]
+    other = (code == 0) & (df["pass_fail"].to_numpy() == 0)
+    code[other] = len(modes) + 1
+    return code
+
+
+class DriverLiftCounter:
+    """
+    Running driver x present x failure-code counts. Feed it chunks with update(), combine
+    partial counters (one per shard/worker) with merge(), then read the tables off it.
+    """
+
+    def __init__(self, drivers=DRIVERS, modes=FAILURE_MODES):
+        self.drivers = list(drivers)
+        self.modes = list(modes)
+        self.n_codes = len(self.modes) + 2
+        self.hist = np.zeros((1 << len(self.drivers), self.n_codes), dtype=np.int64)
+
+    def update(self, df: pd.DataFrame):
+        self.add(driver_pattern(df), failure_index(df, self.modes))
+        return self
+
+    def add(self, pattern: np.ndarray, code: np.ndarray):
+        key = pattern * self.n_codes + code
+        self.hist += np.bincount(key, minlength=self.hist.size).reshape(self.hist.shape)
+        return self
+
+    def merge(self, other: "DriverLiftCounter"):
+        self.hist += other.hist
+        return self
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.hist.sum())
+
+    def counts(self) -> np.ndarray:
+        """Contingency tensor [driver, present (0/1), code]."""
+        return expand_counts(self.hist, len(self.drivers))
+
+    def scorecard(self) -> pd.DataFrame:
+        """Any-failure lift per driver: driver, fail_present, fail_absent, lift_ratio."""
+        counts = self.counts()
+        n = counts.sum(axis=2)
+        fails = counts[:, :, 1:].sum(axis=2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rate = fails / n
+            lift = rate[:, 1] / rate[:, 0]
+        out = pd.DataFrame({
+            "driver": self.drivers,
+            "fail_present": rate[:, 1],
+            "fail_absent": rate[:, 0],
+            "lift_ratio": lift,
+        })
+        return out.sort_values("lift_ratio", ascending=False, ignore_index=True)
+
+    def by_failure_mode(self, min_present: int = MIN_PRESENT) -> pd.DataFrame:
+        """Per-mode lift (target = this failure code vs. pass or any other failure)."""
+        counts = self.counts()
+        n = counts.sum(axis=2)  # [driver, present]
+        rows = []
+        for m, mode in enumerate(self.modes, start=1):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rate = counts[:, :, m] / n
+                lift = rate[:, 1] / rate[:, 0]
+            for d, driver in enumerate(self.drivers):
+                rows.append((mode, driver, n[d, 1], rate[d, 1], n[d, 0], rate[d, 0], lift[d]))
+        out = pd.DataFrame(rows, columns=["failure_code", "driver", "n_present", "fail_rate_present",
+                                          "n_absent", "fail_rate_absent", "lift_ratio"])
+        out = out[out["n_present"] >= min_present]
+        return out.sort_values(["failure_code", "lift_ratio"], ascending=[True, False], ignore_index=True)
+
+
+def rank_drivers(chunks, drivers=DRIVERS, modes=FAILURE_MODES):
+    """Count an iterable of base frames; returns (scorecard, by_failure_mode)."""
+    counter = DriverLiftCounter(drivers, modes)
+    for chunk in chunks:
+        counter.update(chunk)
+    return counter.scorecard(), counter.by_failure_mode()
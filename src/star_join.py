@@ -0,0 +1,178 @@
+"""
+In-process star join: fact rows get their dimension attributes by array gathers.
+
+model_base, rca_base and the per-mode RCA queries all join Fact_TestRun to Dim_Unit,
+Dim_Station, Dim_SupplierLot and Dim_LineCard. Dimension keys are dense (1..N identities, and
+unit_id from src/unit_dict.py), so each dimension column is loaded once into an array indexed
+by id. Slot 0 and any id without a row hold NULL. Attributes two hops away (a unit's fw_version
+via linecard_id, its optic_vendor via supplier_lot_id) are pre-composed into arrays indexed by
+unit_id. Resolving an attribute for a chunk of fact rows is then one take on the fact's key
+column: no hash table and no database round-trip. String attributes come back as categoricals,
+dates as datetime64.
+
+  star = StarSchema.from_tables("data")
+  view = star.view(fact_df, ["calibration_date", "optic_vendor", "fw_version", "build_date"])
+  for chunk in star.scan("data", "fact_testrun", RCA_BASE, chunk_rows=1_000_000): ...
+
+  python -m src.star_join --data-dir data       # RCA scorecard off a star-joined scan
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.backends import TABLES, fetch_df
+from src.storage import find_table, iter_table, load_table, table_columns
+from src.unit_dict import UnitDictionary
+
+# dimension table -> fact key it is reached through (line card and lot attributes via the unit)
+DIMENSIONS = {
+    "Dim_Unit": "unit_id",
+    "Dim_LineCard": "unit_id",
+    "Dim_SupplierLot": "unit_id",
+    "Dim_Station": "station_id",
+}
+DATE_SUFFIXES = ("_date", "_utc")
+
+# fact columns + attributes behind rca_weibull.SQL["rca_base"] / ["model_base"]
+RCA_BASE = (["pass_fail", "failure_code", "temp_c", "ripple_mv"], ["calibration_date", "optic_vendor"])
+MODEL_BASE = (["pass_fail", "temp_c", "ripple_mv", "ber", "q_factor", "eye_height_mv", "rx_power_dbm", "test_type"],
+              ["calibration_date", "optic_vendor", "fw_version"])
+
+
+class DimColumn:
+    """One dimension attribute as an array indexed by id (category codes for strings)."""
+
+    def __init__(self, values: np.ndarray, categories=None):
+        self.values = values
+        self.categories = categories
+
+    @classmethod
+    def scatter(cls, values: pd.Series, ids: np.ndarray, size: int) -> "DimColumn":
+        if values.name.endswith(DATE_SUFFIXES):
+            out = np.full(size, np.datetime64("NaT"), dtype="datetime64[ns]")
+            out[ids] = pd.to_datetime(values).to_numpy(dtype="datetime64[ns]")
+            return cls(out)
+        if pd.api.types.is_integer_dtype(values.dtype):  # foreign keys: 0 = no row, like the ids
+            out = np.zeros(size, dtype=values.dtype)
+            out[ids] = values.to_numpy()
+            return cls(out)
+        if pd.api.types.is_numeric_dtype(values.dtype):
+            out = np.full(size, np.nan)
+            out[ids] = values.to_numpy(dtype=np.float64, na_value=np.nan)
+            return cls(out)
+        cat = values.astype("category")
+        out = np.full(size, -1, dtype=np.int32)
+        out[ids] = cat.cat.codes.to_numpy()
+        return cls(out, cat.cat.categories)
+
+    def through(self, keys: np.ndarray) -> "DimColumn":
+        """This attribute re-indexed by another table's foreign key array (e.g. unit -> linecard_id)."""
+        return DimColumn(self.values[keys], self.categories)
+
+    def take(self, ids: np.ndarray):
+        values = self.values[ids]
+        if self.categories is None:
+            return values
+        return pd.Categorical.from_codes(values, self.categories)
+
+
+class StarSchema:
+    """Dimension attributes by name, each a (fact key column, DimColumn) pair."""
+
+    def __init__(self, dims: dict, units: UnitDictionary):
+        """`dims`: {table: DataFrame with its id column}; Dim_Unit is keyed by units' ids."""
+        self.units = units
+        tables = {}
+        for table, df in dims.items():
+            id_col = "unit_id" if table == "Dim_Unit" else TABLES[table][1]
+            ids = df[id_col].to_numpy(dtype=np.intp)
+            size = len(units) + 1 if table == "Dim_Unit" else int(ids.max(initial=0)) + 1
+            tables[table] = {col: DimColumn.scatter(df[col], ids, size) for col in df.columns if col != id_col}
+
+        unit = tables["Dim_Unit"]
+        self.attributes = {}
+        for table, columns in tables.items():
+            id_col = None if table == "Dim_Unit" else TABLES[table][1]
+            for col, column in columns.items():
+                if DIMENSIONS[table] == "unit_id" and id_col is not None:
+                    column = column.through(unit[id_col].values)  # two hops, composed once
+                self.attributes[col] = (DIMENSIONS[table], column)
+
+    @classmethod
+    def from_tables(cls, data_dir: str) -> "StarSchema":
+        """Dimensions from the generator's files (ids = file order, as the loaders assign them)."""
+        units = UnitDictionary.from_table(data_dir)
+        dims = {}
+        for table in DIMENSIONS:
+            df = load_table(data_dir, TABLES[table][0])
+            if table == "Dim_Unit":
+                df.insert(0, "unit_id", units.encode(df["unit_serial"]))
+            else:
+                df.insert(0, TABLES[table][1], np.arange(1, len(df) + 1))
+            dims[table] = df
+        return cls(dims, units)
+
+    @classmethod
+    def from_db(cls, conn) -> "StarSchema":
+        """Dimensions from dbo.Dim_* on an open backends connection (one small query each)."""
+        units = UnitDictionary.from_db(conn)
+        dims = {}
+        for table in DIMENSIONS:
+            df = fetch_df(conn, f"USE NokiaFMA;\nSELECT * FROM dbo.{table};")
+            if table == "Dim_Unit":
+                df = df.drop(columns=["unit_id"], errors="ignore")
+                df.insert(0, "unit_id", units.encode(df["unit_serial"]))
+            dims[table] = df
+        return cls(dims, units)
+
+    def keys(self, attributes):
+        return sorted({self.attributes[a][0] for a in attributes})
+
+    def resolve(self, fact: pd.DataFrame, attributes) -> dict:
+        """{attribute: values aligned with fact's rows}; fact needs unit_id (or unit_serial) / station_id."""
+        keys = {}
+        for key in self.keys(attributes):
+            if key == "unit_id" and "unit_id" not in fact.columns:
+                keys[key] = self.units.encode(fact["unit_serial"])
+            else:
+                keys[key] = fact[key].to_numpy()
+        return {a: self.attributes[a][1].take(keys[self.attributes[a][0]]) for a in attributes}
+
+    def view(self, fact: pd.DataFrame, attributes) -> pd.DataFrame:
+        """fact with the attribute columns appended (the denormalized rows)."""
+        resolved = self.resolve(fact, attributes)
+        return fact.assign(**{a: pd.Series(v, index=fact.index) for a, v in resolved.items()})
+
+    def scan(self, data_dir: str, table: str, spec, chunk_rows: int = 1_000_000):
+        """Yield denormalized chunks of a generated fact table; spec = (fact columns, attributes)."""
+        columns, attributes = spec
+        path = find_table(data_dir, table)
+        keys = self.keys(attributes)
+        if "unit_id" in keys and "unit_id" not in table_columns(path):
+            keys = ["unit_serial" if k == "unit_id" else k for k in keys]  # CSV facts: encode per chunk
+        read = list(columns) + [k for k in keys if k not in columns]
+        for chunk in iter_table(path, columns=read, chunk_rows=chunk_rows):
+            yield self.view(chunk, attributes)[list(columns) + list(attributes)]
+
+
+if __name__ == "__main__":
+    from src.rca_ranker import DriverLiftCounter
+
+    ap = argparse.ArgumentParser(description="RCA scorecard from a star-joined scan of the generated facts.")
+    ap.add_argument("--data-dir", default=os.getenv("FMA_DATA_DIR", "data"))
+    ap.add_argument("--chunk-rows", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    star = StarSchema.from_tables(args.data_dir)
+    t1 = time.perf_counter()
+    lift, rows = DriverLiftCounter(), 0
+    for chunk in star.scan(args.data_dir, "fact_testrun", RCA_BASE, args.chunk_rows):
+        lift.update(chunk)
+        rows += len(chunk)
+    t2 = time.perf_counter()
+    print(f"Dimensions loaded in {(t1 - t0) * 1000:.0f}ms; {rows:,} fact rows joined + counted in {t2 - t1:.2f}s")
+    print(lift.scorecard().to_string(index=False))
@@ -0,0 +1,105 @@
+"""
+Table access shared by the analytics and the dashboard.
+
+Generated data and analytics artifacts are either CSV (what sqlcmd / BULK INSERT speak) or Parquet
+(typed and columnar, written by `generate_data.py --format parquet` and the analytics exporters).
+Readers look a table up by name and take whichever representation is newest, so callers never
+branch on the format.
+"""
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # CSV-only environments still work
+    pa = None
+    ds = None
+    pq = None
+
+
+def _require_pyarrow():
+    if pq is None:
+        raise ImportError("Parquet support needs pyarrow: pip install pyarrow")
+
+
+def table_candidates(base_dir: str, name: str):
+    # <name>.parquet file, <name>/ Parquet dataset (sharded generator output), <name>.csv
+    return [
+        os.path.join(base_dir, name + ".parquet"),
+        os.path.join(base_dir, name),
+        os.path.join(base_dir, name + ".csv"),
+    ]
+
+
+def find_table(base_dir: str, name: str) -> str:
+    """Path of the newest existing representation of `name` under base_dir."""
+    found = [p for p in table_candidates(base_dir, name) if os.path.exists(p)]
+    if not found:
+        raise FileNotFoundError(f"No {name}.parquet, {name}/ or {name}.csv under {base_dir}")
+    return max(found, key=os.path.getmtime)
+
+
+def read_table(path: str, columns=None, filters=None) -> pd.DataFrame:
+    """
+    Read a CSV, Parquet file or Parquet dataset directory into a DataFrame.
+    Parquet dictionary columns come back as pandas categoricals; `filters` (pyarrow DNF, e.g.
+    [("start_ts", ">=", ts)]) prune row groups by their min/max statistics.
+    """
+    if path.endswith(".csv"):
+        if filters:
+            raise ValueError("filters are only supported for Parquet inputs")
+        return pd.read_csv(path, usecols=columns)
+    _require_pyarrow()
+    return pq.read_table(path, columns=columns, filters=filters).to_pandas()
+
+
+def load_table(base_dir: str, name: str, columns=None, filters=None) -> pd.DataFrame:
+    return read_table(find_table(base_dir, name), columns=columns, filters=filters)
+
+
+def table_columns(path: str):
+    """Column names of a CSV, Parquet file or Parquet dataset directory (reads the header/schema only)."""
+    if path.endswith(".csv"):
+        return list(pd.read_csv(path, nrows=0).columns)
+    _require_pyarrow()
+    return ds.dataset(path, format="parquet").schema.names
+
+
+def iter_table(path: str, columns=None, chunk_rows: int = 1_000_000):
+    """Yield a table as DataFrames of at most chunk_rows rows, in file order."""
+    if path.endswith(".csv"):
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+        return
+    _require_pyarrow()
+    # batches arrive per row group: coalesce them so each chunk shares one (unified) dictionary
+    pending, rows = [], 0
+    for batch in ds.dataset(path, format="parquet").to_batches(columns=columns, batch_size=chunk_rows):
+        if rows + batch.num_rows > chunk_rows and pending:
+            yield pa.Table.from_batches(pending).to_pandas()
+            pending, rows = [], 0
+        pending.append(batch)
+        rows += batch.num_rows
+    if pending:
+        yield pa.Table.from_batches(pending).to_pandas()
+
+
+def write_table(df: pd.DataFrame, path: str, float32=False):
+    """
+    Write a DataFrame as Parquet with dictionary-encoded string columns (and, optionally, float64
+    columns narrowed to float32). Used for analytics/dashboard artifacts.
+    """
+    _require_pyarrow()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fields = []
+    for field in table.schema:
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        elif float32 and pa.types.is_float64(field.type):
+            field = field.with_type(pa.float32())
+        fields.append(field)
+    table = table.cast(pa.schema(fields, metadata=table.schema.metadata))
+    pq.write_table(table, path, compression="zstd")
@@ -0,0 +1,185 @@
+"""
+Local per-unit burn-in telemetry store.
+
+Fact_BurnInTelemetry is rewritten once, sorted by (unit_serial, ts), as one .npy file per column
+plus an offsets index: unit i's readings are rows offsets[i]:offsets[i + 1] of every column.
+Columns are opened with mmap, so:
+  - a unit's curve, or its readings in a time window (binary search on the unit's ts run), is a
+    zero-copy slice of the mapped arrays;
+  - a run of consecutive units (e.g. one serial range) is one slice as well;
+  - per-unit aggregates over the whole fleet are single ufunc.reduceat passes over the columns.
+The page cache does the rest; nothing is read that a query does not touch.
+
+  python -m src.telemetry_store --data-dir data        # (re)build data/telemetry_store
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.storage import find_table, read_table
+
+STORE_DIR = "telemetry_store"
+COLUMNS = {"temp_c": np.float32, "vcore_v": np.float32, "ripple_mv": np.float32, "ber_snapshot": np.float64}
+BER_FLOOR = 1e-12
+SECONDS_PER_DAY = 86400.0
+
+
+# -----------------------------
+# Build
+# -----------------------------
+def store_path(data_dir: str) -> str:
+    return os.path.join(data_dir, STORE_DIR)
+
+
+def _source_signature(path: str):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def build_store(data_dir: str, out_dir: str = None) -> str:
+    """Sort the generated telemetry by (unit, ts) and write the column files + offsets index."""
+    src = find_table(data_dir, "fact_burnin_telemetry")
+    out_dir = out_dir or store_path(data_dir)
+    t0 = time.perf_counter()
+
+    df = read_table(src, columns=["unit_serial", "ts"] + list(COLUMNS))
+    units = df["unit_serial"].astype("category")
+    units = units.cat.reorder_categories(sorted(units.cat.categories))  # offsets follow serial order
+    code = units.cat.codes.to_numpy()
+    ts = pd.to_datetime(df["ts"]).to_numpy().astype("datetime64[s]")
+    order = np.lexsort((ts, code))
+
+    tmp_dir = out_dir + ".tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    np.save(os.path.join(tmp_dir, "ts.npy"), ts[order])
+    for col, dtype in COLUMNS.items():
+        values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        np.save(os.path.join(tmp_dir, col + ".npy"), values[order].astype(dtype))
+    counts = np.bincount(code, minlength=len(units.cat.categories))
+    present = counts > 0
+    np.save(os.path.join(tmp_dir, "units.npy"), np.asarray(units.cat.categories[present], dtype=str))
+    np.save(os.path.join(tmp_dir, "offsets.npy"), np.r_[0, np.cumsum(counts[present])].astype(np.int64))
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"source": os.path.abspath(src), "source_signature": _source_signature(src),
+                   "rows": len(df), "units": int(present.sum())}, f, indent=2)
+
+    if os.path.isdir(out_dir):
+        for name in os.listdir(out_dir):
+            os.remove(os.path.join(out_dir, name))
+        os.rmdir(out_dir)
+    os.replace(tmp_dir, out_dir)
+    print(f"✅ Built {os.path.abspath(out_dir)}: {len(df):,} rows, {int(present.sum()):,} units "
+          f"in {time.perf_counter() - t0:.1f}s")
+    return out_dir
+
+
+def store_is_stale(data_dir: str) -> bool:
+    meta = os.path.join(store_path(data_dir), "meta.json")
+    if not os.path.exists(meta):
+        return True
+    with open(meta, "r", encoding="utf-8") as f:
+        built = json.load(f)
+    src = find_table(data_dir, "fact_burnin_telemetry")
+    return built["source"] != os.path.abspath(src) or built["source_signature"] != _source_signature(src)
+
+
+def open_store(data_dir: str) -> "TelemetryStore":
+    """TelemetryStore for data_dir, (re)building it first if the generated telemetry changed."""
+    if store_is_stale(data_dir):
+        build_store(data_dir)
+    return TelemetryStore(store_path(data_dir))
+
+
+# -----------------------------
+# Read
+# -----------------------------
+class TelemetryStore:
+    """Memory-mapped view of a built store. Column arrays returned by the accessors are views."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.units = np.load(os.path.join(path, "units.npy"))
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.ts = np.load(os.path.join(path, "ts.npy"), mmap_mode="r")
+        self.columns = {col: np.load(os.path.join(path, col + ".npy"), mmap_mode="r") for col in COLUMNS}
+        self._index = {u: i for i, u in enumerate(self.units)}
+
+    def __len__(self):
+        return len(self.ts)
+
+    def unit_index(self, serials) -> np.ndarray:
+        """Positions of unit serials in self.units (KeyError for unknown units)."""
+        return np.array([self._index[s] for s in np.atleast_1d(serials)], dtype=np.intp)
+
+    def rows(self, serial: str, start=None, end=None) -> slice:
+        """Row slice of one unit, optionally restricted to start <= ts < end."""
+        i = self._index[serial]
+        base, stop = int(self.offsets[i]), int(self.offsets[i + 1])
+        run = self.ts[base:stop]  # the unit's readings are ts-sorted: binary search the bounds
+        lo = base if start is None else base + int(np.searchsorted(run, np.datetime64(start, "s")))
+        hi = stop if end is None else base + int(np.searchsorted(run, np.datetime64(end, "s")))
+        return slice(lo, max(lo, hi))
+
+    def window(self, serial: str, start=None, end=None) -> dict:
+        """{column: view} of one unit's readings (ts included), optionally in [start, end)."""
+        rows = self.rows(serial, start, end)
+        out = {"ts": self.ts[rows]}
+        out.update({col: arr[rows] for col, arr in self.columns.items()})
+        return out
+
+    def unit_range(self, first: str, last: str) -> dict:
+        """{column: view} of every unit from `first` to `last` (inclusive, serial order): one slice."""
+        i, j = self.unit_index([first, last])
+        rows = slice(int(self.offsets[i]), int(self.offsets[j + 1]))
+        out = {"ts": self.ts[rows]}
+        out.update({col: arr[rows] for col, arr in self.columns.items()})
+        return out
+
+    def windows(self, serials, start=None, end=None):
+        """Yield (serial, {column: view}) for a batch of units."""
+        for serial in serials:
+            yield serial, self.window(serial, start, end)
+
+    def aggregates(self) -> pd.DataFrame:
+        """
+        Per-unit summary over the whole store, one reduceat per statistic: readings, first/last ts,
+        max/mean temp, max ripple and the least-squares log10 BER slope (decades per day).
+        """
+        starts = self.offsets[:-1]
+        n = np.diff(self.offsets)
+        temp = self.columns["temp_c"]
+        ripple = self.columns["ripple_mv"]
+
+        # time since the unit's first reading, so the slope sums stay well conditioned
+        t = (self.ts.astype(np.int64) - np.repeat(self.ts[starts].astype(np.int64), n)) / SECONDS_PER_DAY
+        y = np.log10(np.maximum(self.columns["ber_snapshot"], BER_FLOOR))
+        st, sy = np.add.reduceat(t, starts), np.add.reduceat(y, starts)
+        stt, sty = np.add.reduceat(t * t, starts), np.add.reduceat(t * y, starts)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = (n * sty - st * sy) / (n * stt - st * st)
+
+        return pd.DataFrame({
+            "unit_serial": self.units,
+            "n_readings": n,
+            "first_ts": self.ts[starts],
+            "last_ts": self.ts[self.offsets[1:] - 1],
+            "max_temp_c": np.maximum.reduceat(temp, starts),
+            "mean_temp_c": np.add.reduceat(temp, starts, dtype=np.float64) / n,
+            "max_ripple_mv": np.maximum.reduceat(ripple, starts),
+            "ber_slope_decades_per_day": slope,
+        })
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Build the memory-mapped per-unit telemetry store.")
+    ap.add_argument("--data-dir", default=os.getenv("FMA_DATA_DIR", "data"))
+    args = ap.parse_args()
+    store = TelemetryStore(build_store(args.data_dir))
+    t0 = time.perf_counter()
+    agg = store.aggregates()
+    print(f"Aggregated {len(store):,} rows over {len(agg):,} units in {time.perf_counter() - t0:.2f}s")
+    print(agg.sort_values("max_temp_c", ascending=False).head(10).to_string(index=False))
@@ -0,0 +1,67 @@
+"""
+Unit dictionary: unit_serial <-> dense int32 unit_id.
+
+Every fact row is keyed by a VARCHAR serial ("LC-000123"). Analytics that group or join on it
+hash the strings every time, and an object column costs ~60 bytes a row in pandas. The dictionary
+gives each Dim_Unit serial an id 1..N: its rank in sorted serial order. Ids never depend on load
+order, so the generator (Parquet facts), the DuckDB build (Dim_Unit and every fact table) and the
+analytics compute the same id for the same serial. Id 0 is reserved for NULL / unknown serials.
+
+With ids a join is array indexing (attribute_by_id[unit_id]) and the key column is 4 bytes a row.
+decode() turns ids back into serials for display and exports.
+"""
+import numpy as np
+import pandas as pd
+
+from src.storage import load_table
+
+ID_DTYPE = np.int32
+UNKNOWN_ID = 0
+
+
+class UnitDictionary:
+    """Sorted unit serials; unit_id = 1 + position in that order."""
+
+    def __init__(self, serials):
+        self.serials = np.array(sorted(set(serials)), dtype=object)
+        self._by_id = np.concatenate([[None], self.serials])  # index = unit_id; 0 -> None
+        self._luts = {}  # tuple of a categorical's categories -> id lookup table
+
+    @classmethod
+    def from_table(cls, data_dir: str) -> "UnitDictionary":
+        """Dictionary of the generated dim_unit table under data_dir."""
+        return cls(load_table(data_dir, "dim_unit", columns=["unit_serial"])["unit_serial"])
+
+    @classmethod
+    def from_db(cls, conn) -> "UnitDictionary":
+        """Dictionary of dbo.Dim_Unit on an open backends connection (SQL Server or DuckDB)."""
+        from src.backends import fetch_df
+
+        return cls(fetch_df(conn, "USE NokiaFMA;\nSELECT unit_serial FROM dbo.Dim_Unit;")["unit_serial"])
+
+    def __len__(self):
+        return len(self.serials)
+
+    def encode(self, serials) -> np.ndarray:
+        """unit_id per value (int32; NULL and unknown serials -> 0)."""
+        values = pd.Series(serials, copy=False)
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype("category")  # one hash pass; Parquet dictionary columns skip it
+        cats = values.cat.categories.to_numpy(dtype=object)
+        key = tuple(cats)
+        lut = self._luts.get(key)
+        if lut is None:
+            pos = np.searchsorted(self.serials, cats)
+            found = pos < len(self.serials)
+            found[found] = self.serials[pos[found]] == cats[found]
+            # trailing slot for the -1 (NULL) code
+            lut = np.append(np.where(found, pos + 1, UNKNOWN_ID), UNKNOWN_ID).astype(ID_DTYPE)
+            self._luts[key] = lut
+        return lut[values.cat.codes.to_numpy()]
+
+    def decode(self, ids) -> np.ndarray:
+        """unit_serial per id (object array; 0 -> None)."""
+        return self._by_id[np.asarray(ids)]
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame({"unit_id": np.arange(1, len(self) + 1, dtype=ID_DTYPE), "unit_serial": self.serials})
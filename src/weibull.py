@@ -0,0 +1,223 @@
+"""
+Right-censored Weibull fitting for many groups at once.
+
+Units that have not come back are censored at the analysis date, and units that came back for a
+different failure mode are censored at their return date (cause-specific hazards). All groups are
+solved together: each Newton step on the profile likelihood is three segment sums over the
+stacked observations, so thousands of per-lot / per-mode fits cost a few passes over the data
+instead of one scipy optimisation per group.
+"""
+import numpy as np
+import pandas as pd
+
+SHAPE_BOUNDS = (1e-3, 100.0)
+MIN_FAILURES = 2  # fewer events leave shape unidentified; those groups come back NaN
+
+
+def fit_weibull_groups(t, event, group=None, n_groups=None, weights=None, shape0=None, tol=1e-10, max_iter=100):
+    """
+    Censored two-parameter Weibull MLE per group.
+
+    t: positive times; event: 1 = failure observed, 0 = right-censored at t; group: int ids
+    0..n_groups-1 (default: one group); weights: optional row weights (frequency or bootstrap), or a
+    [replicate, row] matrix to fit every replicate x group in the same solve; shape0: optional
+    per-group (or [replicate, group]) starting shape, e.g. the point estimate when refitting resamples.
+    Returns a dict of per-group arrays: shape, scale, n, n_failures, converged ([replicate, group]
+    arrays for matrix weights).
+
+    For fixed shape k the scale has the closed form scale^k = sum(w t^k) / sum(w event), so only
+    the profile score in k is solved:
+        g(k) = S1/S0 - 1/k - sum(w event ln t) / sum(w event),   S_j = sum(w t^k (ln t)^j)
+    g is increasing in k, so Newton steps are safeguarded by bisection on a per-group bracket.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    event = np.asarray(event, dtype=np.float64)
+    group = np.zeros(t.size, dtype=np.intp) if group is None else np.asarray(group, dtype=np.intp)
+    n_groups = int(group.max()) + 1 if n_groups is None else n_groups
+    w = np.ones_like(t) if weights is None else np.asarray(weights, dtype=np.float64)
+    if np.any(t <= 0):
+        raise ValueError("Weibull times must be positive")
+    if np.any(group[1:] < group[:-1]):
+        # rows sorted by group make each group one contiguous run for the segment sums below
+        order = np.argsort(group, kind="stable")
+        t, event, group, w = t[order], event[order], group[order], w[..., order]
+
+    # work on t / max(t) per group: ln x <= 0, so x^k never overflows
+    runs = group_runs(group)
+    t_max = segment_sums(runs, n_groups, t, ufunc=np.maximum)[0]
+    lx = np.log(t / t_max[group])
+
+    # replicate r's group j is solved as group r * n_groups + j (per-row terms are shared by all replicates)
+    w_2d = w.ndim == 2
+    n_rep = w.shape[0] if w_2d else 1
+    n_fit = n_rep * n_groups
+    w = w.reshape(n_rep, t.size)
+
+    def seg(values):
+        return segment_sums(runs, n_groups, values)[0].ravel()
+
+    n = seg(w)
+    d = seg(w * event)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_event_lx = seg(w * (event * lx)) / d
+
+    ok = d >= MIN_FAILURES
+    k = np.ones(n_fit) if shape0 is None else np.broadcast_to(shape0, (n_rep, n_groups)).ravel()
+    k = np.clip(np.nan_to_num(k, nan=1.0), *SHAPE_BOUNDS)
+    lo = np.full(n_fit, SHAPE_BOUNDS[0])
+    hi = np.full(n_fit, SHAPE_BOUNDS[1])
+    active = ok.copy()
+    converged = np.zeros(n_fit, dtype=bool)
+
+    # (replicate, row) terms of identified groups with non-zero weight (unidentified groups are never
+    # iterated on); of those, the rows still being iterated on are dropped in bulk once most of their
+    # groups have converged
+    cell = np.flatnonzero(ok.reshape(n_rep, -1)[:, group] & (w > 0))
+    rep, row = np.divmod(cell, t.size)
+    og, olx, ow = rep * n_groups + group[row], lx[row], w.ravel()[cell]
+    oruns = group_runs(og)
+    rg, rlx, rw, rruns = og, olx, ow, oruns
+    n_rows = segment_sums(oruns, n_fit, np.ones(og.size))[0]
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        if n_rows[active].sum() < 0.5 * rg.size:
+            live = active[rg]
+            rg, rlx, rw = rg[live], rlx[live], rw[live]
+            rruns = group_runs(rg)
+        e = k[rg]  # w x^k (ln x)^j for j = 0, 1, 2, in place: these are the largest arrays here
+        e *= rlx
+        np.exp(e, out=e)
+        e *= rw
+        el = e * rlx
+        s0, s1 = segment_sums(rruns, n_fit, e, el)
+        el *= rlx
+        s2 = segment_sums(rruns, n_fit, el)[0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            m1 = s1 / s0
+            g = m1 - 1.0 / k - mean_event_lx
+            dg = s2 / s0 - m1 * m1 + 1.0 / (k * k)
+
+        lo = np.where(active & (g < 0), k, lo)
+        hi = np.where(active & (g > 0), k, hi)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            k_new = k - g / dg
+        # Newton unless it leaves the bracket (or dg degenerated), then bisect in log space
+        bad = ~np.isfinite(k_new) | (k_new <= lo) | (k_new >= hi)
+        k_new = np.where(bad, np.sqrt(lo * hi), k_new)
+
+        done = active & ((np.abs(k_new - k) <= tol * k) | (g == 0))
+        converged |= done
+        k = np.where(active, k_new, k)
+        active &= ~done
+
+    s0 = segment_sums(oruns, n_fit, ow * np.exp(k[og] * olx))[0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.tile(t_max, n_rep) * (s0 / d) ** (1.0 / k)
+    shape = np.where(ok, k, np.nan)
+    scale = np.where(ok, scale, np.nan)
+    fit = {"shape": shape, "scale": scale, "n": n, "n_failures": d, "converged": converged}
+    return {key: v.reshape(n_rep, -1) for key, v in fit.items()} if w_2d else fit
+
+
+def group_runs(group):
+    """(group id, first row) of each contiguous run of a group-sorted id array."""
+    start = np.flatnonzero(group[1:] != group[:-1]) + 1
+    start = np.concatenate([[0], start]) if group.size else start
+    return group[start], start
+
+
+def segment_sums(runs, n_groups, *values, ufunc=np.add):
+    """
+    Per-group ufunc.reduceat of each values array along its last (row) axis over group_runs() (rows
+    sorted by group; several times cheaper than a weighted np.bincount). Returns one [..., n_groups]
+    array per values array, 0 for empty groups.
+    """
+    ids, start = runs
+    out = [np.zeros(np.shape(v)[:-1] + (n_groups,)) for v in values]
+    if start.size:
+        for o, v in zip(out, values):
+            o[..., ids] = ufunc.reduceat(v, start, axis=-1)
+    return out
+
+
+def weibull_quantile(shape, scale, p):
+    """Time by which a fraction p has failed."""
+    return scale * (-np.log1p(-p)) ** (1.0 / shape)
+
+
+def unit_survival(units: pd.DataFrame, analysis_date=None) -> pd.DataFrame:
+    """
+    One row per unit: ttf_days to its first confirmed (non-NFF) return, or to analysis_date
+    (default: the latest return date) when it has not failed. `units` is the left join of units
+    and returns (rca_weibull.SQL["unit_survival"]) keyed by unit_id (src/unit_dict.py); extra
+    columns are kept for grouping.
+    """
+    df = units.copy()
+    df["build_date"] = pd.to_datetime(df["build_date"])
+    df["return_date"] = pd.to_datetime(df["return_date"])
+    df = df.sort_values("return_date", na_position="last").drop_duplicates("unit_id")
+
+    analysis_date = df["return_date"].max() if analysis_date is None else pd.Timestamp(analysis_date)
+    failed = df["return_date"].notna() & (df["return_date"] <= analysis_date)
+    end = df["return_date"].where(failed, analysis_date)
+
+    df["ttf_days"] = (end - df["build_date"]).dt.days
+    df["failed"] = failed.astype(np.int8)
+    df["failure_mode"] = df["confirmed_failure_mode"].where(failed)
+    df = df.drop(columns=["return_date", "confirmed_failure_mode"])
+    return df[df["ttf_days"] > 0].reset_index(drop=True)
+
+
+def stack_rows(surv: pd.DataFrame, dims=("optic_vendor", "lot_code", "fw_version"), modes=None):
+    """
+    Stack every dimension value x failure mode cell into one (row, event, group) problem:
+    dimension = "ALL" or one of dims, failure_mode = "ALL" (any failure) or a single mode (other
+    modes censored at their return date). `row` indexes surv. Returns (keys frame, row, event, group).
+    """
+    if modes is None:
+        modes = sorted(surv["failure_mode"].dropna().unique())
+    failed = surv["failed"].to_numpy(dtype=np.int8)
+    mode_codes = pd.Categorical(surv["failure_mode"], categories=modes).codes
+
+    keys, rows, events, groups = [], [], [], []
+    n_groups = 0
+    for dim in ("ALL",) + tuple(dims):
+        if dim == "ALL":
+            values, codes = np.array(["ALL"], dtype=object), np.zeros(len(surv), dtype=np.intp)
+        else:
+            codes, values = pd.factorize(surv[dim], sort=True)
+        for m, mode in enumerate(["ALL"] + list(modes)):
+            event = failed if mode == "ALL" else (mode_codes == m - 1).astype(np.int8)
+            keep = np.flatnonzero(codes >= 0)
+            rows.append(keep)
+            events.append(event[keep])
+            groups.append(codes[keep] + n_groups)
+            keys += [(dim, value, mode) for value in values]
+            n_groups += len(values)
+
+    keys = pd.DataFrame(keys, columns=["dimension", "group_value", "failure_mode"])
+    return keys, np.concatenate(rows), np.concatenate(events), np.concatenate(groups)
+
+
+def stack_groups(surv: pd.DataFrame, dims=("optic_vendor", "lot_code", "fw_version"), modes=None):
+    """stack_rows() with each row's ttf_days in place of its index: (keys frame, t, event, group)."""
+    keys, rows, event, group = stack_rows(surv, dims, modes)
+    return keys, surv["ttf_days"].to_numpy(dtype=np.float64)[rows], event, group
+
+
+def reliability_table(surv: pd.DataFrame, dims=("optic_vendor", "lot_code", "fw_version"), modes=None):
+    """Weibull parameters for every stack_groups() cell, in one solver call."""
+    keys, t, event, group = stack_groups(surv, dims, modes)
+    fit = fit_weibull_groups(t, event, group, len(keys))
+    out = keys.copy()
+    out["n_units"] = fit["n"].astype(np.int64)
+    out["n_failures"] = fit["n_failures"].astype(np.int64)
+    out["weibull_shape_k"] = fit["shape"]
+    out["weibull_scale_lambda_days"] = fit["scale"]
+    with np.errstate(invalid="ignore"):
+        out["median_ttf_days"] = weibull_quantile(fit["shape"], fit["scale"], 0.5)
+        out["p10_ttf_days"] = weibull_quantile(fit["shape"], fit["scale"], 0.10)
+        out["p90_ttf_days"] = weibull_quantile(fit["shape"], fit["scale"], 0.90)
+    out["converged"] = fit["converged"]
+    return out